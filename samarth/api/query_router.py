@@ -1,78 +1,163 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import List, Dict, Any, AsyncIterator, Optional
+import asyncio
 
-# Handle imports for different environments
-query_service = None
-QueryRequest = None
-QueryResponse = None
-MetadataAccess = None
+# The query service is built by the container at startup and injected per request
+from samarth.services.container import get_query_service
+from samarth.services.result_store import EXPORT_FORMATS
+from samarth.services.admission import admission, AdmissionRejected, Ticket, PRIORITY_CHEAP, PRIORITY_LLM
+from samarth.data.data_access import MetadataAccess
+from samarth.data.db_connection import db
+from samarth.utils.responses import FastJSONResponse, RESULT_FORMATS, dumps, encode_result
 
-# Try multiple import strategies for different environments
-import_errors = []
+router = APIRouter(prefix="/api/v1/query", tags=["Query Processing"])
 
-try:
-    # When running as part of the samarth module
-    from samarth.services.query_service import query_service
-    from samarth.models.data_models import QueryRequest, QueryResponse
-except ImportError as e1:
-    import_errors.append(f"samarth.module: {e1}")
+async def _admit(http_request: Request, body: Dict, query_service: Any, question: Optional[str] = None,
+                 cost: int = 1, slots: int = 1) -> Optional[Ticket]:
+    """Rate-limit the caller and wait for pipeline slots, or fail fast with 429 and Retry-After"""
+    if admission is None:
+        return None
+    # Clients without a user_id are limited by address
+    client = body.get("user_id") or (http_request.client.host if http_request.client else "anonymous")
     try:
-        # When running standalone, import directly from services and models directories
-        from services.query_service import query_service
-        from models.data_models import QueryRequest, QueryResponse
-    except ImportError as e2:
-        import_errors.append(f"standalone: {e2}")
-        try:
-            # Fallback to relative imports when running from within the samarth directory
-            from ..services.query_service import query_service
-            from ..models.data_models import QueryRequest, QueryResponse
-        except ImportError as e3:
-            import_errors.append(f"relative: {e3}")
-            query_service = None
-            QueryRequest = None
-            QueryResponse = None
+        admission.check_rate(str(client), cost)
+        cheap = question is not None and await query_service.is_cheap(question)
+        return await admission.acquire(PRIORITY_CHEAP if cheap else PRIORITY_LLM, slots)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=f"Too many requests: {e.reason}",
+                            headers={"Retry-After": str(e.retry_after)})
 
-# Try to import MetadataAccess for the datasets endpoint
-try:
-    # When running as part of the samarth module
-    from samarth.data.data_access import MetadataAccess
-except ImportError as e1:
-    try:
-        # When running standalone, import directly from data directory
-        from data.data_access import MetadataAccess
-    except ImportError as e2:
-        try:
-            # Fallback to relative import when running from within the samarth directory
-            from ..data.data_access import MetadataAccess
-        except ImportError as e3:
-            MetadataAccess = None
-
-# Print import errors for debugging
-if import_errors:
-    print("Import warnings in query_router.py:")
-    for error in import_errors:
-        print(f"  - {error}")
-
-router = APIRouter(prefix="/api/v1/query", tags=["Query Processing"])
+def _result_format(body: Dict) -> str:
+    """How visualization rows are encoded: rows (a dict per row, the default) or columnar"""
+    result_format = body.get("result_format") or "rows"
+    if result_format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"'result_format' must be one of {', '.join(RESULT_FORMATS)}")
+    return result_format
 
 @router.post("/ask", response_model=None)  # Remove response_model for now to avoid import issues
-async def ask_question(request: Dict):  # Use Dict instead of QueryRequest to avoid import issues
+async def ask_question(request: Dict, http_request: Request, query_service: Any = Depends(get_query_service)):  # Use Dict instead of QueryRequest to avoid import issues
     """
     Process a natural language question and return an AI-generated answer
     """
+    # Use the question from the request dict
+    question = request.get("question", "")
+    user_id = request.get("user_id")
+    result_format = _result_format(request)
+    ticket = await _admit(http_request, request, query_service, question)
     try:
-        # Check if query_service was imported successfully
-        if query_service is None:
-            raise Exception("query_service not imported successfully")
-        
-        # Use the question from the request dict
-        question = request.get("question", "")
-        user_id = request.get("user_id")
-        
         result = await query_service.process_query(question, user_id)
-        return result
+        # Returned as a response so the rows are serialized once, by orjson, not walked by jsonable_encoder first
+        return FastJSONResponse(encode_result(result, result_format))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+def _format_sse(event: Dict[str, Any], result_format: str = "rows") -> bytes:
+    """Format a pipeline event as a server-sent event"""
+    payload = dumps(encode_result(event["data"], result_format))
+    return b"event: " + event["event"].encode() + b"\ndata: " + payload + b"\n\n"
+
+@router.post("/ask/stream", response_model=None)
+async def ask_question_stream(request: Dict, http_request: Request, query_service: Any = Depends(get_query_service)):
+    """
+    Process a natural language question, streaming progress as server-sent events:
+    datasets, sql, results, answer_chunk (repeated) and done
+    """
+    question = request.get("question", "")
+    user_id = request.get("user_id")
+    result_format = _result_format(request)
+    ticket = await _admit(http_request, request, query_service, question)
+    
+    async def event_stream() -> AsyncIterator[bytes]:
+        try:
+            async for event in query_service.stream_query(question, user_id):
+                yield _format_sse(event, result_format)
+        finally:
+            if ticket is not None:
+                ticket.release()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so events reach the client as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also frees the slot if the stream never started
+        background=BackgroundTask(ticket.release) if ticket is not None else None
+    )
+
+@router.post("/ask/batch", response_model=None)
+async def ask_questions_batch(request: Dict, http_request: Request, query_service: Any = Depends(get_query_service)):
+    """
+    Answer a list of questions, streaming one JSON object per line (NDJSON) as each
+    completes. Each line carries the index of the question in the request.
+    """
+    questions = request.get("questions")
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        raise HTTPException(status_code=400, detail="'questions' must be a list of strings")
+    if len(questions) > query_service.batch_max_questions:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {query_service.batch_max_questions} questions")
+    # Every question costs a token, so a batch can be no larger than a full bucket
+    if admission is not None and admission.max_cost is not None and len(questions) > admission.max_cost:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {int(admission.max_cost)} questions "
+                                                    "under the rate limit")
+    
+    user_id = request.get("user_id")
+    # Checked before streaming starts; once the 200 is sent an error can only truncate the body
+    concurrency = request.get("concurrency")
+    if concurrency is not None and (isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1):
+        raise HTTPException(status_code=422, detail="'concurrency' must be a positive integer")
+    concurrency = min(concurrency or query_service.batch_llm_concurrency, query_service.batch_llm_concurrency)
+    result_format = _result_format(request)
+    # A slot for each LLM call the batch may have in flight
+    slots = min(concurrency, len(questions))
+    ticket = await _admit(http_request, request, query_service, cost=len(questions), slots=slots)
+    
+    async def ndjson_stream() -> AsyncIterator[bytes]:
+        try:
+            async for result in query_service.process_batch(questions, user_id, concurrency):
+                yield dumps(encode_result(result, result_format)) + b"\n"
+        finally:
+            if ticket is not None:
+                ticket.release()
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson",
+                             background=BackgroundTask(ticket.release) if ticket is not None else None)
+
+@router.get("/results/{handle}", response_model=None)
+async def result_page(handle: str, offset: int = 0, limit: Optional[int] = None, result_format: str = "rows",
+                      query_service: Any = Depends(get_query_service)):
+    """
+    One page of a stored query result. Answers whose result is longer than a page
+    carry its handle in visualization_data.result; next_offset is null on the last page.
+    """
+    if result_format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"'result_format' must be one of {', '.join(RESULT_FORMATS)}")
+    page = await asyncio.to_thread(query_service.results.page, handle, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired; ask the question again")
+    if result_format == "columnar":
+        rows = page.pop("data")
+        page.update(format="columnar", values=[[row.get(column) for row in rows] for column in page["columns"]])
+    return FastJSONResponse(page)
+
+@router.get("/results/{handle}/download", response_model=None)
+async def download_result(handle: str, file_format: str = Query("csv", alias="format"),
+                          query_service: Any = Depends(get_query_service)):
+    """
+    Download a whole stored query result as CSV or NDJSON, streamed from the result store
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"'format' must be one of {', '.join(EXPORT_FORMATS)}")
+    chunks = await asyncio.to_thread(query_service.results.export, handle, file_format)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired; ask the question again")
+    return StreamingResponse(chunks, media_type=EXPORT_FORMATS[file_format], headers={
+        "Content-Disposition": f'attachment; filename="samarth-result-{handle[:8]}.{file_format}"'
+    })
 
 @router.get("/datasets", response_model=None)  # Remove response_model for now to avoid import issues
 async def list_datasets():
@@ -80,11 +165,33 @@ async def list_datasets():
     List all available datasets
     """
     try:
-        # Check if MetadataAccess was imported successfully
-        if MetadataAccess is None:
-            raise Exception("MetadataAccess not imported successfully")
-            
         datasets = MetadataAccess.list_all_datasets()
         return datasets
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving datasets: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error retrieving datasets: {str(e)}")
+
+@router.get("/stats", response_model=None)
+async def query_stats(query_service: Any = Depends(get_query_service)):
+    """
+    Report query pipeline statistics, such as the template fast path hit rate
+    """
+    try:
+        return {
+            "intent_fast_path": query_service.intents.stats() if query_service.intents else {},
+            "sql_cache": query_service.sql_cache.stats(),
+            "result_cache": query_service.result_cache.stats(),
+            "answer_cache": query_service.answer_cache.stats(),
+            "coalesced_questions": query_service.query_flights.stats(),
+            "coalesced_sql": query_service.sql_flights.stats(),
+            "dataset_classifier": query_service.llm.dataset_classifier.stats()
+                if getattr(query_service.llm, "dataset_classifier", None) else {},
+            "sql_repair": query_service.repair_stats,
+            "schema_catalog": query_service.catalog.stats() if query_service.catalog else {},
+            "llm_client": query_service.llm.client.stats() if getattr(query_service.llm, "client", None) else {},
+            "query_log": query_service.logger.stats() if query_service.logger else {},
+            "db_pool": db.pool_stats(),
+            "result_store": query_service.results.stats(),
+            "admission": admission.stats() if admission else {}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving query stats: {str(e)}")
@@ -0,0 +1 @@
+# Benchmarks module for Project Samarth
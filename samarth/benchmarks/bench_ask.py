@@ -0,0 +1,217 @@
+# End-to-end /ask Benchmark for Project Samarth
+#
+# Boots the FastAPI app in-process with the stub LLM provider against a local
+# Postgres, optionally seeded with synthetic data at a given scale, then
+# replays a question mix at fixed concurrency through the ASGI stack. Reports
+# throughput, end-to-end and per-stage latency percentiles and peak RSS as
+# JSON, and can compare the run against an earlier report.
+#
+#   python -m samarth.benchmarks.bench_ask --database-url postgresql://localhost/samarth_bench \
+#       --seed-data --scale 1 --requests 500 --concurrency 16 --output bench_ask.json --compare previous.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Template questions take the intent fast path; the rest go through the stub LLM
+QUESTION_MIX = [
+    ("Top 5 crops by production in Punjab in 2012", 3),
+    ("What is the production trend of Rice in Punjab from 2005 to 2015?", 3),
+    ("Which districts had the highest rainfall in Kerala in 2018?", 2),
+    ("Which station has the highest average maximum temperature?", 2),
+    ("How does monsoon rainfall affect rice production in West Bengal?", 2),
+    ("Compare humidity and wind speed across districts of Gujarat", 1),
+    ("How has climate change affected wheat yields in Uttar Pradesh?", 1),
+    ("Explain the relationship between fertilizer use and crop yield", 1),
+]
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean and max of a list of seconds, in milliseconds"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "p50": round(pick(0.50) * 1000, 2),
+        "p95": round(pick(0.95) * 1000, 2),
+        "p99": round(pick(0.99) * 1000, 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def rss_mb() -> Dict[str, Optional[float]]:
+    """Current (Linux only) and peak resident set size in MiB"""
+    current = None
+    try:
+        with open("/proc/self/statm") as handle:
+            current = int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak_mb = peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    return {"current": round(current, 1) if current is not None else None, "peak": round(peak_mb, 1)}
+
+
+def seed_database(scale: float, seed: int = 42):
+    """Replace the warehouse tables with synthetic rows (see samarth/data/synthetic_data.py)"""
+    from samarth.data.synthetic_data import populate
+    loaded = populate(scale, seed)
+    print("Seeded " + ", ".join(f"{rows} {table}" for table, rows in loaded.items()) + " rows")
+
+
+def question_stream(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    questions, weights = zip(*QUESTION_MIX)
+    return rng.choices(questions, weights=weights, k=count)
+
+
+async def replay(app: Any, questions: List[str], concurrency: int, endpoint: str) -> Dict[str, Any]:
+    """Send the questions through the ASGI app with at most `concurrency` in flight"""
+    import httpx
+
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors = 0
+    pending = iter(questions)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=None) as client:
+        async def worker():
+            nonlocal errors
+            for question in pending:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, json={"question": question})
+                    body = response.json() if response.status_code == 200 else {}
+                except Exception as e:
+                    print(f"Request failed: {e}")
+                    body = {}
+                latencies.append(time.perf_counter() - started)
+                if not body or body.get("answer", "").startswith("An error occurred"):
+                    errors += 1
+                for stage, seconds in body.get("stage_timings", {}).items():
+                    stages.setdefault(stage, []).append(seconds)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {stage: {"count": len(values), **percentiles(values)} for stage, values in sorted(stages.items())},
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    from samarth.main import app
+
+    async with app.router.lifespan_context(app):
+        if args.warmup:
+            await replay(app, question_stream(args.warmup, args.random_seed + 1), args.concurrency, args.endpoint)
+        memory_before = rss_mb()
+        results = await replay(app, question_stream(args.requests, args.random_seed), args.concurrency, args.endpoint)
+    results["memory_mb"] = {"before": memory_before, "after": rss_mb()}
+    return results
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    """Lines describing the change from an earlier report"""
+    def change(new: Optional[float], old: Optional[float]) -> str:
+        if not new or not old:
+            return "n/a"
+        return f"{(new - old) / old:+.1%}"
+
+    lines = [f"throughput: {previous.get('throughput_rps')} -> {current.get('throughput_rps')} rps "
+             f"({change(current.get('throughput_rps'), previous.get('throughput_rps'))})"]
+    for key in ("p50", "p95", "p99"):
+        new, old = current["latency_ms"].get(key), previous.get("latency_ms", {}).get(key)
+        lines.append(f"latency {key}: {old} -> {new} ms ({change(new, old)})")
+    for stage, stats in current["stages_ms"].items():
+        old = previous.get("stages_ms", {}).get(stage, {}).get("p95")
+        lines.append(f"stage {stage} p95: {old} -> {stats.get('p95')} ms ({change(stats.get('p95'), old)})")
+    return lines
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /ask pipeline end to end with the stub LLM")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL"),
+                        help="Postgres to benchmark against; --seed truncates its warehouse tables")
+    parser.add_argument("--seed-data", action="store_true", help="replace the warehouse tables with synthetic data first")
+    parser.add_argument("--scale", type=float, default=1.0, help="synthetic data scale factor")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoint", default="/api/v1/query/ask")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub LLM latency per call, in seconds")
+    parser.add_argument("--cold", action="store_true", help="disable the answer, SQL and result caches")
+    parser.add_argument("--random-seed", type=int, default=7)
+    parser.add_argument("--output", default="bench_ask.json")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url (or BENCH_DATABASE_URL / DATABASE_URL) is required")
+    # Configuration is read when the services are imported, so set it first
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["LLM_PROVIDER"] = "stub"
+    os.environ["LLM_STUB_LATENCY_SECONDS"] = str(args.llm_latency)
+    os.environ.setdefault("QUERY_LOG_ENABLED", "false")
+    os.environ.setdefault("TRACE_EXPORTER", "none")
+    # All benchmark requests come from one client; measure the pipeline, not the rate limiter
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    if args.cold:
+        for cache in ("ANSWER", "SQL", "RESULT"):
+            os.environ[f"{cache}_CACHE_SIZE"] = "0"
+
+    if args.seed_data:
+        seed_database(args.scale, args.random_seed)
+
+    results = asyncio.run(run_benchmark(args))
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("database_url", "output", "compare")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(), "git_revision": git_revision()},
+        **results,
+    }
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+
+    print(f"{report['requests']} requests, {report['errors']} errors, {report['throughput_rps']} req/s")
+    print("latency ms: " + ", ".join(f"{key} {value}" for key, value in report["latency_ms"].items()))
+    for stage, stats in report["stages_ms"].items():
+        print(f"  {stage:<16} p50 {stats['p50']:>8} p95 {stats['p95']:>8} p99 {stats['p99']:>8}")
+    print(f"peak RSS {report['memory_mb']['after']['peak']} MiB; report written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            for line in compare(report, json.load(handle)):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Dataset Router Microbenchmark for Project Samarth
+#
+# Compares the compiled DatasetRouter with the previous substring-scan
+# implementation of identify_relevant_datasets.
+#
+#   python -m samarth.benchmarks.bench_dataset_router --iterations 20000
+import argparse
+import os
+import sys
+import timeit
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from samarth.services.dataset_router import DatasetRouter, DEFAULT_ROUTES
+
+QUESTIONS = [
+    "What is the production trend of rice in Punjab from 2010 to 2015?",
+    "Which station has the highest average maximum temperature?",
+    "Show rainfall in Kerala during the 2018 monsoon",
+    "How has climate change affected wheat yields in Uttar Pradesh?",
+    "Top 5 crops by production in Maharashtra in 2012",
+    "Compare humidity and wind speed across districts of Gujarat",
+    "What is the total sown area in Bihar?",
+    "List the datasets you have",
+]
+
+
+def legacy_identify_relevant_datasets(question: str) -> List[str]:
+    """The substring-scan implementation the router replaced"""
+    agriculture_keywords = ["crop", "farm", "agriculture", "yield", "production", "harvest", "irrigation", "fertilizer", "pesticide", "rice", "wheat", "maize", "sugarcane"]
+    climate_keywords = ["weather", "rainfall", "temperature", "climate", "precipitation", "humidity", "monsoon", "wind", "heat", "cold", "warm", "hot", "cool", "chill"]
+    district_keywords = ["district", "station", "location", "place", "area", "region"]
+    temperature_keywords = ["temperature", "heat", "warm", "hot", "cold", "cool", "chill", "degrees", "celsius", "fahrenheit"]
+    highest_keywords = ["highest", "warmest", "hottest", "maximum", "peak", "top", "greatest", "most"]
+
+    datasets = set()
+    question_lower = question.lower()
+    if any(keyword in question_lower for keyword in agriculture_keywords):
+        datasets.add("agricultural_production")
+    if any(keyword in question_lower for keyword in climate_keywords):
+        datasets.add("weather_data")
+    if (any(keyword in question_lower for keyword in district_keywords) and
+        any(keyword in question_lower for keyword in temperature_keywords) and
+        any(keyword in question_lower for keyword in highest_keywords)):
+        datasets.add("climate_change_data")
+    elif "climate change" in question_lower or "global warming" in question_lower:
+        datasets.add("climate_change_data")
+    if not datasets:
+        datasets = {"agricultural_production", "weather_data", "climate_change_data"}
+    return list(datasets)
+
+
+def scaled_routes(extra_keywords: int) -> dict:
+    """Default rules plus synthetic keywords per dataset, as a larger config would have"""
+    routes = {"threshold": DEFAULT_ROUTES["threshold"], "datasets": {}}
+    for dataset, rule in DEFAULT_ROUTES["datasets"].items():
+        keywords = dict(rule["keywords"])
+        keywords.update({f"{dataset[:4]}term{i}": 1 for i in range(extra_keywords)})
+        routes["datasets"][dataset] = {**rule, "keywords": keywords}
+    return routes
+
+
+def substring_route(routes: dict, question: str) -> List[str]:
+    """Substring scan over the same rules, for comparing how both approaches scale"""
+    question_lower = question.lower()
+    return [dataset for dataset, rule in routes["datasets"].items()
+            if any(keyword in question_lower for keyword in rule["keywords"])]
+
+
+def run(iterations: int, extra_keywords: int):
+    router = DatasetRouter()
+
+    def bench(route):
+        for question in QUESTIONS:
+            route(question)
+
+    results = {}
+    for name, route in (("legacy substring scan", legacy_identify_relevant_datasets), ("compiled router", router.route)):
+        seconds = min(timeit.repeat(lambda: bench(route), number=iterations, repeat=3))
+        per_call = seconds / (iterations * len(QUESTIONS)) * 1e6
+        results[name] = per_call
+        print(f"{name:>22}: {per_call:.2f} µs per question")
+    print(f"{'speedup':>22}: {results['legacy substring scan'] / results['compiled router']:.2f}x")
+
+    routes = scaled_routes(extra_keywords)
+    scaled_router = DatasetRouter(routes)
+    print(f"\nWith {extra_keywords} extra keywords per dataset:")
+    for name, route in (("substring scan", lambda question: substring_route(routes, question)),
+                        ("compiled router", scaled_router.route)):
+        seconds = min(timeit.repeat(lambda: bench(route), number=max(1, iterations // 10), repeat=3))
+        print(f"{name:>22}: {seconds / (max(1, iterations // 10) * len(QUESTIONS)) * 1e6:.2f} µs per question")
+
+    print("\nRouting differences:")
+    for question in QUESTIONS:
+        legacy = sorted(legacy_identify_relevant_datasets(question))
+        routed = router.route(question)
+        if legacy != sorted(routed):
+            print(f"- {question}\n    legacy: {legacy}\n    router: {routed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dataset routing")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--extra-keywords", type=int, default=500)
+    args = parser.parse_args()
+    run(args.iterations, args.extra_keywords)
@@ -0,0 +1,145 @@
+# ETL Throughput Benchmark for Project Samarth
+#
+# Runs ETLPipeline's fetch, transform and load stages end to end against the
+# local data.gov.in stand-in (mock_data_gov), started in-process unless
+# --base-url points at one already running. Each stage is timed separately and
+# reported as records/sec with the peak RSS reached while it ran (sampled from
+# a background thread). Loading appends to the warehouse tables of
+# --database-url, so point it at a scratch database; without one the load
+# stage is skipped.
+#
+#   python -m samarth.benchmarks.bench_etl --agriculture-records 20000 --weather-records 20000 \
+#       --latency 0.02 --database-url postgresql://localhost/samarth_bench --output bench_etl.json
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from samarth.benchmarks import mock_data_gov
+from samarth.benchmarks.bench_ask import git_revision, rss_mb
+
+
+class PeakRSS:
+    """Track the highest resident set size while the block runs"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        current = rss_mb()["current"]
+        if current is not None and (self.peak is None or current > self.peak):
+            self.peak = current
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "PeakRSS":
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def run_stage(name: str, func: Callable[[], Any], count: Callable[[Any], int]) -> Tuple[Any, Dict[str, Any]]:
+    """Run one stage and measure its throughput and peak memory"""
+    with PeakRSS() as memory:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+    records = count(result)
+    stats = {
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(records / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": memory.peak,
+    }
+    print(f"  {name:<10} {records:>9} records {elapsed:>8.2f}s {stats['records_per_second'] or 0:>12,.0f}/s "
+          f"peak RSS {memory.peak} MiB")
+    return result, stats
+
+
+def run_dataset(pipeline: Any, resource_id: str, limit: int, transform: Callable[[List[Dict[str, Any]]], list],
+                store: Optional[Callable[[list], bool]]) -> Dict[str, Any]:
+    print(f"{resource_id}:")
+    raw, fetch_stats = run_stage("fetch", lambda: pipeline.fetch_records(resource_id, limit), len)
+    rows, transform_stats = run_stage("transform", lambda: transform(raw), len)
+    stages = {"fetch": fetch_stats, "transform": transform_stats}
+    if store is not None:
+        ok, stages["load"] = run_stage("load", lambda: store(rows), lambda ok: len(rows) if ok else 0)
+        stages["load"]["succeeded"] = ok
+    return {"resource_id": resource_id, "stages": stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ETLPipeline fetch, transform and load against a mock API")
+    parser.add_argument("--base-url", help="an already running data.gov.in stand-in; by default one is started here")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="Postgres to load into (rows are appended); the load stage is skipped without it")
+    parser.add_argument("--page-size", type=int, default=1000, help="records requested per page")
+    parser.add_argument("--datasets", default="agriculture,weather,district-weather",
+                        help="comma-separated subset of agriculture, weather and district-weather")
+    parser.add_argument("--output", default="bench_etl.json")
+    mock_data_gov.add_arguments(parser)
+    args = parser.parse_args()
+
+    # The database connection reads DATABASE_URL when imported
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DATA_GOV_IN_API_KEY", "mock")
+    from samarth.data.etl_pipeline import ETLPipeline
+
+    server = None
+    if args.base_url is None:
+        server = mock_data_gov.start_server(mock_data_gov.from_arguments(args))
+    base_url = args.base_url or mock_data_gov.base_url(server)
+    pipeline = ETLPipeline(base_url=base_url, page_size=args.page_size)
+    load = args.database_url is not None
+
+    datasets = {
+        "agriculture": (mock_data_gov.AGRICULTURE_RESOURCE, args.agriculture_records,
+                        pipeline.transform_agriculture_records, pipeline.store_agricultural_data),
+        "weather": (mock_data_gov.WEATHER_RESOURCE, args.weather_records,
+                    pipeline.transform_weather_records, pipeline.store_weather_data),
+        "district-weather": (mock_data_gov.DISTRICT_WEATHER_RESOURCE, args.weather_records,
+                             pipeline.transform_weather_records_by_district, pipeline.store_weather_data),
+    }
+    results = {}
+    try:
+        for name in [name.strip() for name in args.datasets.split(",") if name.strip()]:
+            resource_id, limit, transform, store = datasets[name]
+            results[name] = run_dataset(pipeline, resource_id, limit, transform, store if load else None)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(), "git_revision": git_revision()},
+        "load": load,
+        "datasets": results,
+        "memory_mb": rss_mb(),
+    }
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"peak RSS {report['memory_mb']['peak']} MiB; report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Response Serialization Benchmark for Project Samarth
+#
+# Encodes an /ask answer carrying a synthetic crop production result of
+# --rows rows every way the API can: FastAPI's default path (jsonable_encoder
+# then json.dumps), dumps() with orjson, and dumps() of the columnar encoding,
+# each also gzip- and (when installed) brotli-compressed. Reports the median
+# encode time and the bytes on the wire.
+#
+#   python -m samarth.benchmarks.bench_serialization --rows 50000 --repeat 5 --output bench_serialization.json
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi.encoders import jsonable_encoder
+from samarth.benchmarks.bench_ask import git_revision
+from samarth.utils import responses
+from samarth.utils.responses import compress, dumps, encode_result
+
+STATES = ["Punjab", "Haryana", "Uttar Pradesh", "West Bengal", "Andhra Pradesh", "Kerala", "Gujarat", "Bihar"]
+CROPS = ["Rice", "Wheat", "Maize", "Sugarcane", "Cotton", "Groundnut", "Bajra", "Jowar"]
+
+
+def sample_answer(rows: int, seed: int = 7) -> Dict[str, Any]:
+    """An answer shaped like the pipeline's, with NUMERIC columns as Decimal as psycopg2 returns them"""
+    rng = random.Random(seed)
+    data = [{
+        "state_name": rng.choice(STATES),
+        "district_name": f"District {rng.randint(1, 400)}",
+        "crop": rng.choice(CROPS),
+        "year": rng.randint(1997, 2015),
+        "area": Decimal(f"{rng.uniform(10, 90000):.2f}"),
+        "production": Decimal(f"{rng.uniform(5, 250000):.2f}"),
+    } for _ in range(rows)]
+    return {
+        "answer": "Production rose steadily over the period.",
+        "data_sources": ["crop_production"],
+        "sql_queries": ["SELECT state_name, district_name, crop, year, area, production FROM crop_production"],
+        "visualization_data": {"chart_type": "line", "data": data},
+        "confidence_score": 0.9,
+        "execution_time": 1.2,
+    }
+
+
+def timed(func: Callable[[], bytes], repeat: int) -> Dict[str, Any]:
+    """Median seconds of func over repeat runs, and the size of what it produced"""
+    seconds: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func()
+        seconds.append(time.perf_counter() - started)
+    return {"seconds": statistics.median(seconds), "body": body}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /ask response serialization and compression")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per encoding; the median is reported")
+    parser.add_argument("--level", type=int, default=int(os.getenv("COMPRESSION_LEVEL", "5")))
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    answer = sample_answer(args.rows)
+    encodings = {
+        "default": lambda: json.dumps(jsonable_encoder(answer)).encode("utf-8"),
+        "rows": lambda: dumps(encode_result(answer, "rows")),
+        "columnar": lambda: dumps(encode_result(answer, "columnar")),
+    }
+    codings = ["gzip"] + (["br"] if responses.brotli is not None else [])
+
+    results = []
+    for name, func in encodings.items():
+        encoded = timed(func, args.repeat)
+        row = {"encoding": name, "encode_ms": round(encoded["seconds"] * 1000, 2), "bytes": len(encoded["body"])}
+        for coding in codings:
+            compressed = timed(lambda: compress(encoded["body"], coding, args.level), args.repeat)
+            row[f"{coding}_bytes"] = len(compressed["body"])
+            row[f"{coding}_ms"] = round(compressed["seconds"] * 1000, 2)
+        results.append(row)
+
+    baseline = results[0]
+    print(f"{args.rows} rows, orjson {'available' if responses.orjson is not None else 'not installed'}, "
+          f"compression level {args.level}")
+    for row in results:
+        wire = min([row["bytes"]] + [row[f"{coding}_bytes"] for coding in codings])
+        print(f"  {row['encoding']:<9} encode {row['encode_ms']:>9.2f} ms ({baseline['encode_ms'] / row['encode_ms']:.1f}x)"
+              f"  {row['bytes'] / 1024:>9.1f} KiB"
+              + "".join(f"  {coding} {row[f'{coding}_bytes'] / 1024:>8.1f} KiB" for coding in codings)
+              + f"  ({baseline['bytes'] / wire:.1f}x smaller on the wire)")
+
+    if args.output:
+        report = {
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "rows": args.rows,
+            "orjson": responses.orjson is not None,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
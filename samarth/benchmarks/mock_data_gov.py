@@ -0,0 +1,209 @@
+# Mock data.gov.in API for Project Samarth
+#
+# A local stand-in for https://api.data.gov.in/resource/ serving deterministic,
+# data.gov.in-shaped paginated JSON, so ETLPipeline can be exercised and
+# benchmarked without the real API. Records are generated on demand from their
+# index, so large datasets cost no memory. Three resources are served:
+#
+#   mock-agriculture      wide state-wise crop production records, one field per
+#                         crop and year in the field-name patterns the ETL parses
+#   mock-weather          subdivision-wise monthly rainfall (subdivision, year, jan..dec)
+#   mock-district-weather district-wise monthly rainfall (state_ut, district, jan..dec)
+#
+#   python -m samarth.benchmarks.mock_data_gov --port 8765 --agriculture-records 5000 --latency 0.05
+#   DATA_GOV_IN_BASE_URL=http://127.0.0.1:8765/resource/ AGRICULTURE_RESOURCE_ID=mock-agriculture \
+#       WEATHER_RESOURCE_ID=mock-weather python samarth/data/etl_pipeline.py
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+AGRICULTURE_RESOURCE = "mock-agriculture"
+WEATHER_RESOURCE = "mock-weather"
+DISTRICT_WEATHER_RESOURCE = "mock-district-weather"
+
+STATES = ["Andhra Pradesh", "Assam", "Bihar", "Gujarat", "Haryana", "Karnataka", "Kerala", "Madhya Pradesh",
+          "Maharashtra", "Odisha", "Punjab", "Rajasthan", "Tamil Nadu", "Uttar Pradesh", "West Bengal"]
+CROPS = ["rice", "wheat", "jowar", "bajra", "maize", "ragi", "gram", "tur", "groundnut", "sugarcane",
+         "cotton", "jute", "soyabean", "rapeseed", "sunflower"]
+SUBDIVISIONS = ["Coastal Andhra Pradesh", "Assam & Meghalaya", "Bihar", "Gujarat Region", "Haryana Delhi & Chandigarh",
+                "Coastal Karnataka", "Kerala", "East Madhya Pradesh", "Madhya Maharashtra", "Odisha", "Punjab",
+                "West Rajasthan", "Tamil Nadu", "East Uttar Pradesh", "Gangetic West Bengal"]
+MONTH_FIELDS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+
+def crop_field_names(crops: int, years: int, first_year: int = 2005) -> List[str]:
+    """Wide agriculture field names, cycling through the three patterns seen on data.gov.in"""
+    names = []
+    for index in range(crops):
+        crop = CROPS[index] if index < len(CROPS) else f"crop{index}"
+        for year in range(first_year, first_year + years):
+            span = f"{year}_{(year + 1) % 100:02d}"
+            if index % 3 == 0:
+                names.append(f"food_grains_cereals__{crop}__production_is_thausand_toones__{span}")
+            elif index % 3 == 1:
+                names.append(f"{crop}_{span}")
+            else:
+                names.append(f"{crop}__th_tonnes__{span}")
+    return names
+
+
+class MockDataGov:
+    """Deterministic record generator behind the mock API"""
+
+    def __init__(self, agriculture_records: int = 1000, weather_records: int = 1000, crops: int = 10,
+                 years: int = 10, missing_rate: float = 0.05, latency: float = 0.0, seed: int = 42):
+        self.sizes = {
+            AGRICULTURE_RESOURCE: agriculture_records,
+            WEATHER_RESOURCE: weather_records,
+            DISTRICT_WEATHER_RESOURCE: weather_records,
+        }
+        self.generators = {
+            AGRICULTURE_RESOURCE: self.agriculture_record,
+            WEATHER_RESOURCE: self.weather_record,
+            DISTRICT_WEATHER_RESOURCE: self.district_weather_record,
+        }
+        self.fields = crop_field_names(crops, years)
+        self.missing_rate = missing_rate
+        self.latency = latency
+        self.seed = seed
+        self.requests = 0
+
+    def _random(self, resource_id: str, index: int) -> random.Random:
+        return random.Random(f"{self.seed}:{resource_id}:{index}")
+
+    def _value(self, rng: random.Random, low: float, high: float) -> str:
+        # The API returns numbers as strings, with "NA" for missing values
+        return "NA" if rng.random() < self.missing_rate else f"{rng.uniform(low, high):.2f}"
+
+    def agriculture_record(self, index: int) -> Dict[str, Any]:
+        rng = self._random(AGRICULTURE_RESOURCE, index)
+        state = STATES[index % len(STATES)]
+        record: Dict[str, Any] = {"state_ut_name": state if index < len(STATES) else f"{state} {index // len(STATES)}"}
+        for field in self.fields:
+            record[field] = self._value(rng, 0, 15000)
+        return record
+
+    def weather_record(self, index: int) -> Dict[str, Any]:
+        rng = self._random(WEATHER_RESOURCE, index)
+        record: Dict[str, Any] = {"subdivision": SUBDIVISIONS[index % len(SUBDIVISIONS)],
+                                  "year": str(1901 + index // len(SUBDIVISIONS))}
+        for month in MONTH_FIELDS:
+            record[month] = self._value(rng, 0, 900)
+        return record
+
+    def district_weather_record(self, index: int) -> Dict[str, Any]:
+        rng = self._random(DISTRICT_WEATHER_RESOURCE, index)
+        record: Dict[str, Any] = {"state_ut": STATES[index % len(STATES)], "district": f"District {index}"}
+        for month in MONTH_FIELDS:
+            record[month] = self._value(rng, 0, 900)
+        return record
+
+    def page(self, resource_id: str, offset: int, limit: int) -> Optional[Dict[str, Any]]:
+        """One page of a resource in the data.gov.in response shape, or None if it is unknown"""
+        generate = self.generators.get(resource_id)
+        if generate is None:
+            return None
+        total = self.sizes[resource_id]
+        records = [generate(index) for index in range(offset, min(total, offset + limit))]
+        return {
+            "index_name": resource_id,
+            "title": f"Mock {resource_id}",
+            "status": "ok",
+            "total": total,
+            "count": len(records),
+            "limit": str(limit),
+            "offset": str(offset),
+            "records": records,
+        }
+
+
+def _make_handler(mock: MockDataGov):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split("/") if part]
+            query = parse_qs(url.query)
+            try:
+                offset = int(query.get("offset", ["0"])[0])
+                limit = int(query.get("limit", ["10"])[0])
+            except ValueError:
+                self._send(400, {"status": "error", "message": "offset and limit must be integers"})
+                return
+            page = mock.page(parts[1], offset, limit) if len(parts) == 2 and parts[0] == "resource" else None
+            if mock.latency:
+                time.sleep(mock.latency)
+            mock.requests += 1
+            if page is None:
+                self._send(404, {"status": "error", "message": "Meta not found"})
+            else:
+                self._send(200, page)
+
+        def _send(self, status: int, body: Dict[str, Any]):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args: Any):
+            pass
+
+    return Handler
+
+
+def start_server(mock: MockDataGov, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve the mock on a background thread; port 0 picks a free port. Call shutdown() to stop."""
+    server = ThreadingHTTPServer((host, port), _make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-data-gov", daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/resource/"
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--agriculture-records", type=int, default=1000, help="rows in mock-agriculture")
+    parser.add_argument("--weather-records", type=int, default=1000, help="rows in each weather resource")
+    parser.add_argument("--crops", type=int, default=10, help="crops per agriculture row")
+    parser.add_argument("--years", type=int, default=10, help="years per crop in each agriculture row")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="fraction of values served as NA")
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per page, in seconds")
+    parser.add_argument("--random-seed", type=int, default=42)
+
+
+def from_arguments(args: argparse.Namespace) -> MockDataGov:
+    return MockDataGov(args.agriculture_records, args.weather_records, args.crops, args.years,
+                       args.missing_rate, args.latency, args.random_seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve data.gov.in-shaped mock resources")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(from_arguments(args)))
+    print(f"Serving {AGRICULTURE_RESOURCE}, {WEATHER_RESOURCE} and {DISTRICT_WEATHER_RESOURCE} "
+          f"at http://{args.host}:{args.port}/resource/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
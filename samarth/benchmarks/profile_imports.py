@@ -0,0 +1,135 @@
+# Import-Time Profiler for Project Samarth
+#
+# Measures cold-start cost, which matters for autoscaled containers: each run
+# imports the target module in a fresh interpreter with `python -X importtime`
+# and reports the median total, the slowest modules by cumulative time, and
+# whether any module in --forbid (heavy SDKs and plotting libraries that must
+# only load on first use) was imported. With --startup it also times the app
+# lifespan startup, which is where the services are built.
+#
+#   python -m samarth.benchmarks.profile_imports --runs 5 --top 20 --budget 1.5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from samarth.benchmarks.bench_ask import git_revision
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_FORBID = "google.generativeai,openai,matplotlib,pandas,samarth.services.query_service"
+
+# Prints {"modules": [...], "startup": seconds or null}; modules are those loaded by the import alone
+_PROBE = """
+import json, sys, time
+import {module}
+modules = sorted(sys.modules)
+startup = None
+if {startup}:
+    import asyncio
+    app = sys.modules["{module}"].app
+    started = time.perf_counter()
+    async def run():
+        async with app.router.lifespan_context(app):
+            pass
+    asyncio.run(run())
+    startup = time.perf_counter() - started
+print(json.dumps({{"modules": modules, "startup": startup}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Rows of `-X importtime` output as {module, self_us, cumulative_us, depth}"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return rows
+
+
+def profile_once(module: str, startup: bool) -> Dict[str, Any]:
+    """Import module in a fresh interpreter and collect its import tree"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, startup=startup)],
+                               capture_output=True, text=True, env=env, cwd=ROOT)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    rows = parse_importtime(completed.stderr)
+    probe = json.loads(completed.stdout.strip().splitlines()[-1])
+    top = next((row for row in reversed(rows) if row["module"] == module), None)
+    return {
+        "seconds": (top["cumulative_us"] if top else sum(row["self_us"] for row in rows)) / 1e6,
+        "rows": rows,
+        "modules": probe["modules"],
+        "startup_seconds": probe["startup"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of the Project Samarth app")
+    parser.add_argument("--module", default="samarth.main")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to import in; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--forbid", default=DEFAULT_FORBID,
+                        help="comma-separated modules that must not be imported; empty to skip the check")
+    parser.add_argument("--budget", type=float, help="exit non-zero if the median import takes longer, in seconds")
+    parser.add_argument("--startup", action="store_true", help="also time the app lifespan startup")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    runs = [profile_once(args.module, args.startup) for _ in range(max(1, args.runs))]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    last = runs[-1]
+
+    print(f"import {args.module}: median {seconds:.3f}s over {len(runs)} runs "
+          f"(min {min(run['seconds'] for run in runs):.3f}s, {len(last['modules'])} modules loaded)")
+    startup: Optional[float] = None
+    if args.startup:
+        startup = statistics.median(run["startup_seconds"] for run in runs)
+        print(f"lifespan startup: median {startup:.3f}s")
+
+    print(f"\nSlowest {args.top} modules by cumulative time (last run):")
+    slowest = sorted(last["rows"], key=lambda row: row["cumulative_us"], reverse=True)[:args.top]
+    for row in slowest:
+        print(f"  {row['cumulative_us'] / 1000:>9.1f} ms  {row['self_us'] / 1000:>8.1f} ms self  {row['module']}")
+
+    forbidden = [name.strip() for name in args.forbid.split(",") if name.strip()]
+    loaded = sorted(name for name in forbidden if name in last["modules"])
+    if loaded:
+        print(f"\nImported eagerly but should load on first use: {', '.join(loaded)}")
+
+    if args.output:
+        report = {
+            "module": args.module,
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "runs": [round(run["seconds"], 4) for run in runs],
+            "median_seconds": round(seconds, 4),
+            "startup_seconds": round(startup, 4) if startup is not None else None,
+            "slowest": slowest,
+            "forbidden_loaded": loaded,
+        }
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"report written to {args.output}")
+
+    over_budget = args.budget is not None and seconds > args.budget
+    if over_budget:
+        print(f"\nMedian import time {seconds:.3f}s exceeds the {args.budget:.3f}s budget")
+    sys.exit(1 if loaded or over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
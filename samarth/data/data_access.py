@@ -1,11 +1,34 @@
 # Data Access Layer for Project Samarth
 from typing import List, Optional, Dict, Any
+from psycopg2.extras import Json
 from .db_connection import db
 from ..models.data_models import AgriculturalProduction, WeatherData, ClimateChangeData, DatasetMetadata, UserQuery
 
 class AgriculturalDataAccess:
     """Data access for agricultural production data"""
     
+    # Parameterized queries shared with the intent matcher fast path
+    PRODUCTION_TRENDS_QUERY = """
+            SELECT year, production, area, yield_per_hectare
+            FROM agricultural_production 
+            WHERE crop = %s AND state = %s
+            ORDER BY year
+        """
+    TOP_CROPS_BY_PRODUCTION_QUERY = """
+            SELECT crop, production, area, yield_per_hectare
+            FROM agricultural_production 
+            WHERE state = %s AND year = %s
+            ORDER BY production DESC
+            LIMIT %s
+        """
+    PRODUCTION_BY_STATE_AND_YEAR_RANGE_QUERY = """
+            SELECT year, SUM(production) as total_production
+            FROM agricultural_production 
+            WHERE state = %s AND year BETWEEN %s AND %s
+            GROUP BY year
+            ORDER BY year
+        """
+    
     @staticmethod
     def get_production_by_state(state: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get agricultural production data for a specific state"""
@@ -20,41 +43,50 @@ class AgriculturalDataAccess:
     @staticmethod
     def get_production_trends(crop: str, state: str) -> List[Dict[str, Any]]:
         """Get production trends for a specific crop in a state"""
-        query = """
-            SELECT year, production, area, yield_per_hectare
-            FROM agricultural_production 
-            WHERE crop = %s AND state = %s
-            ORDER BY year
-        """
-        return db.execute_query(query, (crop, state))
+        return db.execute_query(AgriculturalDataAccess.PRODUCTION_TRENDS_QUERY, (crop, state))
     
     @staticmethod
     def get_top_crops_by_production(state: str, year: int, limit: int = 10) -> List[Dict[str, Any]]:
         """Get top crops by production for a state in a specific year"""
-        query = """
-            SELECT crop, production, area, yield_per_hectare
-            FROM agricultural_production 
-            WHERE state = %s AND year = %s
-            ORDER BY production DESC
-            LIMIT %s
-        """
-        return db.execute_query(query, (state, year, str(limit)))
+        return db.execute_query(AgriculturalDataAccess.TOP_CROPS_BY_PRODUCTION_QUERY, (state, year, str(limit)))
 
     @staticmethod
     def get_production_by_state_and_year_range(state: str, start_year: int, end_year: int) -> List[Dict[str, Any]]:
         """Get agricultural production data for a specific state within a year range"""
-        query = """
-            SELECT year, SUM(production) as total_production
-            FROM agricultural_production 
-            WHERE state = %s AND year BETWEEN %s AND %s
-            GROUP BY year
-            ORDER BY year
-        """
-        return db.execute_query(query, (state, start_year, end_year))
+        return db.execute_query(AgriculturalDataAccess.PRODUCTION_BY_STATE_AND_YEAR_RANGE_QUERY, (state, start_year, end_year))
 
 class WeatherDataAccess:
     """Data access for weather data"""
     
+    # Parameterized queries shared with the intent matcher fast path
+    RAINFALL_STATS_QUERY = """
+            SELECT 
+                EXTRACT(MONTH FROM date) as month,
+                AVG(rainfall) as avg_rainfall,
+                MAX(rainfall) as max_rainfall,
+                MIN(rainfall) as min_rainfall
+            FROM weather_data 
+            WHERE state = %s AND EXTRACT(YEAR FROM date) = %s
+            GROUP BY EXTRACT(MONTH FROM date)
+            ORDER BY month
+        """
+    TOP_RAINFALL_STATES_QUERY = """
+            SELECT state, SUM(rainfall) as total_rainfall
+            FROM weather_data 
+            WHERE EXTRACT(YEAR FROM date) = %s
+            GROUP BY state
+            ORDER BY total_rainfall DESC
+            LIMIT %s
+        """
+    TOP_RAINFALL_STATES_BY_MONTH_QUERY = """
+            SELECT state, SUM(rainfall) as total_rainfall
+            FROM weather_data 
+            WHERE EXTRACT(YEAR FROM date) = %s AND EXTRACT(MONTH FROM date) = %s
+            GROUP BY state
+            ORDER BY total_rainfall DESC
+            LIMIT %s
+        """
+    
     @staticmethod
     def get_weather_by_location(state: str, district: Optional[str] = None, 
                                start_date: Optional[str] = None, 
@@ -84,22 +116,34 @@ class WeatherDataAccess:
     @staticmethod
     def get_rainfall_stats(state: str, year: int) -> List[Dict[str, Any]]:
         """Get rainfall statistics for a state in a specific year"""
-        query = """
-            SELECT 
-                EXTRACT(MONTH FROM date) as month,
-                AVG(rainfall) as avg_rainfall,
-                MAX(rainfall) as max_rainfall,
-                MIN(rainfall) as min_rainfall
-            FROM weather_data 
-            WHERE state = %s AND EXTRACT(YEAR FROM date) = %s
-            GROUP BY EXTRACT(MONTH FROM date)
-            ORDER BY month
-        """
-        return db.execute_query(query, (state, year))
+        return db.execute_query(WeatherDataAccess.RAINFALL_STATS_QUERY, (state, year))
+    
+    @staticmethod
+    def get_top_rainfall_states(year: int, month: Optional[int] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the states with the highest total rainfall in a year, optionally for a single month"""
+        if month is not None:
+            return db.execute_query(WeatherDataAccess.TOP_RAINFALL_STATES_BY_MONTH_QUERY, (year, month, str(limit)))
+        return db.execute_query(WeatherDataAccess.TOP_RAINFALL_STATES_QUERY, (year, str(limit)))
 
 class ClimateChangeDataAccess:
     """Data access for climate change data"""
     
+    # Parameterized queries shared with the intent matcher fast path
+    TOP_STATIONS_BY_MAX_TEMPERATURE_QUERY = """
+            SELECT "Station_Name", AVG("Mean_Temperature_in_degree_C___Maximum") as avg_max_temp
+            FROM climate_change_data
+            GROUP BY "Station_Name"
+            ORDER BY avg_max_temp DESC
+            LIMIT %s
+        """
+    TOP_STATIONS_BY_MIN_TEMPERATURE_QUERY = """
+            SELECT "Station_Name", AVG("Mean_Temperature__in_degree_C___Minimum") as avg_min_temp
+            FROM climate_change_data
+            GROUP BY "Station_Name"
+            ORDER BY avg_min_temp DESC
+            LIMIT %s
+        """
+    
     @staticmethod
     def get_climate_data_by_station(station_name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get climate change data for a specific station"""
@@ -122,6 +166,13 @@ class ClimateChangeDataAccess:
         """
         return db.execute_query(query, (period, str(limit)))
     
+    @staticmethod
+    def get_top_stations_by_temperature(limit: int = 10, use_minimum: bool = False) -> List[Dict[str, Any]]:
+        """Get stations ranked by their average maximum (or minimum) temperature"""
+        query = (ClimateChangeDataAccess.TOP_STATIONS_BY_MIN_TEMPERATURE_QUERY if use_minimum
+                 else ClimateChangeDataAccess.TOP_STATIONS_BY_MAX_TEMPERATURE_QUERY)
+        return db.execute_query(query, (str(limit),))
+    
     @staticmethod
     def get_temperature_trends(station_name: str) -> List[Dict[str, Any]]:
         """Get temperature trends for a specific station"""
@@ -165,6 +216,12 @@ class MetadataAccess:
         """List all available datasets"""
         query = "SELECT dataset_name, description, last_updated FROM dataset_metadata ORDER BY dataset_name"
         return db.execute_query(query)
+    
+    @staticmethod
+    def get_dataset_versions() -> Dict[str, str]:
+        """Get the last update time of every dataset, used to version cached answers"""
+        query = "SELECT dataset_name, last_updated FROM dataset_metadata ORDER BY dataset_name"
+        return {row["dataset_name"]: str(row["last_updated"]) for row in db.execute_query(query)}
 
 class UserQueryAccess:
     """Data access for user queries"""
@@ -174,8 +231,9 @@ class UserQueryAccess:
         """Save a user query to the database"""
         insert_query = """
             INSERT INTO user_queries 
-            (question, answer, data_sources, sql_queries, confidence_score, user_id)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            (question, answer, data_sources, sql_queries, confidence_score, user_id, result_sources,
+             stage_timings, cache_status, execution_time, request_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
         params = (
             query.question,
@@ -183,7 +241,12 @@ class UserQueryAccess:
             query.data_sources,
             query.sql_queries,
             query.confidence_score,
-            query.user_id
+            query.user_id,
+            query.result_sources,
+            Json(query.stage_timings),
+            query.cache_status,
+            query.execution_time,
+            query.request_id
         )
         return db.execute_update(insert_query, params)
     
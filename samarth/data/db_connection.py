@@ -1,54 +1,228 @@
 # Database Connection Module
+#
+# Connections come from a bounded pool (DB_POOL_SIZE, 0 to connect per call);
+# callers still close() them, which hands a pooled connection back instead.
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 import os
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable
+try:
+    from samarth.utils.exceptions import DatabaseQueryException
+    from samarth.utils.metrics import SQL_SECONDS
+    from samarth.utils.tracing import tracer
+except ImportError:
+    # Running the ETL scripts standalone puts samarth/ itself on the path
+    from utils.exceptions import DatabaseQueryException
+    from utils.metrics import SQL_SECONDS
+    from utils.tracing import tracer
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection whose close() returns it to the pool it was checked out from"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.release: Optional[Callable[["PooledConnection"], None]] = None
+
+    def close(self):
+        release, self.release = self.release, None
+        if release is None:
+            super().close()
+        else:
+            release(self)
+
+
+class ConnectionPool:
+    """Bounded set of open connections shared by the threads of one process.
+
+    Checkouts beyond maxsize wait up to timeout seconds for a connection to be
+    returned. Returned connections are rolled back if a transaction is still
+    open; closed or broken ones are discarded and replaced on demand.
+    """
+
+    def __init__(self, connect: Callable[[], PooledConnection], maxsize: int, timeout: float):
+        self._connect = connect
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle: List[PooledConnection] = []
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.opened = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def acquire(self) -> PooledConnection:
+        if not self._slots.acquire(blocking=False):
+            self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                self.timeouts += 1
+                raise TimeoutError(f"No database connection free within {self.timeout}s ({self.maxsize} in use)")
+        try:
+            conn = None
+            with self._lock:
+                while self._idle and conn is None:
+                    conn = self._idle.pop()
+                    if conn.closed:
+                        conn = None
+            if conn is None:
+                conn = self._connect()
+                self.opened += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        conn.release = self._release
+        return conn
+
+    def _release(self, conn: PooledConnection):
+        try:
+            if not conn.closed:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    conn.close()
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except Exception:
+            conn.close()
+        with self._lock:
+            self.in_use -= 1
+            if not conn.closed:
+                self._idle.append(conn)
+        self._slots.release()
+
+    def warm_up(self, count: int) -> int:
+        """Open connections until count are idle; returns how many were opened"""
+        opened = self.opened
+        held = []
+        try:
+            for _ in range(min(count, self.maxsize)):
+                held.append(self.acquire())
+        finally:
+            for conn in held:
+                conn.close()
+        return self.opened - opened
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.maxsize,
+            "in_use": self.in_use,
+            "idle": len(self._idle),
+            "opened": self.opened,
+            "waits": self.waits,
+            "timeouts": self.timeouts
+        }
+
 
 class DatabaseConnection:
     def __init__(self):
         # Use connection string from .env file
         self.connection_string = os.getenv('DATABASE_URL')
+        self.pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+        self.pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+        self._pool: Optional[ConnectionPool] = None
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+    
+    def _connect(self, connection_factory: Any = None):
+        kwargs: Dict[str, Any] = {"cursor_factory": RealDictCursor}
+        if connection_factory is not None:
+            kwargs["connection_factory"] = connection_factory
+        if self.connection_string:
+            return psycopg2.connect(self.connection_string, **kwargs)
+        # Fallback to individual parameters
+        return psycopg2.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=os.getenv('DB_PORT', '5432'),
+            database=os.getenv('DB_NAME', 'samarth'),
+            user=os.getenv('DB_USER', 'postgres'),
+            password=os.getenv('DB_PASSWORD', 'password'),
+            **kwargs
+        )
+    
+    @property
+    def pool(self) -> Optional[ConnectionPool]:
+        """This process's connection pool, or None when pooling is disabled"""
+        if self.pool_size <= 0:
+            return None
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    # A pool inherited across fork is abandoned, not closed: its sockets are the parent's
+                    self._pool = ConnectionPool(lambda: self._connect(PooledConnection), self.pool_size,
+                                                self.pool_timeout)
+                    self._pool_pid = os.getpid()
+        return self._pool
     
     def get_connection(self):
-        """Create and return a database connection using connection string"""
+        """Return a database connection; close() it when done"""
         try:
-            if self.connection_string:
-                conn = psycopg2.connect(
-                    self.connection_string,
-                    cursor_factory=RealDictCursor
-                )
-            else:
-                # Fallback to individual parameters
-                conn = psycopg2.connect(
-                    host=os.getenv('DB_HOST', 'localhost'),
-                    port=os.getenv('DB_PORT', '5432'),
-                    database=os.getenv('DB_NAME', 'samarth'),
-                    user=os.getenv('DB_USER', 'postgres'),
-                    password=os.getenv('DB_PASSWORD', 'password'),
-                    cursor_factory=RealDictCursor
-                )
-            return conn
+            pool = self.pool
+            return pool.acquire() if pool is not None else self._connect()
         except Exception as e:
             print(f"Error connecting to database: {e}")
             return None
     
-    def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
-        """Execute a SELECT query and return results"""
-        conn = self.get_connection()
-        if not conn:
-            return []
+    def warm_up(self, count: int) -> int:
+        """Pre-open up to count pooled connections"""
+        pool = self.pool
+        return pool.warm_up(count) if pool is not None else 0
+    
+    def close(self):
+        """Close this process's idle pooled connections (at shutdown)"""
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.close_all()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        return self._pool.stats() if self._pool is not None and self._pool_pid == os.getpid() else {}
+    
+    def execute_query(self, query: str, params: Optional[tuple] = None,
+                      raise_on_error: bool = False) -> List[Dict[str, Any]]:
+        """Execute a SELECT query and return results.
         
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                # Convert RealDictRow objects to regular dicts
-                return [dict(row) for row in results]
-        except Exception as e:
-            print(f"Error executing query: {e}")
-            return []
-        finally:
-            conn.close()
+        Errors are logged and return [] unless raise_on_error is set, in which
+        case they raise DatabaseQueryException with the Postgres error code.
+        """
+        start = time.perf_counter()
+        outcome = "error"
+        with tracer.span("db.query", statement=" ".join(query.split())[:200]) as span:
+            conn = self.get_connection()
+            try:
+                if not conn:
+                    if raise_on_error:
+                        raise DatabaseQueryException(query, "Database connection not available")
+                    return []
+                
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(query, params)
+                        results = cursor.fetchall()
+                        outcome = "ok"
+                        if span is not None:
+                            span.set(rows=len(results))
+                        # Convert RealDictRow objects to regular dicts
+                        return [dict(row) for row in results]
+                except Exception as e:
+                    print(f"Error executing query: {e}")
+                    if raise_on_error:
+                        error = getattr(getattr(e, "diag", None), "message_primary", None) or str(e).strip()
+                        raise DatabaseQueryException(query, error, getattr(e, "pgcode", None))
+                    return []
+                finally:
+                    conn.close()
+            finally:
+                SQL_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+                if span is not None and outcome != "ok":
+                    span.status = "error"
     
     def execute_update(self, query: str, params: Optional[tuple] = None) -> bool:
         """Execute an INSERT/UPDATE/DELETE query"""
@@ -4,7 +4,8 @@ import json
 import os
 import sys
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -35,145 +36,282 @@ except ImportError:
             print("Warning: Could not import database connection module")
             db = None
 
+# The schema catalog caches table statistics used in prompts; it is only
+# available when running as part of the samarth package
+try:
+    from samarth.services.schema_catalog import schema_catalog
+except ImportError:
+    schema_catalog = None
+
+DEFAULT_BASE_URL = "https://api.data.gov.in/resource/"
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+}
+
+# Crop names produced by field names that carry only the unit (as per requirements)
+INVALID_CROPS = ["production_is_thousand", "production_is_thausand", "production_is_thausand_toones"]
+
+
+@lru_cache(maxsize=4096)
+def parse_crop_field(field_name: str) -> Optional[Tuple[str, int]]:
+    """Crop name and year encoded in a wide agriculture field name, or None if it is not a crop column.
+
+    Wide records repeat the same field names on every row, so the parse is cached.
+    """
+    try:
+        crop_name = "Unknown"
+        year = 2015  # Default year
+
+        # Pattern 1: food_grains_cereals__rice__production_is_thausand_toones__2009_10
+        if "__" in field_name and "production" in field_name:
+            parts = field_name.split("__")
+            crop_name = parts[1].title()
+            # Extract year from the end
+            if len(parts) >= 4 and parts[-1].startswith("20"):
+                year = int(parts[-1].split("_")[0])
+
+        # Pattern 2: rice_2013_14
+        elif "_" in field_name and field_name.count("_") >= 2:
+            parts = field_name.split("_")
+            if parts[-1].isdigit() and parts[-2].isdigit():
+                crop_name = "_".join(parts[:-2]).title()
+                year = int(parts[-2])
+
+        # Pattern 3: rice__th_tonnes__2014_15
+        elif field_name.count("__") >= 2:
+            parts = field_name.split("__")
+            if len(parts) >= 3 and parts[-1].startswith("20"):
+                year_parts = parts[-1].split("_")
+                if len(year_parts) >= 2:
+                    year = int(year_parts[0])
+                crop_name = parts[0].title()
+    except (ValueError, IndexError):
+        return None
+
+    if any(invalid_crop in crop_name.lower() for invalid_crop in INVALID_CROPS):
+        return None
+    return crop_name, year
+
+
+def _parse_rainfall(value: Any) -> float:
+    if value in (None, "NA", "", "NULL"):
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _weather_row(state: str, district: str, date_str: str, rainfall: float) -> Dict[str, Any]:
+    return {
+        "state": state,
+        "district": district,
+        "date": date_str,
+        "rainfall": rainfall,
+        "temperature_max": 0.0,  # Not available in this dataset
+        "temperature_min": 0.0,  # Not available in this dataset
+        "humidity": 0.0,  # Not available in this dataset
+        "wind_speed": 0.0  # Not available in this dataset
+    }
+
 class ETLPipeline:
     """ETL Pipeline for integrating government datasets from data.gov.in"""
     
-    def __init__(self):
+    def __init__(self, base_url: Optional[str] = None, page_size: Optional[int] = None):
         self.api_key = os.getenv("DATA_GOV_IN_API_KEY")
-        self.base_url = "https://api.data.gov.in/resource/"
-        
-    def fetch_agriculture_data_filtered(self, resource_id: str, start_state: str = "", min_year: int = 2010, crop_filter: str = "Total-Pulse", limit: int = 1000) -> List[Dict[str, Any]]:
-        """Fetch agricultural data from Ministry of Agriculture & Farmers Welfare, 
-        optionally starting from a specific state, with filtering by year and crop type"""
-        try:
-            url = f"{self.base_url}{resource_id}"
+        # Point at a local stand-in (see samarth/benchmarks/mock_data_gov.py) to run without the real API
+        self.base_url = (base_url or os.getenv("DATA_GOV_IN_BASE_URL", DEFAULT_BASE_URL)).rstrip("/") + "/"
+        self.page_size = page_size or int(os.getenv("DATA_GOV_IN_PAGE_SIZE", "1000"))
+        self.timeout = float(os.getenv("DATA_GOV_IN_TIMEOUT", "60"))
+        # Reuse one connection across pages
+        self.session = requests.Session()
+
+    def fetch_records(self, resource_id: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Fetch up to limit raw records from a data.gov.in resource, one page at a time"""
+        url = f"{self.base_url}{resource_id}"
+        print(f"Fetching records from: {url}")
+        if self.api_key:
+            print(f"API Key: {self.api_key[:10]}...")  # Print first 10 characters of API key for debugging
+        else:
+            print("API Key: None")
+
+        records: List[Dict[str, Any]] = []
+        while len(records) < limit:
+            requested = min(self.page_size, limit - len(records))
             params = {
                 "api-key": self.api_key,
                 "format": "json",
-                "limit": limit
+                "limit": requested,
+                "offset": len(records)
             }
-            
-            print(f"Fetching agricultural data from: {url}")
-            if self.api_key:
-                print(f"API Key: {self.api_key[:10]}...")  # Print first 10 characters of API key for debugging
-            else:
-                print("API Key: None")
-            
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
-            
             data = response.json()
-            
-            # Print the raw API response structure for debugging
-            print("Raw API response structure:")
-            if "records" in data:
-                records = data["records"]
-                print(f"Number of records: {len(records)}")
-                if records:
-                    print("First record keys:", list(records[0].keys()) if records else "No records")
-                    print("First record:", records[0] if records else "No records")
-            else:
-                print("Response keys:", list(data.keys()))
-                print("Full response:", data)
-            
-            records = data.get("records", [])
-            
-            print(f"Fetched {len(records)} agricultural records")
-            
-            # Transform data to match our schema
-            transformed_records = []
-            
-            # Process all records and extract crop data
-            start_processing = start_state == ""  # If no start_state, start processing immediately
-            
-            for i, record in enumerate(records):
-                state = record.get("state_ut_name")
-                if not state:
+
+            if not records:
+                # Print the raw API response structure for debugging
+                if "records" in data:
+                    print(f"Total records available: {data.get('total', 'unknown')}")
+                    if data["records"]:
+                        print("First record keys:", list(data["records"][0].keys()))
+                else:
+                    print("Response keys:", list(data.keys()))
+                    print("Full response:", data)
+
+            page = data.get("records", [])
+            records.extend(page)
+            total = data.get("total")
+            if len(page) < requested or (isinstance(total, int) and len(records) >= total):
+                break
+
+        print(f"Fetched {len(records)} records")
+        return records
+
+    def transform_agriculture_records(self, records: List[Dict[str, Any]], start_state: str = "",
+                                      min_year: int = 2010, crop_filter: str = "") -> List[Dict[str, Any]]:
+        """Unpivot wide state-wise crop production records into one row per state, crop and year,
+        optionally starting from a specific state, with filtering by year and crop type"""
+        transformed_records = []
+
+        # Process all records and extract crop data
+        start_processing = start_state == ""  # If no start_state, start processing immediately
+
+        for i, record in enumerate(records):
+            state = record.get("state_ut_name")
+            if not state:
+                continue
+
+            # If we have a start_state, begin processing when we reach it
+            if not start_processing:
+                if state == start_state:
+                    start_processing = True
+                else:
+                    continue  # Skip until we reach the start_state
+
+            # Process each field in the record to extract crop data
+            for field_name, production_str in record.items():
+                if production_str in (None, "NA", "") or field_name == "state_ut_name":
                     continue
-                    
-                # If we have a start_state, begin processing when we reach it
-                if not start_processing:
-                    if state == start_state:
-                        start_processing = True
-                    else:
-                        continue  # Skip until we reach the start_state
-                        
-                # Process each field in the record to extract crop data
-                for field_name, production_str in record.items():
-                    if production_str not in [None, "NA", ""] and field_name != "state_ut_name":
-                        # Try to parse the field name to extract crop and year
-                        try:
-                            # Handle different field name patterns
-                            crop_name = "Unknown"
-                            year = 2015  # Default year
-                            
-                            # Pattern 1: food_grains_cereals__rice__production_is_thausand_toones__2009_10
-                            if "__" in field_name and "production" in field_name:
-                                parts = field_name.split("__")
-                                if len(parts) >= 2:
-                                    crop_name = parts[1].split("__")[0].title()
-                                    # Extract year from the end
-                                    if "__" in field_name and field_name.count("__") >= 3:
-                                        year_part = field_name.split("__")[-1]
-                                        if year_part.startswith("20"):
-                                            year_str = year_part.split("_")[0]
-                                            year = int(year_str)
-                            
-                            # Pattern 2: rice_2013_14
-                            elif "_" in field_name and field_name.count("_") >= 2:
-                                parts = field_name.split("_")
-                                if parts[-1].isdigit() and parts[-2].isdigit():
-                                    crop_name = "_".join(parts[:-2]).title()
-                                    year = int(parts[-2])
-                            
-                            # Pattern 3: rice__th_tonnes__2014_15
-                            elif field_name.count("__") >= 2:
-                                parts = field_name.split("__")
-                                if len(parts) >= 3 and parts[-1].startswith("20"):
-                                    year_part = parts[-1]
-                                    year_parts = year_part.split("_")
-                                    if len(year_parts) >= 2:
-                                        year = int(year_parts[0])
-                                    crop_name = parts[0].title()
-                            
-                            # Filter out invalid crop names (as per requirements)
-                            invalid_crops = ["production_is_thousand", "production_is_thausand", "production_is_thausand_toones"]
-                            if any(invalid_crop in crop_name.lower() for invalid_crop in invalid_crops):
-                                continue  # Skip this record
-                            
-                            # Apply filters
-                            # Filter by year (only include records after min_year)
-                            if year < min_year:
-                                continue
-                                
-                            # Filter by crop type if specified
-                            if crop_filter and crop_filter.lower() not in crop_name.lower():
-                                continue
-                            
-                            # Convert production to float
-                            production = float(production_str)
-                            
-                            transformed_record = {
-                                "state": state,
-                                "district": "State Level",  # This is state-level data
-                                "crop": crop_name,
-                                "year": year,
-                                "season": "Annual",  # Default value
-                                "area": 0.0,  # Not available in this dataset
-                                "production": production,
-                                "yield_per_hectare": 0.0  # Not available in this dataset
-                            }
-                            
-                            # Print first few records for debugging
-                            if i < 1 and len(transformed_records) < 5:
-                                print(f"Transformed record {len(transformed_records)}: {transformed_record}")
-                            
-                            transformed_records.append(transformed_record)
-                        except (ValueError, IndexError):
-                            # Skip if we can't parse the field name or convert to float
-                            continue
-            
-            return transformed_records
+                parsed = parse_crop_field(field_name)
+                if parsed is None:
+                    continue
+                crop_name, year = parsed
+
+                # Filter by year (only include records after min_year)
+                if year < min_year:
+                    continue
+
+                # Filter by crop type if specified
+                if crop_filter and crop_filter.lower() not in crop_name.lower():
+                    continue
+
+                try:
+                    production = float(production_str)
+                except (TypeError, ValueError):
+                    # Skip if we can't convert to float
+                    continue
+
+                transformed_record = {
+                    "state": state,
+                    "district": "State Level",  # This is state-level data
+                    "crop": crop_name,
+                    "year": year,
+                    "season": "Annual",  # Default value
+                    "area": 0.0,  # Not available in this dataset
+                    "production": production,
+                    "yield_per_hectare": 0.0  # Not available in this dataset
+                }
+
+                # Print first few records for debugging
+                if i < 1 and len(transformed_records) < 5:
+                    print(f"Transformed record {len(transformed_records)}: {transformed_record}")
+
+                transformed_records.append(transformed_record)
+
+        print(f"Transformed {len(transformed_records)} agricultural records")
+        return transformed_records
+
+    def transform_weather_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Unpivot subdivision-wise monthly rainfall records (subdivision, year, jan..dec)"""
+        transformed_records = []
+
+        for i, record in enumerate(records):
+            subdivision = record.get("subdivision")
+            year = record.get("year")
+
+            # Skip if essential fields are missing
+            if not subdivision or not year:
+                continue
+
+            # Use subdivision as state and "Unknown" as district
+            try:
+                year_int = int(year)
+            except ValueError:
+                # Use default year if parsing fails
+                year_int = 2000
+
+            for month_abbr, month_num in MONTHS.items():
+                if month_abbr in record:
+                    transformed_record = _weather_row(subdivision, "Unknown", f"{year_int}-{month_num:02d}-15",
+                                                      _parse_rainfall(record.get(month_abbr)))
+
+                    # Print first few records for debugging
+                    if i < 1 and len(transformed_records) < 5:
+                        print(f"Transformed record {len(transformed_records)}: {transformed_record}")
+
+                    transformed_records.append(transformed_record)
+
+        print(f"Transformed {len(transformed_records)} weather records")
+        return transformed_records
+
+    def transform_weather_records_by_district(self, records: List[Dict[str, Any]], states=None) -> List[Dict[str, Any]]:
+        """Unpivot district-wise monthly rainfall records (state_ut, district, jan..dec),
+        optionally filtering by states"""
+        transformed_records = []
+        # The district-wise dataset has no year field
+        year = 2020
+        skipped_missing = 0
+        skipped_filtered = 0
+
+        for record in records:
+            state_ut = record.get("state_ut")
+            district = record.get("district")
+
+            # Skip if essential fields are missing
+            if not state_ut:
+                skipped_missing += 1
+                continue
+
+            # If we have a state filter, only process records for those states
+            if states is not None and state_ut not in states:
+                skipped_filtered += 1
+                continue
+
+            for month_abbr, month_num in MONTHS.items():
+                if month_abbr in record:
+                    transformed_record = _weather_row(state_ut, district if district else "Unknown",
+                                                      f"{year}-{month_num:02d}-15",
+                                                      _parse_rainfall(record.get(month_abbr)))
+
+                    # Print first few records for debugging
+                    if len(transformed_records) < 5:
+                        print(f"Transformed record {len(transformed_records)}: {transformed_record}")
+
+                    transformed_records.append(transformed_record)
+
+        if skipped_missing or skipped_filtered:
+            print(f"Skipped {skipped_missing} records missing state_ut and {skipped_filtered} outside {states}")
+        print(f"Transformed {len(transformed_records)} weather records")
+        return transformed_records
+
+    def fetch_agriculture_data_filtered(self, resource_id: str, start_state: str = "", min_year: int = 2010, crop_filter: str = "Total-Pulse", limit: int = 1000) -> List[Dict[str, Any]]:
+        """Fetch agricultural data from Ministry of Agriculture & Farmers Welfare, 
+        optionally starting from a specific state, with filtering by year and crop type"""
+        try:
+            records = self.fetch_records(resource_id, limit)
+            return self.transform_agriculture_records(records, start_state, min_year, crop_filter)
         except Exception as e:
             print(f"Error fetching agriculture data: {str(e)}")
             import traceback
@@ -183,106 +321,8 @@ class ETLPipeline:
     def fetch_weather_data_filtered(self, resource_id: str, states = None, limit: int = 1000) -> List[Dict[str, Any]]:
         """Fetch weather data from India Meteorological Department (IMD), optionally filtering by states"""
         try:
-            url = f"{self.base_url}{resource_id}"
-            params = {
-                "api-key": self.api_key,
-                "format": "json",
-                "limit": limit
-            }
-            
-            print(f"Fetching weather data from: {url}")
-            if self.api_key:
-                print(f"API Key: {self.api_key[:10]}...")  # Print first 10 characters of API key for debugging
-            else:
-                print("API Key: None")
-            
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Print the raw API response structure for debugging
-            print("Raw API response structure:")
-            if "records" in data:
-                records = data["records"]
-                print(f"Number of records: {len(records)}")
-                if records:
-                    print("First record keys:", list(records[0].keys()) if records else "No records")
-                    print("First record:", records[0] if records else "No records")
-            else:
-                print("Response keys:", list(data.keys()))
-                print("Full response:", data)
-            
-            records = data.get("records", [])
-            
-            print(f"Fetched {len(records)} weather records")
-            
-            # Transform data to match our schema
-            transformed_records = []
-            month_mapping = {
-                "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
-                "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
-            }
-            
-            for i, record in enumerate(records):
-                # Updated to match actual API response structure from the log
-                state_ut = record.get("state_ut")
-                district = record.get("district")
-                
-                # Based on the API response you showed, there's no explicit 'year' field
-                # The data seems to be organized by state/district with monthly values
-                # We'll need to handle this differently
-                
-                # For now, let's check if there's any metadata in the response that might contain year info
-                year = 2020  # Default year
-                
-                # Skip if essential fields are missing
-                if not state_ut:
-                    print(f"Skipping record {i} due to missing state_ut")
-                    continue
-                
-                # If we have a state filter, only process records for those states
-                if states is not None and state_ut not in states:
-                    print(f"Skipping record {i} due to state filter: {state_ut} not in {states}")
-                    continue
-                
-                # Use state_ut as state since that's what the API provides
-                state = state_ut
-                
-                # For each month column, create a separate record with approximate dates
-                for month_abbr, month_num in month_mapping.items():
-                    if month_abbr in record:
-                        rainfall_str = record.get(month_abbr)
-                        rainfall = 0.0
-                        if rainfall_str not in [None, "NA", "", "NULL"]:
-                            try:
-                                rainfall = float(rainfall_str)
-                            except ValueError:
-                                print(f"Could not convert rainfall value '{rainfall_str}' to float")
-                                pass
-                        
-                        # Create a date for the middle of the month
-                        date_str = f"{year}-{month_num:02d}-15"
-                        
-                        transformed_record = {
-                            "state": state,
-                            "district": district if district else "Unknown",
-                            "date": date_str,
-                            "rainfall": rainfall,
-                            "temperature_max": 0.0,  # Not available in this dataset
-                            "temperature_min": 0.0,  # Not available in this dataset
-                            "humidity": 0.0,  # Not available in this dataset
-                            "wind_speed": 0.0  # Not available in this dataset
-                        }
-                        
-                        # Print first few records for debugging
-                        if len(transformed_records) < 5:
-                            print(f"Transformed record {len(transformed_records)}: {transformed_record}")
-                        
-                        transformed_records.append(transformed_record)
-            
-            print(f"Transformed {len(transformed_records)} weather records")
-            return transformed_records
+            records = self.fetch_records(resource_id, limit)
+            return self.transform_weather_records_by_district(records, states)
         except Exception as e:
             print(f"Error fetching weather data: {str(e)}")
             import traceback
@@ -292,98 +332,8 @@ class ETLPipeline:
     def fetch_weather_data(self, resource_id: str, limit: int = 1000) -> List[Dict[str, Any]]:
         """Fetch weather data from India Meteorological Department (IMD)"""
         try:
-            url = f"{self.base_url}{resource_id}"
-            params = {
-                "api-key": self.api_key,
-                "format": "json",
-                "limit": limit
-            }
-            
-            print(f"Fetching weather data from: {url}")
-            if self.api_key:
-                print(f"API Key: {self.api_key[:10]}...")  # Print first 10 characters of API key for debugging
-            else:
-                print("API Key: None")
-            
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Print the raw API response structure for debugging
-            print("Raw API response structure:")
-            if "records" in data:
-                records = data["records"]
-                print(f"Number of records: {len(records)}")
-                if records:
-                    print("First record keys:", list(records[0].keys()) if records else "No records")
-                    print("First record:", records[0] if records else "No records")
-            else:
-                print("Response keys:", list(data.keys()))
-                print("Full response:", data)
-            
-            records = data.get("records", [])
-            
-            print(f"Fetched {len(records)} weather records")
-            
-            # Transform data to match our schema
-            transformed_records = []
-            month_mapping = {
-                "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
-                "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
-            }
-            
-            for i, record in enumerate(records):
-                # Updated to match actual API response structure
-                subdivision = record.get("subdivision")
-                year = record.get("year")
-                
-                # Skip if essential fields are missing
-                if not subdivision or not year:
-                    continue
-                
-                # Split subdivision to get state/district if possible
-                # For now, we'll use subdivision as state and "Unknown" as district
-                state = subdivision
-                district = "Unknown"
-                
-                # For each month column, create a separate record with approximate dates
-                for month_abbr, month_num in month_mapping.items():
-                    if month_abbr in record:
-                        rainfall_str = record.get(month_abbr)
-                        rainfall = 0.0
-                        if rainfall_str not in [None, "NA", "", "NULL"]:
-                            try:
-                                rainfall = float(rainfall_str)
-                            except ValueError:
-                                pass
-                        
-                        # Create a date for the middle of the month
-                        try:
-                            year_int = int(year)
-                            date_str = f"{year_int}-{month_num:02d}-15"
-                        except ValueError:
-                            # Use default year if parsing fails
-                            date_str = f"2000-{month_num:02d}-15"
-                        
-                        transformed_record = {
-                            "state": state,
-                            "district": district,
-                            "date": date_str,
-                            "rainfall": rainfall,
-                            "temperature_max": 0.0,  # Not available in this dataset
-                            "temperature_min": 0.0,  # Not available in this dataset
-                            "humidity": 0.0,  # Not available in this dataset
-                            "wind_speed": 0.0  # Not available in this dataset
-                        }
-                        
-                        # Print first few records for debugging
-                        if i < 1 and len(transformed_records) < 5:
-                            print(f"Transformed record {len(transformed_records)}: {transformed_record}")
-                        
-                        transformed_records.append(transformed_record)
-            
-            return transformed_records
+            records = self.fetch_records(resource_id, limit)
+            return self.transform_weather_records(records)
         except Exception as e:
             print(f"Error fetching weather data: {str(e)}")
             import traceback
@@ -393,120 +343,8 @@ class ETLPipeline:
     def fetch_agriculture_data(self, resource_id: str, limit: int = 1000) -> List[Dict[str, Any]]:
         """Fetch agricultural data from Ministry of Agriculture & Farmers Welfare"""
         try:
-            url = f"{self.base_url}{resource_id}"
-            params = {
-                "api-key": self.api_key,
-                "format": "json",
-                "limit": limit
-            }
-            
-            print(f"Fetching agricultural data from: {url}")
-            if self.api_key:
-                print(f"API Key: {self.api_key[:10]}...")  # Print first 10 characters of API key for debugging
-            else:
-                print("API Key: None")
-            
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Print the raw API response structure for debugging
-            print("Raw API response structure:")
-            if "records" in data:
-                records = data["records"]
-                print(f"Number of records: {len(records)}")
-                if records:
-                    print("First record keys:", list(records[0].keys()) if records else "No records")
-                    print("First record:", records[0] if records else "No records")
-            else:
-                print("Response keys:", list(data.keys()))
-                print("Full response:", data)
-            
-            records = data.get("records", [])
-            
-            print(f"Fetched {len(records)} agricultural records")
-            
-            # Transform data to match our schema
-            transformed_records = []
-            
-            # Process all records and extract crop data
-            for i, record in enumerate(records):
-                state = record.get("state_ut_name")
-                if not state:
-                    continue
-                    
-                # Process each field in the record to extract crop data
-                for field_name, production_str in record.items():
-                    if production_str not in [None, "NA", ""] and field_name != "state_ut_name":
-                        # Try to parse the field name to extract crop and year
-                        try:
-                            # Handle different field name patterns
-                            crop_name = "Unknown"
-                            year = 2015  # Default year
-                            
-                            # Pattern 1: food_grains_cereals__rice__production_is_thausand_toones__2009_10
-                            if "__" in field_name and "production" in field_name:
-                                parts = field_name.split("__")
-                                if len(parts) >= 2:
-                                    crop_name = parts[1].split("__")[0].title()
-                                    # Extract year from the end
-                                    if "__" in field_name and field_name.count("__") >= 3:
-                                        year_part = field_name.split("__")[-1]
-                                        if year_part.startswith("20"):
-                                            year_str = year_part.split("_")[0]
-                                            year = int(year_str)
-                            
-                            # Pattern 2: rice_2013_14
-                            elif "_" in field_name and field_name.count("_") >= 2:
-                                parts = field_name.split("_")
-                                if parts[-1].isdigit() and parts[-2].isdigit():
-                                    crop_name = "_".join(parts[:-2]).title()
-                                    year = int(parts[-2])
-                            
-                            # Pattern 3: rice__th_tonnes__2014_15
-                            elif field_name.count("__") >= 2:
-                                parts = field_name.split("__")
-                                if len(parts) >= 3 and parts[-1].startswith("20"):
-                                    year_part = parts[-1]
-                                    year_parts = year_part.split("_")
-                                    if len(year_parts) >= 2:
-                                        year = int(year_parts[0])
-                                    crop_name = parts[0].title()
-                            
-                            # Filter out invalid crop names (as per requirements)
-                            invalid_crops = ["production_is_thousand", "production_is_thausand", "production_is_thausand_toones"]
-                            if any(invalid_crop in crop_name.lower() for invalid_crop in invalid_crops):
-                                continue  # Skip this record
-                            
-                            # Filter by year (only include records from 2010 onwards)
-                            if year < 2010:
-                                continue
-                            
-                            # Convert production to float
-                            production = float(production_str)
-                            
-                            transformed_record = {
-                                "state": state,
-                                "district": "State Level",  # This is state-level data
-                                "crop": crop_name,
-                                "year": year,
-                                "season": "Annual",  # Default value
-                                "area": 0.0,  # Not available in this dataset
-                                "production": production,
-                                "yield_per_hectare": 0.0  # Not available in this dataset
-                            }
-                            
-                            # Print first few records for debugging
-                            if i < 1 and len(transformed_records) < 5:
-                                print(f"Transformed record {len(transformed_records)}: {transformed_record}")
-                            
-                            transformed_records.append(transformed_record)
-                        except (ValueError, IndexError):
-                            # Skip if we can't parse the field name or convert to float
-                            continue
-            
-            return transformed_records
+            records = self.fetch_records(resource_id, limit)
+            return self.transform_agriculture_records(records)
         except Exception as e:
             print(f"Error fetching agriculture data: {str(e)}")
             import traceback
@@ -654,13 +492,15 @@ class ETLPipeline:
                 resource_id,
                 datetime.now(),
                 record_count,
-                f"https://api.data.gov.in/resource/{resource_id}",
+                f"{self.base_url}{resource_id}",
                 description
             )
             
             success = db.execute_update(upsert_query, params)
             if success:
                 print(f"Successfully updated metadata for {dataset_name}")
+                if schema_catalog is not None:
+                    schema_catalog.invalidate()
             else:
                 print(f"Failed to update metadata for {dataset_name}")
             return success
@@ -141,10 +141,29 @@ def initialize_database():
                 sql_queries TEXT[],
                 confidence_score DECIMAL,
                 user_id VARCHAR(100),
+                result_sources TEXT[],
+                stage_timings JSONB,
+                cache_status VARCHAR(20),
+                execution_time DECIMAL,
+                request_id VARCHAR(64),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """
         
+        # Datasets whose queries returned rows, used to train the dataset classifier
+        add_result_sources_column = """
+            ALTER TABLE user_queries ADD COLUMN IF NOT EXISTS result_sources TEXT[]
+        """
+        
+        # Per-stage pipeline timings, answer cache outcome and trace ID for each logged question
+        add_timing_columns = """
+            ALTER TABLE user_queries
+                ADD COLUMN IF NOT EXISTS stage_timings JSONB,
+                ADD COLUMN IF NOT EXISTS cache_status VARCHAR(20),
+                ADD COLUMN IF NOT EXISTS execution_time DECIMAL,
+                ADD COLUMN IF NOT EXISTS request_id VARCHAR(64)
+        """
+        
         # Execute table creation queries
         cursor = conn.cursor()
         cursor.execute(create_agricultural_table)
@@ -152,6 +171,8 @@ def initialize_database():
         cursor.execute(create_climate_table)
         cursor.execute(create_metadata_table)
         cursor.execute(create_queries_table)
+        cursor.execute(add_result_sources_column)
+        cursor.execute(add_timing_columns)
         
         # Insert sample metadata
         try:
@@ -15,7 +15,7 @@ else:
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from samarth.services.query_service import query_service
+from samarth.services.container import services
 
 async def demo():
     """Demonstrate the capabilities of Project Samarth"""
@@ -37,7 +37,7 @@ async def demo():
         
         try:
             # Process the question through our pipeline
-            result = await query_service.process_query(question)
+            result = await services.query_service.process_query(question)
             
             # Display results
             print(f"Answer: {result['answer']}")
@@ -1,11 +1,16 @@
 import streamlit as st
 import requests
 import os
+import json
+import math
 import pandas as pd
 import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 import sys
-from typing import List, Dict, Any, Callable
+import contextlib
+import time
+from typing import List, Dict, Any, Callable, Optional
+import uuid
 
 # Add the parent directory to sys.path to enable importing samarth modules
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,6 +26,13 @@ except ImportError:
     def create_visualization(data: List[Dict[Any, Any]], chart_type: str = "bar") -> str:
         return ""
 
+# Frontend spans share the API's trace ID; without the samarth package only the header is sent
+try:
+    from samarth.utils.tracing import Tracer, FileExporter, REQUEST_ID_HEADER, PARENT_SPAN_HEADER
+except ImportError:
+    Tracer = FileExporter = None
+    REQUEST_ID_HEADER, PARENT_SPAN_HEADER = "X-Request-ID", "X-Parent-Span-ID"
+
 # Load environment variables from .env file
 # The .env file is located in the samarth directory
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -30,6 +42,19 @@ else:
     # Fallback to default location
     load_dotenv()
 
+
+@st.cache_resource
+def _frontend_tracer() -> Optional[Any]:
+    """Tracer for frontend spans, or None when only the request ID header is sent.
+
+    Spans kept in memory would never leave the Streamlit process, so the
+    frontend records them only with TRACE_EXPORTER=file, appending to the
+    API's TRACE_FILE so both sides of a request are analyzed together.
+    """
+    if Tracer is None or os.getenv("TRACE_EXPORTER", "memory").strip().lower() != "file":
+        return None
+    return Tracer(FileExporter())
+
 # Page configuration
 st.set_page_config(
     page_title="Project Samarth",
@@ -570,6 +595,161 @@ def _create_matplotlib_chart(df, visualization_data):
     else:
         st.warning("Please enter a question.")
 
+def _stream_events(api_url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+    """Yield (event, data) pairs from the server-sent event stream of the ask endpoint"""
+    with requests.post(api_url, json=payload, headers=headers, stream=True, timeout=(5, 60)) as response:
+        response.raise_for_status()
+        event_name, data_lines = "message", []
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line == "":
+                # A blank line terminates an event
+                if data_lines:
+                    yield event_name, json.loads("\n".join(data_lines))
+                event_name, data_lines = "message", []
+            elif line.startswith("event:"):
+                event_name = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
+
+def _render_answer(placeholder, answer: str):
+    """Render (or re-render, while streaming) the answer box"""
+    placeholder.markdown(f"<div class='response-box'>{answer}</div>", unsafe_allow_html=True)
+
+def _render_metrics(result: Dict[str, Any]):
+    """Render the confidence, execution time and data source metric cards"""
+    st.markdown("### Metrics")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown("<div class='metric-card'><div class='metric-label'>Confidence Score</div><div class='metric-value'>{:.2%}</div></div>".format(result['confidence_score']), unsafe_allow_html=True)
+    with col2:
+        st.markdown("<div class='metric-card'><div class='metric-label'>Execution Time</div><div class='metric-value'>{:.2f}s</div></div>".format(result['execution_time']), unsafe_allow_html=True)
+    with col3:
+        st.markdown("<div class='metric-card'><div class='metric-label'>Data Sources</div><div class='metric-value'>{}</div></div>".format(len(result['data_sources'])), unsafe_allow_html=True)
+    # Where the time went: routing, SQL generation, SQL execution, synthesis...
+    stage_timings = result.get('stage_timings')
+    if stage_timings:
+        st.caption("Time by stage: " + " · ".join(
+            f"{stage.replace('_', ' ')} {seconds:.2f}s" for stage, seconds in stage_timings.items()
+        ))
+
+def _visualization_rows(visualization_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Result rows as dicts, from either the row or the columnar encoding"""
+    if visualization_data.get('format') == 'columnar':
+        columns = visualization_data.get('columns', [])
+        return [dict(zip(columns, row)) for row in zip(*visualization_data.get('values', []))]
+    return visualization_data.get('data') or []
+
+@st.cache_data(ttl=300, max_entries=20, show_spinner=False)
+def _fetch_result_page(handle: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+    """One page of a stored result; a few recent pages are kept for paging back and forth"""
+    response = requests.get(f"{API_BASE_URL}/api/v1/query/results/{handle}",
+                            params={"offset": offset, "limit": limit, "result_format": "columnar"}, timeout=30)
+    response.raise_for_status()
+    return _visualization_rows(response.json())
+
+@st.fragment
+def _render_result_pages(stored: Dict[str, Any], first_page):
+    """Table over a result kept by the API, fetching each page only when it is shown.
+
+    As a fragment, changing the page reruns only this table, not the whole answer.
+    """
+    handle, row_count, page_size = stored["handle"], stored["row_count"], stored["page_size"]
+    pages = max(1, math.ceil(row_count / page_size))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"page-{handle}")
+    offset = (page - 1) * page_size
+    if page == 1:
+        df = first_page
+    else:
+        try:
+            df = pd.DataFrame(_fetch_result_page(handle, offset, page_size))
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
+                st.info("This result has expired. Ask the question again to page through it.")
+            else:
+                st.error(f"Could not load this page: {e.response.status_code}")
+            return
+    st.dataframe(df, use_container_width=True, height=300)
+    st.caption(f"Rows {offset + 1}–{min(offset + page_size, row_count)} of {row_count:,}. "
+               f"The chart shows the first {page_size} rows.")
+    st.link_button("Download CSV", f"{API_PUBLIC_URL}/api/v1/query/results/{handle}/download?format=csv")
+
+def _render_visualization(result: Dict[str, Any]):
+    """Render the result table and chart"""
+    # Display sample data with visualization
+    # Check if we have visualization data
+    visualization_data = result.get('visualization_data')
+    chart_data = _visualization_rows(visualization_data) if isinstance(visualization_data, dict) else []
+    if chart_data:
+        st.markdown("### Data Visualization")
+
+        # Get chart type and data
+        chart_type = visualization_data.get('chart_type', 'bar')
+
+        if chart_data and len(chart_data) > 0:
+            # Convert to DataFrame for visualization
+            df = pd.DataFrame(chart_data)
+
+            # Display data table with dark theme styling; long results are paged from the API
+            if visualization_data.get('result'):
+                _render_result_pages(visualization_data['result'], df)
+            else:
+                st.dataframe(df, use_container_width=True, height=300)
+
+            # Use the visualization module to create the chart
+            try:
+                chart_base64 = create_visualization(chart_data, chart_type)
+
+                if chart_base64:
+                    # Display the chart image
+                    st.markdown("<div class='visualization-container'>", unsafe_allow_html=True)
+                    st.markdown("#### Data Visualization", unsafe_allow_html=True)
+                    st.image(f"data:image/png;base64,{chart_base64}", use_column_width=True)
+                    st.markdown("</div>", unsafe_allow_html=True)
+                else:
+                    # Fallback to matplotlib if visualization module fails
+                    _create_matplotlib_chart(df, visualization_data)
+            except Exception as viz_error:
+                st.info(f"Could not generate visualization: {str(viz_error)}")
+                # Still show the data
+                st.dataframe(df, width='stretch', height=300)
+        else:
+            st.info("No data available for visualization.")
+    else:
+        # Check if we have raw data in the result
+        raw_data = result.get('data', [])
+        if raw_data and len(raw_data) > 0:
+            # Try to create visualization from the main data
+            try:
+                df = pd.DataFrame(raw_data)
+                if len(df) > 0:
+                    st.markdown("### Data")
+                    st.dataframe(df, use_container_width=True, height=300)
+                else:
+                    st.info("No data available for display.")
+            except Exception as df_error:
+                st.info(f"Could not display data: {str(df_error)}")
+        else:
+            # Last resort: try to extract data from any available field
+            # Check if there are any list fields in the result that might contain data
+            data_fields = [key for key, value in result.items() if isinstance(value, list) and len(value) > 0]
+            found_data = False
+            for field in data_fields:
+                if field not in ['data_sources', 'sql_queries', 'result_sources', 'stage_timings']:
+                    try:
+                        df = pd.DataFrame(result[field])
+                        if len(df) > 0:
+                            st.markdown(f"### {field.replace('_', ' ').title()}")
+                            st.dataframe(df, use_container_width=True, height=300)
+                            found_data = True
+                            break
+                    except Exception:
+                        continue
+
+            if not found_data:
+                st.info("No additional data available for this query.")
+
 # Main header
 st.markdown("<h1 class='main-header'>Project Samarth 🌾</h1>", unsafe_allow_html=True)
 st.markdown("<h3 class='subheader'>Intelligent Q&A System for India’s Agricultural and Climate Insights</h3>", unsafe_allow_html=True)
@@ -638,6 +818,36 @@ if not API_BASE_URL:
         # If failed, we're likely running locally
         API_BASE_URL = "http://localhost:8000"
 
+# Where the browser reaches the API, for download links (API_BASE_URL may be a container-internal name)
+API_PUBLIC_URL = os.getenv("API_PUBLIC_URL") or API_BASE_URL
+
+# Seconds a backend readiness check is reused within a session
+BACKEND_CHECK_TTL_SECONDS = float(os.getenv("BACKEND_CHECK_TTL_SECONDS", "300"))
+
+def _backend_warning() -> Optional[str]:
+    """Warning about the backend's readiness, checked at most once per TTL in each session"""
+    checked = st.session_state.get("backend_check")
+    if checked is None or time.monotonic() - checked[0] > BACKEND_CHECK_TTL_SECONDS:
+        try:
+            response = requests.get(f"{API_BASE_URL}/ready", timeout=5)
+            body = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            reasons = ", ".join(body.get("reasons", []))
+            if response.status_code != 200:
+                warning = f"The backend is not ready ({reasons or f'status {response.status_code}'}). Answers may fail."
+            elif body.get("status") == "degraded":
+                warning = f"The backend is degraded ({reasons}). Some questions may not be answered."
+            else:
+                warning = None
+        except Exception as e:
+            warning = f"Could not reach the backend: {str(e)}. Please ensure the backend is running."
+        checked = (time.monotonic(), warning)
+        st.session_state.backend_check = checked
+    return checked[1]
+
+backend_warning = _backend_warning()
+if backend_warning:
+    st.warning(backend_warning)
+
 # User input with session state
 if 'question' not in st.session_state:
     st.session_state.question = ""
@@ -660,126 +870,77 @@ with col2:
 
 if ask_button and question:
     if question:
-        with st.spinner("Analyzing data and generating insights..."):
-            # Initialize api_url for error handling
-            api_url = f"{API_BASE_URL}/api/v1/query/ask"
-            
-            # Check if API is accessible
-            try:
-                health_url = f"{API_BASE_URL}/health"
-                health_response = requests.get(health_url, timeout=5)
-                if health_response.status_code != 200:
-                    st.warning(f"Backend health check failed with status {health_response.status_code}. The backend might not be running properly.")
-            except Exception as e:
-                st.warning(f"Could not reach backend health endpoint: {str(e)}. Please ensure the backend is running.")
-            
+        # Initialize api_url for error handling
+        api_url = f"{API_BASE_URL}/api/v1/query/ask/stream"
+        
+        # Placeholders are filled in as pipeline events stream in
+        progress = st.empty()
+        progress.info("Identifying relevant datasets...")
+        st.markdown("### Answer")
+        answer_placeholder = st.empty()
+        # Replaced rather than appended to, since repaired SQL arrives as a second event
+        sql_placeholder = st.empty()
+        metrics_container = st.container()
+        visualization_container = st.container()
+        
+        result: Dict[str, Any] = {}
+        answer_text = ""
+        # One ID follows the question through the API, LLM and database spans and the query log
+        request_id = uuid.uuid4().hex
+        headers = {REQUEST_ID_HEADER: request_id}
+        tracer = _frontend_tracer()
+        with tracer.span("frontend.ask", trace_id=request_id) if tracer else contextlib.nullcontext() as frontend_span:
+            if frontend_span is not None:
+                headers[PARENT_SPAN_HEADER] = frontend_span.span_id
             try:
-                # Make API request
-                response = requests.post(
-                    api_url,
-                    json={"question": question},
-                    timeout=60
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Display answer
-                    st.markdown("### Answer")
-                    st.markdown(f"<div class='response-box'>{result['answer']}</div>", unsafe_allow_html=True)
-                    
-                    # Display metrics in cards
-                    st.markdown("### Metrics")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.markdown("<div class='metric-card'><div class='metric-label'>Confidence Score</div><div class='metric-value'>{:.2%}</div></div>".format(result['confidence_score']), unsafe_allow_html=True)
-                    with col2:
-                        st.markdown("<div class='metric-card'><div class='metric-label'>Execution Time</div><div class='metric-value'>{:.2f}s</div></div>".format(result['execution_time']), unsafe_allow_html=True)
-                    with col3:
-                        st.markdown("<div class='metric-card'><div class='metric-label'>Data Sources</div><div class='metric-value'>{}</div></div>".format(len(result['data_sources'])), unsafe_allow_html=True)
-                    
-                    # Display sample data with visualization
-                    # Check if we have visualization data
-                    visualization_data = result.get('visualization_data')
-                    if visualization_data and isinstance(visualization_data, dict) and visualization_data.get('data'):
-                        st.markdown("### Data Visualization")
-                        
-                        # Get chart type and data
-                        chart_type = visualization_data.get('chart_type', 'bar')
-                        chart_data = visualization_data.get('data', [])
-                        
-                        if chart_data and len(chart_data) > 0:
-                            # Convert to DataFrame for visualization
-                            df = pd.DataFrame(chart_data)
-                            
-                            # Display data table with dark theme styling
-                            st.dataframe(df, use_container_width=True, height=300)
-                            
-                            # Use the visualization module to create the chart
-                            try:
-                                chart_base64 = create_visualization(chart_data, chart_type)
-                                
-                                if chart_base64:
-                                    # Display the chart image
-                                    st.markdown("<div class='visualization-container'>", unsafe_allow_html=True)
-                                    st.markdown("#### Data Visualization", unsafe_allow_html=True)
-                                    st.image(f"data:image/png;base64,{chart_base64}", use_column_width=True)
-                                    st.markdown("</div>", unsafe_allow_html=True)
-                                else:
-                                    # Fallback to matplotlib if visualization module fails
-                                    _create_matplotlib_chart(df, visualization_data)
-                            except Exception as viz_error:
-                                st.info(f"Could not generate visualization: {str(viz_error)}")
-                                # Still show the data
-                                st.dataframe(df, width='stretch', height=300)
-                        else:
-                            st.info("No data available for visualization.")
-                    else:
-                        # Check if we have raw data in the result
-                        raw_data = result.get('data', [])
-                        if raw_data and len(raw_data) > 0:
-                            # Try to create visualization from the main data
-                            try:
-                                df = pd.DataFrame(raw_data)
-                                if len(df) > 0:
-                                    st.markdown("### Data")
-                                    st.dataframe(df, use_container_width=True, height=300)
-                                else:
-                                    st.info("No data available for display.")
-                            except Exception as df_error:
-                                st.info(f"Could not display data: {str(df_error)}")
-                        else:
-                            # Last resort: try to extract data from any available field
-                            # Check if there are any list fields in the result that might contain data
-                            data_fields = [key for key, value in result.items() if isinstance(value, list) and len(value) > 0]
-                            found_data = False
-                            for field in data_fields:
-                                if field not in ['data_sources', 'sql_queries']:
-                                    try:
-                                        df = pd.DataFrame(result[field])
-                                        if len(df) > 0:
-                                            st.markdown(f"### {field.replace('_', ' ').title()}")
-                                            st.dataframe(df, use_container_width=True, height=300)
-                                            found_data = True
-                                            break
-                                    except Exception:
-                                        continue
-                            
-                            if not found_data:
-                                st.info("No additional data available for this query.")
+                for event, data in _stream_events(api_url, {"question": question, "result_format": "columnar"}, headers):
+                    if event == "datasets":
+                        result.update(data)
+                        progress.info(f"Querying {', '.join(data['data_sources'])}...")
+                    elif event == "sql":
+                        with sql_placeholder.container().expander("Generated SQL"):
+                            for sql_query in data.get("sql_queries", []):
+                                st.code(sql_query, language="sql")
+                        progress.info("Running queries...")
+                    elif event == "results":
+                        result["visualization_data"] = data.get("visualization_data")
+                        progress.info(f"Retrieved {data.get('row_count', 0)} rows. Writing the answer...")
+                        with visualization_container:
+                            _render_visualization(result)
+                    elif event == "answer_chunk":
+                        answer_text += data.get("text", "")
+                        _render_answer(answer_placeholder, answer_text)
+                    elif event == "done":
+                        result.update(data)
+                        _render_answer(answer_placeholder, result["answer"])
+                        with metrics_container:
+                            _render_metrics(result)
+                progress.empty()
+            except requests.exceptions.HTTPError as e:
+                progress.empty()
+                if e.response.status_code == 429:
+                    retry_after = e.response.headers.get("Retry-After", "a few")
+                    st.warning(f"Samarth is busy or you are asking too quickly. Please try again in {retry_after} seconds.")
                 else:
-                    st.error(f"API request failed with status code: {response.status_code}")
-                    st.error(f"Response: {response.text}")
+                    st.error(f"API request failed with status code: {e.response.status_code}")
+                    st.error(f"Response: {e.response.text}")
                     st.error(f"Requested URL: {api_url}")
             except requests.exceptions.ConnectionError as e:
+                progress.empty()
+                # Re-check the backend on the next rerun instead of trusting the cached result
+                st.session_state.pop("backend_check", None)
                 st.error("Could not connect to the backend service. Please make sure the backend is running and accessible.")
                 st.error(f"Connection error details: {str(e)}")
                 st.error(f"Requested URL: {api_url}")
             except requests.exceptions.Timeout as e:
+                progress.empty()
                 st.error("Request to backend timed out. Please try again.")
                 st.error(f"Timeout error details: {str(e)}")
             except Exception as e:
+                progress.empty()
                 st.error(f"An error occurred: {str(e)}")
+        # Quote this to find the request's spans (/traces?trace_id=...) and query log row
+        st.caption(f"Request ID: {request_id}")
 # Footer
 st.markdown("---")
 st.markdown("<div class='footer'>Project Samarth - Empowering data-driven decision making for Indian agriculture and climate policy</div>", unsafe_allow_html=True)
\ No newline at end of file
@@ -1,6 +1,9 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 import os
 import sys
+from typing import Optional
 from dotenv import load_dotenv
 
 # Add the parent directory to sys.path to enable importing samarth modules
@@ -18,13 +21,37 @@ else:
     # Fallback to default location
     load_dotenv()
 
+from samarth.utils.responses import CompressionMiddleware, FastJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the services before the first request and drain them on shutdown.
+
+    Importing this module only defines the app; the query pipeline, LLM provider
+    and their SDKs are loaded here (or on first use), not at import time.
+    """
+    from samarth.services.container import services
+    await services.startup()
+    yield
+    await services.shutdown()
+
 # Create FastAPI app
 app = FastAPI(
     title="Project Samarth",
     description="AI-driven question-answering platform for Indian government datasets",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# gzip/brotli for large JSON bodies; added first so the trace span below also covers compression
+if os.getenv("COMPRESSION_ENABLED", "true").lower() == "true":
+    app.add_middleware(CompressionMiddleware)
+
+# Root trace span per request, keyed on the X-Request-ID header
+from samarth.utils.tracing import TracingMiddleware, tracer
+app.add_middleware(TracingMiddleware)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Project Samarth - Empowering data-driven decision making"}
@@ -38,6 +65,34 @@ app.include_router(query_router.router)
 async def health_check():
     return {"status": "healthy", "service": "Project Samarth"}
 
+# Liveness: the process is up and its event loop responsive
+@app.get("/live")
+async def liveness_check():
+    from samarth.services.health import health_monitor
+    return health_monitor.liveness()
+
+# Readiness from the cached background probes: 503 while warming up or when the database is unreachable
+@app.get("/ready")
+async def readiness_check():
+    from samarth.services.container import services
+    ready, body = services.readiness()
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+# Prometheus scrape endpoint: stage, LLM and SQL latency histograms and query counters
+@app.get("/metrics")
+async def metrics_endpoint():
+    from samarth.utils.metrics import metrics, CONTENT_TYPE
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+# Recent (or slowest) request traces from the in-memory span collector
+@app.get("/traces")
+async def traces_endpoint(limit: int = 20, slowest: bool = False, trace_id: Optional[str] = None):
+    if not hasattr(tracer.exporter, "traces"):
+        return {"detail": "Traces are not kept in memory; set TRACE_EXPORTER=memory", "traces": []}
+    if trace_id:
+        return {"traces": [{"trace_id": trace_id, "spans": tracer.exporter.spans(trace_id)}]}
+    return {"traces": tracer.exporter.traces(limit, slowest)}
+
 # Test endpoint to verify API is working
 @app.get("/test")
 async def test_endpoint():
@@ -61,6 +61,11 @@ class UserQuery(BaseModel):
     sql_queries: List[str]
     confidence_score: float
     user_id: Optional[str] = None
+    result_sources: List[str] = []
+    stage_timings: Dict[str, float] = {}
+    cache_status: Optional[str] = None
+    execution_time: Optional[float] = None
+    request_id: Optional[str] = None
     created_at: Optional[datetime] = None
 
 class QueryRequest(BaseModel):
@@ -75,4 +80,6 @@ class QueryResponse(BaseModel):
     sql_queries: List[str]
     visualization_data: Optional[Dict[str, Any]] = None
     confidence_score: float
-    execution_time: Optional[float] = None
\ No newline at end of file
+    execution_time: Optional[float] = None
+    result_sources: List[str] = []
+    stage_timings: Dict[str, float] = {}
\ No newline at end of file
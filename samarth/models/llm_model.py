@@ -1,27 +1,235 @@
 # LLM Model Interface
+#
+# Providers hide the SDK behind two blocking calls, generate() and stream().
+# LLMService builds the prompts and runs these calls through AsyncLLMClient;
+# LLM_PROVIDER selects gemini (default), openai or stub. The stub provider is
+# deterministic and offline so benchmarks and CI can drive the whole /ask path.
+# Provider SDKs are imported on the first call, not when the provider is built.
+import asyncio
+import importlib.util
 import os
-from openai import AsyncOpenAI
-from typing import Optional
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
 
-# Initialize OpenAI client
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+SYSTEM_PROMPT = "You are Project Samarth, an AI assistant for analyzing Indian agricultural and climate data."
 
-async def get_llm_response(prompt: str, model: str = "gpt-3.5-turbo") -> str:
+
+class LLMProvider:
+    """Base class for text generation backends"""
+
+    name = "base"
+
+    def generate(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> str:
+        """Return the full completion for a prompt; raises on provider errors"""
+        raise NotImplementedError
+
+    def stream(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> Iterator[str]:
+        """Yield completion text in chunks; providers without streaming yield it once"""
+        yield self.generate(prompt, temperature, max_output_tokens)
+
+    def warm_up(self):
+        """Load the SDK and create the client ahead of the first call (startup warm-up)"""
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through google.generativeai.
+
+    The SDK is imported and the model created on the first call, so building
+    the provider (and importing the app) stays cheap.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY environment variable not set")
+        self.model_name = model_name or os.getenv("LLM_MODEL", "gemini-2.5-flash")
+        self._model = None
+        self._generation_config = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._load()
+        return self._model
+
+    def _load(self):
+        import google.generativeai as genai
+        from google.generativeai.generative_models import GenerativeModel
+        from google.generativeai.types import GenerationConfig
+        self._generation_config = GenerationConfig
+
+        # Configure the API key for the generative AI client
+        # Using getattr to avoid linter issues with non-exported methods
+        configure_func = getattr(genai, 'configure')
+        configure_func(api_key=self.api_key)
+
+        # Try to create the model, fallback to gemini-pro if the specified model fails
+        try:
+            self._model = GenerativeModel(self.model_name)
+        except Exception as e:
+            print(f"Warning: Failed to create model {self.model_name}: {e}")
+            print("Falling back to gemini-pro model")
+            self._model = GenerativeModel("gemini-pro")
+
+    def warm_up(self):
+        self.model
+
+    def _config(self, temperature: float, max_output_tokens: int):
+        return self._generation_config(temperature=temperature, max_output_tokens=max_output_tokens)
+
+    def generate(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> str:
+        model = self.model
+        response = model.generate_content(prompt, generation_config=self._config(temperature, max_output_tokens))
+        return response.text.strip() if response.text else ""
+
+    def stream(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> Iterator[str]:
+        model = self.model
+        response = model.generate_content(
+            prompt,
+            generation_config=self._config(temperature, max_output_tokens),
+            stream=True
+        )
+        for chunk in response:
+            if getattr(chunk, "text", ""):
+                yield chunk.text
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions; requires the optional openai package, imported on first call"""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+        if importlib.util.find_spec("openai") is None:
+            raise ValueError("The openai package is not installed. Install it with: pip install openai")
+        self.model_name = model_name or os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    def warm_up(self):
+        self.client
+
+    def _messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def generate(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=self._messages(prompt),
+            temperature=temperature,
+            max_tokens=max_output_tokens
+        )
+        content = response.choices[0].message.content
+        return content.strip() if content else ""
+
+    def stream(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> Iterator[str]:
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=self._messages(prompt),
+            temperature=temperature,
+            max_tokens=max_output_tokens,
+            stream=True
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubProvider(LLMProvider):
+    """Deterministic offline provider with configurable latency and canned SQL"""
+
+    name = "stub"
+
+    # Canned SQL per dataset, chosen by the first table named in the SQL prompt
+    DEFAULT_SQL = {
+        "agricultural_production": "SELECT crop, SUM(production) as total_production FROM agricultural_production GROUP BY crop ORDER BY total_production DESC LIMIT 10",
+        "weather_data": "SELECT state, AVG(rainfall) as avg_rainfall FROM weather_data GROUP BY state ORDER BY avg_rainfall DESC LIMIT 10",
+        "climate_change_data": 'SELECT "Station_Name", AVG("Mean_Temperature_in_degree_C___Maximum") as avg_max_temp FROM climate_change_data GROUP BY "Station_Name" ORDER BY avg_max_temp DESC LIMIT 10',
+    }
+
+    _SQL_PROMPT_MARKER = "Generate a valid PostgreSQL query"
+    _TABLE_PATTERN = re.compile(r"Table: (\w+)")
+    _QUESTION_PATTERN = re.compile(r'User question: "(.*?)"', re.DOTALL)
+
+    def __init__(self, latency: Optional[float] = None, sql: Optional[Dict[str, str]] = None,
+                 chunk_latency: Optional[float] = None):
+        self.latency = latency if latency is not None else float(os.getenv("LLM_STUB_LATENCY_SECONDS", "0"))
+        self.chunk_latency = chunk_latency if chunk_latency is not None else float(os.getenv("LLM_STUB_CHUNK_LATENCY_SECONDS", "0"))
+        self.sql = dict(self.DEFAULT_SQL)
+        if os.getenv("LLM_STUB_SQL"):
+            self.sql = {dataset: os.getenv("LLM_STUB_SQL") for dataset in self.sql}
+        if sql:
+            self.sql.update(sql)
+        self.calls = 0
+
+    def generate(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._SQL_PROMPT_MARKER in prompt:
+            for table in self._TABLE_PATTERN.findall(prompt):
+                if table in self.sql:
+                    return self.sql[table]
+            return "SELECT 1 as result"
+        match = self._QUESTION_PATTERN.search(prompt)
+        question = match.group(1) if match else "the question"
+        return f"Stub answer for: {question}"
+
+    def stream(self, prompt: str, temperature: float = 0.3, max_output_tokens: int = 1000) -> Iterator[str]:
+        words = self.generate(prompt, temperature, max_output_tokens).split(" ")
+        for index, word in enumerate(words):
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield word if index == len(words) - 1 else word + " "
+
+
+PROVIDERS = {
+    GeminiProvider.name: GeminiProvider,
+    OpenAIProvider.name: OpenAIProvider,
+    StubProvider.name: StubProvider,
+}
+
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    """
+    Create the provider named by the argument or LLM_PROVIDER (default gemini).
+    Raises ValueError when it is unknown or not configured.
+    """
+    name = (name or os.getenv("LLM_PROVIDER", "gemini")).strip().lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}'. Choose one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+async def get_llm_response(prompt: str, provider: Optional[LLMProvider] = None) -> str:
     """
     Get response from LLM based on the provided prompt
     """
     try:
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are Project Samarth, an AI assistant for analyzing Indian agricultural and climate data."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        content = response.choices[0].message.content
-        return content.strip() if content else "No response generated"
+        provider = provider or get_provider()
+        return await asyncio.to_thread(provider.generate, prompt, 0.3, 1000) or "No response generated"
     except Exception as e:
         # Fallback response for development
-        return f"LLM response would be generated here. Error: {str(e)}"
\ No newline at end of file
+        return f"LLM response would be generated here. Error: {str(e)}"
@@ -0,0 +1,159 @@
+# Production Server for Project Samarth
+#
+# Runs the API in several worker processes sharing one listening socket, so
+# throughput scales with the number of cores. The app is imported once in the
+# supervisor before forking (preload), so workers start quickly and share its
+# memory copy-on-write; set SAMARTH_PRELOAD=false to import in each worker
+# instead. Crashed workers are replaced.
+#
+# On SIGTERM or SIGINT the supervisor asks every worker to stop: each stops
+# accepting connections, finishes in-flight requests within
+# SAMARTH_GRACEFUL_TIMEOUT, then drains coalesced pipeline runs and flushes
+# the query log in the app's lifespan shutdown. Workers still running after
+# that (plus a margin) are killed.
+#
+# Caches are per worker unless CACHE_BACKEND=sqlite (one host) or postgres is
+# set; see samarth/services/cache_backends.py.
+#
+#   python -m samarth.server --workers 4 --port 8000
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any, Dict, Optional
+
+# Add the parent directory to sys.path to enable importing samarth modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APP = "samarth.main:app"
+
+# Workers that exit sooner than this after starting are restarted with a delay
+MIN_WORKER_LIFETIME = 5.0
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app: Any, sock: socket.socket, args: argparse.Namespace):
+    """Serve on the shared socket until told to stop"""
+    import uvicorn
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_graceful_shutdown=args.graceful_timeout,
+                            timeout_keep_alive=args.keep_alive, backlog=args.backlog)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Fork workers, replace the ones that die and stop them all gracefully"""
+
+    def __init__(self, app: Any, sock: socket.socket, args: argparse.Namespace):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.workers: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.args)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        print(f"Started worker {pid}")
+
+    def stop(self, signum: int, frame: Any = None):
+        if not self.stopping:
+            print(f"Received {signal.Signals(signum).name}; stopping {len(self.workers)} workers")
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        deadline: Optional[float] = None
+        while self.workers:
+            if self.stopping and deadline is None:
+                # Requests, then the app's own drain, then a margin
+                deadline = time.monotonic() + self.args.graceful_timeout + float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "30")) + 5
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if deadline is not None and time.monotonic() > deadline:
+                    for straggler in list(self.workers):
+                        print(f"Worker {straggler} did not stop in time; killing it")
+                        os.kill(straggler, signal.SIGKILL)
+                    deadline = float("inf")
+                time.sleep(0.1)
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            print(f"Worker {pid} exited with {code}; replacing it")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(1.0)
+            self.spawn()
+        self.sock.close()
+        print("All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Project Samarth API with multiple workers")
+    parser.add_argument("--host", default=os.getenv("SAMARTH_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="worker processes (WEB_CONCURRENCY, default: one per core)")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        default=os.getenv("SAMARTH_PRELOAD", "true").lower() == "true",
+                        help="import the app in each worker instead of once before forking")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("SAMARTH_GRACEFUL_TIMEOUT", "30")),
+                        help="seconds each worker waits for in-flight requests on shutdown")
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("SAMARTH_KEEP_ALIVE", "5")))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default=os.getenv("SAMARTH_LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    app: Any = APP
+    if args.preload:
+        from samarth.main import app
+    print(f"Serving {APP} on {args.host}:{args.port} with {args.workers} worker(s)"
+          f"{' (preloaded)' if args.preload else ''}")
+
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        run_worker(app, sock, args)
+        return
+    Supervisor(app, sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
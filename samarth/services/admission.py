@@ -0,0 +1,210 @@
+# Admission Control for Project Samarth
+#
+# Every /ask can make several paid LLM calls, so requests are admitted before
+# the pipeline runs:
+#
+#   rate limit   each client (user_id, or the client address without one) has a
+#                token bucket of RATE_LIMIT_BURST tokens refilled at
+#                RATE_LIMIT_PER_MINUTE; an empty bucket is answered 429 at once
+#   concurrency  at most ADMISSION_MAX_CONCURRENT questions run at a time
+#   wait queue   up to ADMISSION_MAX_QUEUE more wait for a slot, for at most
+#                ADMISSION_QUEUE_TIMEOUT_SECONDS; a full queue or a timeout is a 429
+#
+# Waiters are served cheap questions first (answer cache hits and template
+# questions, which need no LLM call), then in arrival order. A batch is charged
+# a token per question and holds a slot per LLM call it may have in flight.
+# Every 429 carries Retry-After. Limits apply per worker process.
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Priorities of queued requests; lower is served first
+PRIORITY_CHEAP = 0
+PRIORITY_LLM = 1
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; retry after retry_after seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """capacity tokens, refilled continuously at rate tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Take cost tokens; returns 0, or the seconds until they would be available.
+
+        A cost above capacity can never be met, so callers reject it first.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class Ticket:
+    """Granted slots; release() is idempotent so streaming responses can call it from several places"""
+
+    def __init__(self, controller: "AdmissionController", slots: int = 1):
+        self._controller = controller
+        self._slots = slots
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            held = time.monotonic() - self._started
+            for _ in range(self._slots):
+                self._controller._release(held)
+
+    async def __aenter__(self) -> "Ticket":
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        self.release()
+
+
+class AdmissionController:
+    """Per-client token buckets in front of a bounded, prioritized pool of pipeline slots"""
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None, rate_per_minute: Optional[float] = None,
+                 burst: Optional[float] = None, max_clients: int = 10000):
+        self.max_concurrent = max_concurrent or int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+        self.queue_timeout = (queue_timeout if queue_timeout is not None
+                              else float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10")))
+        self.rate = (rate_per_minute if rate_per_minute is not None
+                     else float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))) / 60.0
+        self.burst = burst if burst is not None else float(os.getenv("RATE_LIMIT_BURST", "10"))
+        self.max_clients = max_clients
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._hold_seconds = 1.0
+        self.stats_counters = {"admitted": 0, "queued": 0, "rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+
+    @property
+    def max_cost(self) -> Optional[float]:
+        """Most tokens one request can be charged, or None without rate limiting"""
+        return self.burst if self.rate > 0 else None
+
+    def check_rate(self, client: str, cost: float = 1.0):
+        """Charge the client's bucket, raising AdmissionRejected when it is empty"""
+        if self.rate <= 0:
+            return
+        if cost > self.burst:
+            raise ValueError(f"cost {cost} exceeds the burst of {self.burst} tokens")
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            # Forget the least recently seen clients; a returning one starts with a full bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        wait = bucket.take(cost)
+        if wait > 0:
+            self.stats_counters["rate_limited"] += 1
+            raise AdmissionRejected("rate limit exceeded", wait)
+
+    def _estimated_wait(self) -> float:
+        return self._hold_seconds * (len(self._waiters) + 1) / self.max_concurrent
+
+    async def acquire(self, priority: int = PRIORITY_LLM, slots: int = 1) -> Ticket:
+        """Wait for slots (at most max_concurrent), raising AdmissionRejected if the queue
+        is full or a wait times out; slots already granted are then released"""
+        slots = max(1, min(slots, self.max_concurrent))
+        ticket = Ticket(self, 0)
+        try:
+            for _ in range(slots):
+                await self._acquire_slot(priority)
+                ticket._slots += 1
+        except BaseException:
+            ticket.release()
+            raise
+        return ticket
+
+    async def _acquire_slot(self, priority: int):
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.stats_counters["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.stats_counters["queue_full"] += 1
+            raise AdmissionRejected("server busy", self._estimated_wait())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.stats_counters["queued"] += 1
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # The slot may have been handed over just as the wait ended
+            if future.done() and not future.cancelled():
+                self._release(0.0)
+            else:
+                future.cancel()
+                # Already gone if a release skipped it
+                if any(waiter[2] is future for waiter in self._waiters):
+                    self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+                    heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats_counters["queue_timeout"] += 1
+                raise AdmissionRejected("timed out waiting for a free slot", self._estimated_wait())
+            raise
+        self.stats_counters["admitted"] += 1
+
+    def _release(self, held: float):
+        if held:
+            self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * held
+        # Hand the slot straight to the next waiter, so active does not change. Waiters
+        # that timed out or were cancelled can still be queued until their cleanup runs
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "clients": len(self._buckets),
+            "avg_hold_seconds": round(self._hold_seconds, 3)
+        }
+
+
+def create_admission_controller() -> Optional[AdmissionController]:
+    """Controller configured from the environment, or None when ADMISSION_ENABLED=false"""
+    if os.getenv("ADMISSION_ENABLED", "true").lower() != "true":
+        return None
+    return AdmissionController()
+
+# Global admission controller
+admission = create_admission_controller()
@@ -0,0 +1,230 @@
+# Answer Renderer for Project Samarth
+#
+# Describes common result shapes (single value, time series, ranking,
+# comparison) from templates so that most answers do not need a second LLM
+# round trip. Anything unrecognized returns None and goes to the LLM.
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+# Units by column name, following the field comments in models/data_models.py
+COLUMN_UNITS = {
+    "production": "tonnes",
+    "total_production": "tonnes",
+    "area": "hectares",
+    "yield_per_hectare": "tonnes/hectare",
+    "rainfall": "mm",
+    "avg_rainfall": "mm",
+    "max_rainfall": "mm",
+    "min_rainfall": "mm",
+    "total_rainfall": "mm",
+    "temperature_max": "°C",
+    "temperature_min": "°C",
+    "max_temp": "°C",
+    "min_temp": "°C",
+    "avg_max_temp": "°C",
+    "avg_min_temp": "°C",
+    "humidity": "%",
+    "wind_speed": "km/h",
+}
+
+TIME_COLUMNS = ("year", "month", "date", "Month")
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+# Questions asking for reasoning rather than a description of the numbers
+_EXPLANATION_PATTERN = re.compile(
+    r"\b(?:why|explain\w*|reasons?|cause[sd]?|affect\w*|effect|impact\w*|correlat\w*|relationship|insights?|analy[sz]\w*|predict\w*|forecast\w*)\b"
+    r"|\bhow does\b",
+    re.IGNORECASE
+)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def format_number(value: Any) -> str:
+    """Format a number with thousands separators and at most two decimals"""
+    number = float(value)
+    if number == int(number) and abs(number) < 1e15:
+        return f"{int(number):,}"
+    return f"{number:,.2f}".rstrip("0").rstrip(".")
+
+
+def format_value(value: Any, column: str) -> str:
+    """Format a number with the unit associated with its column"""
+    unit = COLUMN_UNITS.get(column)
+    text = format_number(value)
+    if not unit:
+        return text
+    if unit in ("%", "°C"):
+        return f"{text}{unit}"
+    return f"{text} {unit}"
+
+
+def format_change(start: Any, end: Any) -> str:
+    """Describe the percentage change between two values"""
+    start, end = float(start), float(end)
+    if start == 0:
+        return "no baseline to compute a percentage change"
+    change = (end - start) / abs(start) * 100
+    if abs(change) < 0.05:
+        return "essentially unchanged"
+    direction = "an increase" if change > 0 else "a decrease"
+    return f"{direction} of {abs(change):.1f}%"
+
+
+def format_gap(higher: Any, lower: Any) -> Optional[str]:
+    """Describe how much larger one positive value is than another, in percent"""
+    higher, lower = float(higher), float(lower)
+    if lower <= 0:
+        return None
+    return f"{(higher - lower) / lower * 100:.1f}%"
+
+
+def _label(column: str) -> str:
+    return column.replace("_", " ").strip()
+
+
+def _format_period(value: Any, column: str) -> str:
+    if column == "month" and _is_number(value) and 1 <= int(value) <= 12:
+        return MONTH_NAMES[int(value) - 1]
+    if _is_number(value) and float(value) == int(value):
+        return str(int(value))
+    return str(value)
+
+
+class AnswerRenderer:
+    """Local, deterministic answers for recognizable result shapes"""
+
+    def __init__(self, max_listed: int = 10):
+        self.max_listed = max_listed
+
+    def needs_explanation(self, question: str) -> bool:
+        """True when the user asks for reasoning that a template cannot provide"""
+        return bool(_EXPLANATION_PATTERN.search(question or ""))
+
+    def render(self, question: str, query_results: List[Dict[str, Any]]) -> Optional[str]:
+        """Return a templated answer, or None when the LLM should synthesize one"""
+        if self.needs_explanation(question):
+            return None
+        if not query_results:
+            return ("No data was found in the warehouse for this question. "
+                    "Try a different state, crop or time period.")
+
+        columns = list(query_results[0].keys())
+        # Results concatenated from different datasets have heterogeneous columns
+        if any(list(row.keys()) != columns for row in query_results):
+            return None
+
+        numeric = [c for c in columns if all(_is_number(row[c]) or row[c] is None for row in query_results)
+                   and any(_is_number(row[c]) for row in query_results)]
+        time_column = next((c for c in TIME_COLUMNS if c in columns), None)
+        labels = [c for c in columns if c not in numeric and c != time_column]
+
+        if time_column:
+            # Several series interleaved (e.g. one per state) need the LLM to untangle
+            if any(len({row[c] for row in query_results}) > 1 for c in labels):
+                return None
+            measures = [c for c in numeric if c != time_column]
+            if measures and len(query_results) > 1:
+                # Described from the earliest period, whatever the ORDER BY
+                try:
+                    series = sorted(query_results, key=lambda row: (row[time_column] is None, row[time_column]))
+                except TypeError:
+                    return None
+                return self._render_time_series(series, time_column, measures)
+            return None
+
+        if len(query_results) == 1:
+            return self._render_single_row(query_results[0], labels, numeric)
+
+        if len(labels) == 1 and numeric:
+            metric = numeric[0]
+            values = [float(row[metric]) for row in query_results if _is_number(row[metric])]
+            if len(values) != len(query_results):
+                return None
+            # Two rows are a comparison however they are ordered
+            if len(query_results) > 2 and (values == sorted(values, reverse=True) or values == sorted(values)):
+                return self._render_ranking(query_results, labels[0], metric)
+            if len(query_results) <= 3:
+                return self._render_comparison(query_results, labels[0], metric)
+        return None
+
+    def fallback(self, query_results: List[Dict[str, Any]]) -> str:
+        """Best-effort answer when the LLM is unavailable: a template if the shape allows one"""
+        answer = self.render("", query_results)
+        if answer is not None:
+            return answer
+        return (f"Found {len(query_results)} matching rows. A written summary is not available right now "
+                "because the language model is unavailable; the data is shown below.")
+
+    def _render_single_row(self, row: Dict[str, Any], labels: List[str], numeric: List[str]) -> Optional[str]:
+        if not numeric or len(numeric) > 4:
+            return None
+        subject = ", ".join(str(row[c]) for c in labels if row[c] is not None)
+        parts = [f"{_label(c)} is {format_value(row[c], c)}" for c in numeric if row[c] is not None]
+        if not parts:
+            return None
+        prefix = f"For {subject}, the " if subject else "The "
+        return prefix + "; ".join(parts) + "."
+
+    def _render_time_series(self, rows: List[Dict[str, Any]], time_column: str, measures: List[str]) -> Optional[str]:
+        metric = measures[0]
+        series = [(row[time_column], row[metric]) for row in rows if _is_number(row[metric])]
+        if len(series) < 2:
+            return None
+        first_period, first_value = series[0]
+        last_period, last_value = series[-1]
+        peak_period, peak_value = max(series, key=lambda point: float(point[1]))
+        low_period, low_value = min(series, key=lambda point: float(point[1]))
+
+        lines = [
+            f"{_label(metric).capitalize()} went from {format_value(first_value, metric)} in "
+            f"{_format_period(first_period, time_column)} to {format_value(last_value, metric)} in "
+            f"{_format_period(last_period, time_column)}, {format_change(first_value, last_value)}.",
+            f"The highest value was {format_value(peak_value, metric)} ({_format_period(peak_period, time_column)}) "
+            f"and the lowest was {format_value(low_value, metric)} ({_format_period(low_period, time_column)})."
+        ]
+        if len(series) <= self.max_listed:
+            lines.append("")
+            for period, value in series:
+                lines.append(f"- {_format_period(period, time_column)}: {format_value(value, metric)}")
+        return "\n".join(lines)
+
+    def _render_ranking(self, rows: List[Dict[str, Any]], label: str, metric: str) -> str:
+        listed = rows[:self.max_listed]
+        leader, runner_up = rows[0], rows[1]
+        # Rows come in ORDER BY order, so ascending values are a bottom-N list
+        ascending = float(rows[0][metric]) < float(rows[-1][metric])
+        lines = [f"{'Bottom' if ascending else 'Top'} {len(listed)} by {_label(metric)}:", ""]
+        for rank, row in enumerate(listed, 1):
+            lines.append(f"{rank}. {row[label]}: {format_value(row[metric], metric)}")
+        if len(rows) > len(listed):
+            lines.append(f"...and {len(rows) - len(listed)} more.")
+        if ascending:
+            gap = format_gap(runner_up[metric], leader[metric])
+            if gap and float(leader[metric]) < float(runner_up[metric]):
+                lines.append("")
+                lines.append(f"{runner_up[label]} is higher than {leader[label]} by {gap}.")
+        else:
+            gap = format_gap(leader[metric], runner_up[metric])
+            if gap and float(leader[metric]) > float(runner_up[metric]):
+                lines.append("")
+                lines.append(f"{leader[label]} is ahead of {runner_up[label]} by {gap}.")
+        return "\n".join(lines)
+
+    def _render_comparison(self, rows: List[Dict[str, Any]], label: str, metric: str) -> str:
+        parts = [f"{row[label]}: {format_value(row[metric], metric)}" for row in rows]
+        high = max(rows, key=lambda row: float(row[metric]))
+        low = min(rows, key=lambda row: float(row[metric]))
+        answer = f"Comparison of {_label(metric)}: " + "; ".join(parts) + "."
+        gap = format_gap(high[metric], low[metric])
+        if gap:
+            answer += f" {high[label]} is higher than {low[label]} by {gap}."
+        return answer
+
+# Global answer renderer instance
+answer_renderer = AnswerRenderer()
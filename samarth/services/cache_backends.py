@@ -0,0 +1,274 @@
+# Shared Cache Backends for Project Samarth
+#
+# With several server workers (see samarth/server.py) each process has its own
+# in-memory caches, so a question answered by one worker is recomputed by the
+# next. SharedCache puts a cross-process store behind the per-process TTLCache:
+# lookups try local memory first, then the shared store, and writes go to both.
+# CACHE_BACKEND selects the store:
+#
+#   memory    per-process only (default)
+#   sqlite    a SQLite file (CACHE_SQLITE_PATH) shared by the workers on one host
+#   postgres  an UNLOGGED table in the application database, shared across hosts
+#
+# Values are pickled, so the store must only be writable by the application.
+# A failing store never fails a request: the error is counted and the local
+# tier is used alone.
+import asyncio
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+from samarth.services.cache import TTLCache
+
+_MISSING = object()
+
+# Expired entries are removed every this many writes
+PRUNE_EVERY = 500
+
+
+class SQLiteBackend:
+    """Cache entries in a SQLite file shared by the processes on one host"""
+
+    # File IO that can wait up to the 5s busy timeout on another worker's lock
+    blocking = True
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or os.getenv("CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "samarth_cache.sqlite3"))
+        self.max_entries = max_entries or int(os.getenv("CACHE_SHARED_MAX_ENTRIES", "100000"))
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process; a connection must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_expiry ON cache_entries (expires_at)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, namespace: str, key: str, value: bytes, expires_at: float):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                     (namespace, key, value, expires_at))
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the soonest to expire beyond max_entries"""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        excess = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM cache_entries WHERE rowid IN "
+                         "(SELECT rowid FROM cache_entries ORDER BY expires_at LIMIT ?)", (excess,))
+
+    def clear(self, namespace: str):
+        self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+
+class PostgresBackend:
+    """Cache entries in an UNLOGGED table of the application database"""
+
+    blocking = True
+
+    CREATE_TABLE = """
+        CREATE UNLOGGED TABLE IF NOT EXISTS cache_entries (
+            namespace VARCHAR(50) NOT NULL,
+            key TEXT NOT NULL,
+            value BYTEA NOT NULL,
+            expires_at DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )
+    """
+
+    def __init__(self):
+        self._ready = False
+        self._writes = 0
+
+    def _run(self, query: str, params: tuple = (), fetch: bool = False) -> Any:
+        from samarth.data.db_connection import db
+        conn = db.get_connection()
+        if not conn:
+            raise ConnectionError("Database connection not available")
+        try:
+            with conn.cursor() as cursor:
+                if not self._ready:
+                    cursor.execute(self.CREATE_TABLE)
+                    self._ready = True
+                cursor.execute(query, params)
+                row = cursor.fetchone() if fetch else None
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        row = self._run("SELECT value, expires_at FROM cache_entries WHERE namespace = %s AND key = %s AND expires_at > %s",
+                        (namespace, key, time.time()), fetch=True)
+        return (bytes(row["value"]), row["expires_at"]) if row else None
+
+    def set(self, namespace: str, key: str, value: bytes, expires_at: float):
+        import psycopg2
+        self._run("""
+            INSERT INTO cache_entries (namespace, key, value, expires_at) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (namespace, key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at
+        """, (namespace, key, psycopg2.Binary(value), expires_at))
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self._run("DELETE FROM cache_entries WHERE expires_at <= %s", (time.time(),))
+
+    def clear(self, namespace: str):
+        self._run("DELETE FROM cache_entries WHERE namespace = %s", (namespace,))
+
+
+class SharedCache:
+    """Per-process TTLCache in front of a shared backend, with the same interface.
+
+    Entries read from the shared store keep their original expiry locally. Use
+    aget/aset from async code: with a blocking (file or network) backend they run the
+    shared lookup in a worker thread instead of on the event loop.
+    """
+
+    def __init__(self, namespace: str, backend: Any, maxsize: int = 1024, ttl: float = 300.0):
+        self.namespace = namespace
+        self.backend = backend
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.errors = 0
+
+    def _shared_get(self, key: Hashable) -> Any:
+        try:
+            entry = self.backend.get(self.namespace, repr(key))
+            if entry is None:
+                return _MISSING
+            value = pickle.loads(entry[0])
+        except Exception as e:
+            self._error("read", e)
+            return _MISSING
+        self.local.set(key, value, ttl=max(0.0, entry[1] - time.time()))
+        return value
+
+    def _shared_set(self, key: Hashable, value: Any, ttl: float):
+        try:
+            self.backend.set(self.namespace, repr(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl)
+        except Exception as e:
+            self._error("write", e)
+
+    def _error(self, operation: str, error: Exception):
+        self.errors += 1
+        if self.errors == 1 or self.errors % 100 == 0:
+            print(f"Shared {self.namespace} cache {operation} failed ({self.errors} errors so far): {error}")
+
+    def _count(self, value: Any, shared: bool = False) -> bool:
+        if value is _MISSING:
+            self.misses += 1
+            return False
+        self.hits += 1
+        self.shared_hits += shared
+        return True
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._shared_get(key)
+            return value if self._count(value, shared=True) else default
+        self._count(value)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        self._shared_set(key, value, ttl)
+
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is _MISSING:
+            if self.backend.blocking:
+                value = await asyncio.to_thread(self._shared_get, key)
+            else:
+                value = self._shared_get(key)
+            return value if self._count(value, shared=True) else default
+        self._count(value)
+        return value
+
+    async def aset(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        if self.backend.blocking:
+            await asyncio.to_thread(self._shared_set, key, value, ttl)
+        else:
+            self._shared_set(key, value, ttl)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.local
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    def clear(self):
+        self.local.clear()
+        try:
+            self.backend.clear(self.namespace)
+        except Exception as e:
+            self._error("clear", e)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.local),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+def create_backend(kind: Optional[str] = None) -> Any:
+    """Shared store named by CACHE_BACKEND: memory (none), sqlite or postgres"""
+    kind = (kind or os.getenv("CACHE_BACKEND", "memory")).strip().lower()
+    if kind == "sqlite":
+        return SQLiteBackend()
+    if kind == "postgres":
+        return PostgresBackend()
+    return None
+
+
+def create_cache(namespace: str, maxsize: int, ttl: float, backend: Any = _MISSING) -> Any:
+    """A TTLCache, or a SharedCache when a shared backend is configured"""
+    backend = shared_backend if backend is _MISSING else backend
+    if backend is None or maxsize <= 0:
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    return SharedCache(namespace, backend, maxsize=maxsize, ttl=ttl)
+
+# Global shared cache backend (None when caches are per-process)
+shared_backend = create_backend()
@@ -0,0 +1,105 @@
+# Service Container for Project Samarth
+#
+# Holds the application services, built on first use rather than when their
+# modules are imported, so `import samarth.main` stays cheap for autoscaled
+# containers. The app lifespan builds them (off the event loop) before the
+# first request and tears them down on shutdown; endpoints receive them
+# through FastAPI dependencies such as get_query_service.
+#
+# After the services are built a warm-up (samarth/services/warmup.py) runs in
+# the background; `ready` turns true once it has finished, or after
+# WARMUP_TIMEOUT_SECONDS. /ready combines that with the dependency probes of
+# samarth/services/health.py.
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from samarth.services.health import health_monitor
+
+
+class ServiceContainer:
+    """Lazily built application services, started and stopped by the app lifespan"""
+
+    def __init__(self):
+        self._query_service: Optional[Any] = None
+        self._lock = threading.Lock()
+        self._warmup_task: Optional[asyncio.Task] = None
+        self.started = False
+        self.ready = False
+        self.warmup: Dict[str, Any] = {}
+
+    @property
+    def query_service(self) -> Any:
+        """The shared QueryService, built on first access"""
+        if self._query_service is None:
+            with self._lock:
+                if self._query_service is None:
+                    self._query_service = self._build_query_service()
+        return self._query_service
+
+    def _build_query_service(self) -> Any:
+        from samarth.services.query_service import QueryService
+        from samarth.utils.metrics import metrics
+        service = QueryService()
+        metrics.register_callback("samarth_cache_lookups_total", "counter", "Cache lookups by cache and result",
+                                  ["cache", "result"], service.cache_lookups)
+        return service
+
+    async def startup(self):
+        """Build the services, start the query history writer and begin warming up"""
+        from samarth.services.query_logger import query_logger
+        # Building imports the pipeline modules; keep that off the event loop
+        await asyncio.to_thread(lambda: self.query_service)
+        query_logger.start()
+        health_monitor.start(self.query_service)
+        self.started = True
+        if os.getenv("WARMUP_ENABLED", "true").lower() == "true":
+            self._warmup_task = asyncio.create_task(self._warm_up())
+        else:
+            self.ready = True
+
+    async def _warm_up(self):
+        from samarth.services.warmup import warm_up
+        timeout = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "120"))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(warm_up(self.query_service, self.warmup), timeout)
+            print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+        except asyncio.TimeoutError:
+            print(f"Warm-up did not finish within {timeout}s; reporting ready anyway")
+        self.ready = True
+
+    async def shutdown(self, drain_timeout: Optional[float] = None):
+        """Let in-flight pipeline runs finish their LLM calls, then flush their history and spans"""
+        from samarth.data.db_connection import db
+        from samarth.services.query_logger import query_logger
+        from samarth.utils.tracing import tracer
+        self.ready = False
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        await health_monitor.stop()
+        if drain_timeout is None:
+            drain_timeout = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "30"))
+        if self._query_service is not None:
+            await self._query_service.drain(drain_timeout)
+            self._query_service.results.close()
+        await query_logger.stop()
+        db.close()
+        if hasattr(tracer.exporter, "close"):
+            tracer.exporter.close()
+        self.started = False
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """Whether this instance should receive traffic, with the warm-up report and latest probes"""
+        ready, body = health_monitor.readiness(self.ready)
+        body["warmup"] = self.warmup
+        return ready, body
+
+
+def get_query_service() -> Any:
+    """FastAPI dependency returning the shared QueryService"""
+    return services.query_service
+
+# Global service container
+services = ServiceContainer()
@@ -0,0 +1,180 @@
+# Dataset Classifier for Project Samarth
+#
+# One-vs-rest logistic regression over hashed word unigrams, word bigrams and
+# character trigrams, trained offline with NumPy from the user_queries
+# history. The labels are the datasets whose queries returned rows
+# (result_sources). Inference is a handful of array lookups. Predictions below
+# the confidence threshold return None, so the caller falls back to the
+# keyword router.
+#
+#   python -m samarth.services.dataset_classifier --output samarth/models/dataset_classifier.npz
+import argparse
+import os
+import re
+import sys
+import threading
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "dataset_classifier.npz")
+
+TRAINING_QUERY = """
+    SELECT question, result_sources FROM user_queries
+    WHERE result_sources IS NOT NULL AND cardinality(result_sources) > 0
+    ORDER BY created_at DESC
+    LIMIT %s
+"""
+
+
+def extract_features(question: str, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed n-gram feature indices and L2-normalized values for one question"""
+    tokens = _TOKEN_PATTERN.findall((question or "").lower())
+    grams = list(tokens)
+    grams.extend(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    for token in tokens:
+        padded = f"<{token}>"
+        grams.extend("#" + padded[i:i + 3] for i in range(len(padded) - 2))
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    # crc32 is stable across processes, unlike the built-in hash()
+    indices, counts = np.unique(
+        np.fromiter((zlib.crc32(gram.encode()) % n_features for gram in grams), dtype=np.int64, count=len(grams)),
+        return_counts=True
+    )
+    values = counts.astype(np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+class DatasetClassifier:
+    """Multi-label logistic regression mapping questions to datasets"""
+
+    def __init__(self, labels: Sequence[str], n_features: int = 2 ** 14,
+                 weights: Optional[np.ndarray] = None, bias: Optional[np.ndarray] = None,
+                 threshold: Optional[float] = None, confidence: Optional[float] = None):
+        self.labels = list(labels)
+        self.n_features = n_features
+        self.weights = weights if weights is not None else np.zeros((len(self.labels), n_features), dtype=np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(self.labels), dtype=np.float32)
+        # A dataset is selected at `threshold`; the prediction is only trusted
+        # when its most likely dataset reaches `confidence`
+        self.threshold = threshold if threshold is not None else float(os.getenv("DATASET_CLASSIFIER_THRESHOLD", "0.5"))
+        self.confidence = confidence if confidence is not None else float(os.getenv("DATASET_CLASSIFIER_CONFIDENCE", "0.8"))
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.fallbacks = 0
+
+    def predict_proba(self, question: str) -> Dict[str, float]:
+        """Probability that each dataset answers the question"""
+        indices, values = extract_features(question, self.n_features)
+        logits = self.weights[:, indices] @ values + self.bias
+        probabilities = 1.0 / (1.0 + np.exp(-logits))
+        return dict(zip(self.labels, probabilities.tolist()))
+
+    def route(self, question: str) -> Optional[List[str]]:
+        """Confident datasets for the question, most likely first, or None to fall back"""
+        probabilities = self.predict_proba(question)
+        best = max(probabilities.values(), default=0.0)
+        with self._lock:
+            if best < self.confidence:
+                self.fallbacks += 1
+                return None
+            self.predictions += 1
+        selected = [label for label, p in probabilities.items() if p >= self.threshold]
+        return sorted(selected, key=probabilities.__getitem__, reverse=True)
+
+    def fit(self, questions: Sequence[str], label_sets: Sequence[Sequence[str]], epochs: int = 300,
+            learning_rate: float = 1.0, l2: float = 1e-4) -> "DatasetClassifier":
+        """Full-batch gradient descent on the logistic loss over a sparse design matrix"""
+        rows, columns, values = [], [], []
+        for row, question in enumerate(questions):
+            indices, features = extract_features(question, self.n_features)
+            rows.append(np.full(len(indices), row, dtype=np.int64))
+            columns.append(indices)
+            values.append(features)
+        rows, columns, values = np.concatenate(rows), np.concatenate(columns), np.concatenate(values)
+        targets = np.array([[label in set(labels) for label in self.labels] for labels in label_sets], dtype=np.float32)
+        n_samples = len(questions)
+
+        weights = np.zeros((len(self.labels), self.n_features), dtype=np.float64)
+        bias = np.zeros(len(self.labels), dtype=np.float64)
+        for _ in range(epochs):
+            # X @ W.T and X.T @ error, one label at a time with bincount over the nonzeros
+            logits = np.stack([np.bincount(rows, weights=weights[k, columns] * values, minlength=n_samples)
+                               for k in range(len(self.labels))], axis=1) + bias
+            error = 1.0 / (1.0 + np.exp(-logits)) - targets
+            for k in range(len(self.labels)):
+                gradient = np.bincount(columns, weights=error[rows, k] * values, minlength=self.n_features)
+                weights[k] -= learning_rate * (gradient / n_samples + l2 * weights[k])
+            bias -= learning_rate * error.mean(axis=0)
+
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        return self
+
+    def save(self, path: str):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            labels=np.array(self.labels), n_features=self.n_features)
+
+    @classmethod
+    def load(cls, path: str) -> "DatasetClassifier":
+        with np.load(path) as model:
+            return cls([str(label) for label in model["labels"]], int(model["n_features"]),
+                       weights=model["weights"], bias=model["bias"])
+
+    def stats(self) -> Dict[str, int]:
+        return {"predictions": self.predictions, "fallbacks": self.fallbacks}
+
+
+def load_classifier(path: Optional[str] = None) -> Optional[DatasetClassifier]:
+    """Load the trained model if one exists; routing falls back to keywords otherwise"""
+    path = path or os.getenv("DATASET_CLASSIFIER_PATH", DEFAULT_MODEL_PATH)
+    if not os.path.exists(path):
+        return None
+    try:
+        return DatasetClassifier.load(path)
+    except Exception as e:
+        print(f"Warning: Could not load dataset classifier {path}: {e}")
+        return None
+
+
+def train_from_history(output: str, limit: int = 50000, min_examples: int = 50, epochs: int = 300) -> bool:
+    """Train on logged questions and the datasets that returned rows for them"""
+    from samarth.data.db_connection import db
+    history = db.execute_query(TRAINING_QUERY, (limit,))
+    if len(history) < min_examples:
+        print(f"Only {len(history)} labelled questions in user_queries; need at least {min_examples}")
+        return False
+
+    questions = [row["question"] for row in history]
+    label_sets = [list(row["result_sources"]) for row in history]
+    labels = sorted({label for labels in label_sets for label in labels})
+    classifier = DatasetClassifier(labels).fit(questions, label_sets, epochs=epochs)
+
+    predicted = [set(classifier.route(question) or []) for question in questions]
+    exact = sum(p == set(labels) for p, labels in zip(predicted, label_sets)) / len(questions)
+    print(f"Trained on {len(questions)} questions, {len(labels)} datasets; exact-match accuracy on training data {exact:.1%}")
+    classifier.save(output)
+    print(f"Saved dataset classifier to {output}")
+    return True
+
+# Global dataset classifier instance (None until a model has been trained)
+dataset_classifier = load_classifier()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
+    if os.path.exists(env_path):
+        load_dotenv(env_path)
+    else:
+        load_dotenv()
+    parser = argparse.ArgumentParser(description="Train the dataset classifier from user_queries history")
+    parser.add_argument("--output", default=os.getenv("DATASET_CLASSIFIER_PATH", DEFAULT_MODEL_PATH))
+    parser.add_argument("--limit", type=int, default=50000)
+    parser.add_argument("--min-examples", type=int, default=50)
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+    sys.exit(0 if train_from_history(args.output, args.limit, args.min_examples, args.epochs) else 1)
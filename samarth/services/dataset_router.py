@@ -0,0 +1,149 @@
+# Dataset Router for Project Samarth
+#
+# Scores datasets for a question from one tokenizing pass: every keyword and
+# its inflections ("crops", "farming", "warmer") are precomputed into a lookup
+# table, so matching is a set intersection on whole words rather than a
+# substring scan per keyword. Keywords carry per-dataset weights,
+# and "combinations" add weight only when a keyword from each of several groups
+# is present (e.g. station + temperature + superlative). Rules can be loaded
+# from a JSON file named by DATASET_ROUTER_CONFIG with the same shape as
+# DEFAULT_ROUTES.
+import json
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+DEFAULT_ROUTES: Dict[str, Any] = {
+    "threshold": 1.0,
+    "datasets": {
+        "agricultural_production": {
+            "keywords": {
+                "crop": 1, "farm": 1, "agriculture": 1, "agricultural": 1, "yield": 1, "production": 1,
+                "harvest": 1, "irrigation": 1, "fertilizer": 1, "pesticide": 1, "rice": 1, "wheat": 1,
+                "maize": 1, "sugarcane": 1
+            }
+        },
+        "weather_data": {
+            "keywords": {
+                "weather": 1, "rainfall": 1, "temperature": 1, "climate": 1, "precipitation": 1,
+                "humidity": 1, "monsoon": 1, "wind": 1, "heat": 1, "cold": 1, "warm": 1, "hot": 1,
+                "cool": 1, "chill": 1
+            }
+        },
+        "climate_change_data": {
+            "keywords": {"climate change": 1, "global warming": 1},
+            "combinations": [
+                {
+                    "weight": 1,
+                    "groups": [
+                        ["district", "station", "location", "place", "area", "region"],
+                        ["temperature", "heat", "warm", "hot", "cold", "cool", "chill", "degrees", "celsius", "fahrenheit"],
+                        ["highest", "warmest", "hottest", "maximum", "peak", "top", "greatest", "most"]
+                    ]
+                }
+            ]
+        }
+    }
+}
+
+# Inflections accepted after a keyword ("crops", "farming", "farmers", "warmer")
+_SUFFIXES = ("", "s", "es", "ed", "ing", "er", "ers", "est")
+# Byte table mapping everything but ASCII letters to a space; bytes.translate
+# is several times faster than a regex or str.translate for tokenizing
+_SEPARATORS = bytes(code if chr(code).isascii() and chr(code).isalpha() else 32 for code in range(256))
+
+
+class DatasetRouter:
+    """Precompiled keyword router returning scored datasets"""
+
+    def __init__(self, routes: Optional[Dict[str, Any]] = None):
+        routes = routes or DEFAULT_ROUTES
+        self.threshold = float(routes.get("threshold", 1.0))
+        self.datasets = list(routes["datasets"])
+        # keyword -> [(dataset, weight)], and keyword -> [(combination, bit of each group it is in)]
+        self._weights: Dict[str, List[Tuple[str, float]]] = {}
+        self._group_bits: Dict[str, List[Tuple[int, int]]] = {}
+        self._combinations: List[Tuple[str, float, int]] = []
+        vocabulary: Set[str] = set()
+        for dataset, rule in routes["datasets"].items():
+            for keyword, weight in rule.get("keywords", {}).items():
+                keyword = keyword.lower()
+                self._weights.setdefault(keyword, []).append((dataset, float(weight)))
+                vocabulary.add(keyword)
+            for combination in rule.get("combinations", []):
+                index = len(self._combinations)
+                groups = combination["groups"]
+                for position, group in enumerate(groups):
+                    for word in group:
+                        self._group_bits.setdefault(word.lower(), []).append((index, 1 << position))
+                        vocabulary.add(word.lower())
+                # The combination applies once every group's bit is set
+                self._combinations.append((dataset, float(combination.get("weight", 1)), (1 << len(groups)) - 1))
+
+        # Every accepted word form (or phrase form, inflected on its last word) -> keyword
+        self._forms: Dict[bytes, str] = {}
+        for keyword in sorted(vocabulary, key=len):
+            for suffix in _SUFFIXES:
+                self._forms.setdefault((keyword + suffix).encode(), keyword)
+        phrases = [keyword.encode().split() for keyword in vocabulary if " " in keyword]
+        self._phrase_lengths = sorted({len(words) for words in phrases})
+        self._phrase_starts = frozenset(words[0] for words in phrases)
+
+    @classmethod
+    def from_file(cls, path: str) -> "DatasetRouter":
+        """Build a router from a JSON rules file"""
+        with open(path, encoding="utf-8") as handle:
+            return cls(json.load(handle))
+
+    def matched_keywords(self, question: str) -> Set[str]:
+        """Keywords present in the question, matched on whole words"""
+        words = (question or "").lower().encode().translate(_SEPARATORS).split()
+        forms = self._forms
+        unique = set(words)
+        matched = {forms[word] for word in forms.keys() & unique}
+        # Phrases are only looked up where one of their first words occurs
+        if not self._phrase_starts.isdisjoint(unique):
+            for start, word in enumerate(words):
+                if word in self._phrase_starts:
+                    for length in self._phrase_lengths:
+                        phrase = forms.get(b" ".join(words[start:start + length]))
+                        if phrase:
+                            matched.add(phrase)
+        return matched
+
+    def score(self, question: str) -> Dict[str, float]:
+        """Score every dataset for the question"""
+        scores = dict.fromkeys(self.datasets, 0.0)
+        masks = [0] * len(self._combinations)
+        for keyword in self.matched_keywords(question):
+            for dataset, weight in self._weights.get(keyword, ()):
+                scores[dataset] += weight
+            for index, bit in self._group_bits.get(keyword, ()):
+                masks[index] |= bit
+        for (dataset, weight, full), mask in zip(self._combinations, masks):
+            if mask == full:
+                scores[dataset] += weight
+        return scores
+
+    def route(self, question: str) -> List[str]:
+        """Datasets scoring at least the threshold, best first; all datasets when none do"""
+        scores = self.score(question)
+        selected = [dataset for dataset in self.datasets if scores[dataset] >= self.threshold]
+        if not selected:
+            return list(self.datasets)
+        if len(selected) > 1:
+            selected.sort(key=scores.__getitem__, reverse=True)
+        return selected
+
+
+def load_router() -> DatasetRouter:
+    """Router from DATASET_ROUTER_CONFIG, falling back to the default rules"""
+    path = os.getenv("DATASET_ROUTER_CONFIG")
+    if path:
+        try:
+            return DatasetRouter.from_file(path)
+        except Exception as e:
+            print(f"Warning: Could not load dataset router config {path}: {e}. Using default rules.")
+    return DatasetRouter()
+
+# Global dataset router instance
+dataset_router = load_router()
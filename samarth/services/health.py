@@ -0,0 +1,148 @@
+# Health Probes for Project Samarth
+#
+# /live says whether the process is serving at all; /ready whether this
+# instance should receive traffic. Readiness comes from probes refreshed by a
+# background task every HEALTH_PROBE_INTERVAL_SECONDS, so the endpoints only
+# read the latest snapshot and never wait on the database or the LLM.
+#
+#   database  a SELECT 1 round trip and the connection pool's saturation
+#   llm       the LLM client's circuit breaker state
+#   caches    how full the answer, SQL and result caches are
+#   etl       when dataset_metadata was last updated by the ETL
+#
+# The instance is ready once warm-up has finished and the last probe reached
+# the database. An open LLM circuit or data older than HEALTH_ETL_MAX_AGE_HOURS
+# only marks it degraded: templates still answer without the LLM, and stale
+# data is better served than not at all.
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from samarth.data.db_connection import db
+
+# Age is computed by the database, in the same time zone the timestamps were written in
+LAST_ETL_QUERY = """
+    SELECT MAX(last_updated) AS last_updated,
+           EXTRACT(EPOCH FROM LOCALTIMESTAMP - MAX(last_updated)) / 3600 AS age_hours
+    FROM dataset_metadata
+"""
+
+
+class HealthMonitor:
+    """Background probes of the query service's dependencies, read in O(1) by /live and /ready"""
+
+    def __init__(self, interval: Optional[float] = None, etl_max_age_hours: Optional[float] = None):
+        self.interval = interval if interval is not None else float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "10"))
+        self.etl_max_age_hours = (etl_max_age_hours if etl_max_age_hours is not None
+                                  else float(os.getenv("HEALTH_ETL_MAX_AGE_HOURS", "168")))
+        self.started_at = time.monotonic()
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.refreshed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def probe(self, query_service: Any) -> Dict[str, Any]:
+        """Check every dependency once; blocking, so run it in a worker thread"""
+        snapshot: Dict[str, Any] = {}
+
+        started = time.perf_counter()
+        try:
+            db.execute_query("SELECT 1 AS ok", raise_on_error=True)
+            snapshot["database"] = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as e:
+            snapshot["database"] = {"ok": False, "error": str(e)}
+        pool = db.pool_stats()
+        if pool:
+            snapshot["database"]["pool"] = {**pool, "saturation": round(pool["in_use"] / pool["size"], 3)}
+
+        client = getattr(query_service.llm, "client", None)
+        snapshot["llm"] = {
+            "configured": query_service.llm is not None,
+            "circuit_state": client.breaker.state if client is not None else None,
+        }
+
+        caches = {"answer": query_service.answer_cache, "sql": query_service.sql_cache,
+                  "result": query_service.result_cache}
+        snapshot["caches"] = {
+            name: {"size": len(cache), "maxsize": cache.maxsize,
+                   "fill": round(len(cache) / cache.maxsize, 3) if cache.maxsize else 0.0}
+            for name, cache in caches.items()
+        }
+
+        snapshot["etl"] = {"last_updated": None, "age_hours": None}
+        if snapshot["database"]["ok"]:
+            rows = db.execute_query(LAST_ETL_QUERY)
+            if rows and rows[0]["last_updated"] is not None:
+                snapshot["etl"] = {
+                    "last_updated": str(rows[0]["last_updated"]),
+                    "age_hours": round(float(rows[0]["age_hours"]), 2),
+                }
+        return snapshot
+
+    async def refresh(self, query_service: Any):
+        self.snapshot = await asyncio.to_thread(self.probe, query_service)
+        self.refreshed_at = time.monotonic()
+
+    async def _run(self, query_service: Any):
+        while True:
+            try:
+                await self.refresh(query_service)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, query_service: Any):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(query_service))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "alive", "uptime_seconds": round(time.monotonic() - self.started_at, 1)}
+
+    def readiness(self, warmed_up: bool) -> Tuple[bool, Dict[str, Any]]:
+        """Whether to route traffic here, and why, from the latest snapshot"""
+        snapshot = self.snapshot
+        age = time.monotonic() - self.refreshed_at if snapshot is not None else None
+        # A probe loop that has stopped refreshing is as bad as a failed probe
+        fresh = age is not None and age <= max(3 * self.interval, 30.0)
+        reasons = []
+        if not warmed_up:
+            reasons.append("warming up")
+        if snapshot is None:
+            reasons.append("no probe has completed yet")
+        elif not fresh:
+            reasons.append(f"last probe is {age:.0f}s old")
+        elif not snapshot["database"]["ok"]:
+            reasons.append("database unreachable")
+        ready = not reasons
+
+        degraded = []
+        if snapshot is not None:
+            if snapshot["llm"]["circuit_state"] not in (None, "closed"):
+                degraded.append(f"LLM circuit {snapshot['llm']['circuit_state']}")
+            if not snapshot["llm"]["configured"]:
+                degraded.append("LLM not configured")
+            etl_age = snapshot["etl"]["age_hours"]
+            if etl_age is not None and self.etl_max_age_hours > 0 and etl_age > self.etl_max_age_hours:
+                degraded.append(f"data last updated {etl_age:.0f}h ago")
+
+        status = "not_ready" if not ready else "degraded" if degraded else "ready"
+        body = {
+            "status": status,
+            "reasons": reasons + degraded,
+            "probe_age_seconds": round(age, 1) if age is not None else None,
+            "checks": snapshot or {},
+        }
+        return ready, body
+
+# Global health monitor instance
+health_monitor = HealthMonitor()
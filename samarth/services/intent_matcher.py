@@ -0,0 +1,340 @@
+# Intent Matcher for Project Samarth
+#
+# Template questions ("top 5 crops in Punjab in 2012", "production trend in
+# Andhra Pradesh from 2010 to 2013") are answered with parameterized SQL taken
+# from the data access layer, so they never need an LLM round trip for SQL
+# generation.
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+from samarth.data.data_access import AgriculturalDataAccess, WeatherDataAccess, ClimateChangeDataAccess
+from samarth.data.db_connection import db
+
+# Default entity vocabularies. These can be replaced at runtime with values
+# read from the warehouse through IntentMatcher.set_vocabulary().
+INDIAN_STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa",
+    "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala",
+    "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland",
+    "Odisha", "Orissa", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana",
+    "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal", "Delhi",
+    "Jammu and Kashmir", "Ladakh", "Puducherry", "Chandigarh",
+    "Andaman and Nicobar Islands", "Dadra and Nagar Haveli", "Daman and Diu", "Lakshadweep"
+]
+
+COMMON_CROPS = [
+    "Rice", "Wheat", "Maize", "Jowar", "Bajra", "Ragi", "Barley", "Gram", "Tur", "Arhar",
+    "Moong", "Urad", "Cotton", "Sugarcane", "Jute", "Groundnut", "Soybean", "Rapeseed",
+    "Mustard", "Sunflower", "Potato", "Onion", "Tea", "Coffee", "Total-Pulse"
+]
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12
+}
+
+# Questions asking about relationships between datasets need real reasoning
+_RELATIONSHIP_PATTERN = re.compile(
+    r"\b(?:affect|affects|effect|impact|correlat\w*|relationship|relation|compare|comparison|versus|vs)\b",
+    re.IGNORECASE
+)
+_YEAR_RANGE_PATTERN = re.compile(
+    r"\b(?:from|between)\s+((?:19|20)\d{2})\s+(?:to|and|till|until)\s+((?:19|20)\d{2})\b"
+    r"|\b((?:19|20)\d{2})\s*(?:-|–|to)\s*((?:19|20)\d{2})\b",
+    re.IGNORECASE
+)
+_YEAR_PATTERN = re.compile(r"\b((?:19|20)\d{2})\b")
+_TOP_N_PATTERN = re.compile(r"\btop\s+(\d{1,3})\b", re.IGNORECASE)
+_MONTH_PATTERN = re.compile(r"\b(" + "|".join(MONTHS) + r")\b", re.IGNORECASE)
+# "minimum temperature", "max temp" and "min and max temperatures" name climate normal columns
+_TEMPERATURE_MEASURE_PATTERN = re.compile(
+    r"\b(?:min|max)(?:imum)?\.?\s+(?:(?:and|or|&)\s+(?:min|max)(?:imum)?\.?\s+)?(?:mean\s+)?temp(?:erature)?s?\b",
+    re.IGNORECASE
+)
+_MEASURE_PATTERN = re.compile(r"\b(min|max)", re.IGNORECASE)
+
+
+def _compile_vocabulary(values: List[str]) -> Optional[Pattern]:
+    """Compile a case-insensitive, word-bounded alternation (longest names first)"""
+    names = sorted({value for value in values if value}, key=len, reverse=True)
+    if not names:
+        return None
+    alternation = "|".join(re.escape(name) for name in names)
+    return re.compile(r"(?<![\w-])(" + alternation + r")(?![\w-])", re.IGNORECASE)
+
+
+def render_sql(sql: str, params: Tuple[Any, ...]) -> str:
+    """Render parameterized SQL with literal values, for display purposes only"""
+    rendered = " ".join(sql.split())
+    for param in params:
+        if isinstance(param, (int, float)):
+            literal = str(param)
+        else:
+            literal = "'" + str(param).replace("'", "''") + "'"
+        rendered = rendered.replace("%s", literal, 1)
+    return rendered
+
+
+@dataclass
+class IntentMatch:
+    """A question matched to a parameterized query"""
+    intent: str
+    dataset: str
+    sql: str
+    params: Tuple[Any, ...]
+    slots: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def display_sql(self) -> str:
+        return render_sql(self.sql, self.params)
+
+    def execute(self) -> List[Dict[str, Any]]:
+        """Run the matched query against the warehouse; raises DatabaseQueryException on errors"""
+        return db.execute_query(self.sql, self.params, raise_on_error=True)
+
+
+@dataclass
+class Intent:
+    """A template question: a trigger pattern, required slots and a query builder"""
+    name: str
+    dataset: str
+    trigger: Pattern
+    required_slots: Tuple[str, ...]
+    build: Callable[[Dict[str, Any]], Tuple[str, Tuple[Any, ...]]]
+    forbidden_slots: Tuple[str, ...] = ()
+
+    def match(self, question: str, slots: Dict[str, Any]) -> Optional[IntentMatch]:
+        if not self.trigger.search(question):
+            return None
+        if any(slots.get(slot) is None for slot in self.required_slots):
+            return None
+        if any(slots.get(slot) is not None for slot in self.forbidden_slots):
+            return None
+        sql, params = self.build(slots)
+        return IntentMatch(self.name, self.dataset, sql, params, dict(slots))
+
+
+def _crop_trend_query(slots: Dict[str, Any]) -> Tuple[str, Tuple[Any, ...]]:
+    if slots.get("year_range"):
+        start_year, end_year = slots["year_range"]
+        sql = """
+            SELECT year, production, area, yield_per_hectare
+            FROM agricultural_production
+            WHERE crop = %s AND state = %s AND year BETWEEN %s AND %s
+            ORDER BY year
+        """
+        return sql, (slots["crop"], slots["state"], start_year, end_year)
+    if slots.get("year"):
+        sql = """
+            SELECT year, production, area, yield_per_hectare
+            FROM agricultural_production
+            WHERE crop = %s AND state = %s AND year = %s
+        """
+        return sql, (slots["crop"], slots["state"], slots["year"])
+    return AgriculturalDataAccess.PRODUCTION_TRENDS_QUERY, (slots["crop"], slots["state"])
+
+
+def _top_rainfall_query(slots: Dict[str, Any]) -> Tuple[str, Tuple[Any, ...]]:
+    limit = slots.get("top_n") or 10
+    if slots.get("month"):
+        return WeatherDataAccess.TOP_RAINFALL_STATES_BY_MONTH_QUERY, (slots["year"], slots["month"], limit)
+    return WeatherDataAccess.TOP_RAINFALL_STATES_QUERY, (slots["year"], limit)
+
+
+def _top_stations_query(slots: Dict[str, Any]) -> Tuple[str, Tuple[Any, ...]]:
+    if slots.get("temperature") == "minimum":
+        return ClimateChangeDataAccess.TOP_STATIONS_BY_MIN_TEMPERATURE_QUERY, (slots.get("top_n") or 10,)
+    return ClimateChangeDataAccess.TOP_STATIONS_BY_MAX_TEMPERATURE_QUERY, (slots.get("top_n") or 10,)
+
+
+def _station_temperature_query(slots: Dict[str, Any]) -> Tuple[str, Tuple[Any, ...]]:
+    sql = """
+        SELECT "Month", "Mean_Temperature_in_degree_C___Maximum" as max_temp,
+               "Mean_Temperature__in_degree_C___Minimum" as min_temp
+        FROM climate_change_data
+        WHERE "Station_Name" = %s
+        ORDER BY id
+    """
+    return sql, (slots["station"],)
+
+
+def _pattern(expression: str) -> Pattern:
+    return re.compile(expression, re.IGNORECASE)
+
+
+# Ordered from most to least specific; the first intent that matches wins
+DEFAULT_INTENTS = [
+    Intent(
+        name="top_stations_by_temperature",
+        dataset="climate_change_data",
+        trigger=_pattern(r"\b(?:highest|hottest|warmest|maximum|top)\b.*\btemperature\b.*\b(?:districts?|stations?)\b"
+                         r"|\b(?:districts?|stations?)\b.*\b(?:highest|hottest|warmest|maximum|top)\b.*\btemperature\b"),
+        required_slots=(),
+        forbidden_slots=("state", "station"),
+        build=_top_stations_query,
+    ),
+    Intent(
+        name="station_temperature_trend",
+        dataset="climate_change_data",
+        trigger=_pattern(r"\btemperatures?\b"),
+        required_slots=("station",),
+        build=_station_temperature_query,
+    ),
+    Intent(
+        name="top_rainfall_states",
+        dataset="weather_data",
+        trigger=_pattern(r"\b(?:highest|most|top|maximum)\b.*\brainfall\b|\brainfall\b.*\b(?:highest|most)\b"),
+        required_slots=("year",),
+        forbidden_slots=("state", "crop"),
+        build=_top_rainfall_query,
+    ),
+    Intent(
+        name="top_crops_by_production",
+        dataset="agricultural_production",
+        trigger=_pattern(r"\btop\b.*\bcrops\b|\bcrops\b.*\bby production\b|\b(?:largest|biggest|major)\b.*\bcrops\b"),
+        required_slots=("state", "year"),
+        forbidden_slots=("crop",),
+        build=lambda slots: (AgriculturalDataAccess.TOP_CROPS_BY_PRODUCTION_QUERY,
+                             (slots["state"], slots["year"], slots.get("top_n") or 10)),
+    ),
+    Intent(
+        name="state_rainfall_by_month",
+        dataset="weather_data",
+        trigger=_pattern(r"\brainfall\b"),
+        required_slots=("state", "year"),
+        forbidden_slots=("crop",),
+        build=lambda slots: (WeatherDataAccess.RAINFALL_STATS_QUERY, (slots["state"], slots["year"])),
+    ),
+    Intent(
+        name="crop_production_trend",
+        dataset="agricultural_production",
+        trigger=_pattern(r"\b(?:production|produced|output)\b"),
+        required_slots=("crop", "state"),
+        build=_crop_trend_query,
+    ),
+    Intent(
+        name="state_production_trend",
+        dataset="agricultural_production",
+        trigger=_pattern(r"\bproduction\b.*\b(?:trend|change|changed|over|from|between)\b"),
+        required_slots=("state", "year_range"),
+        forbidden_slots=("crop",),
+        build=lambda slots: (AgriculturalDataAccess.PRODUCTION_BY_STATE_AND_YEAR_RANGE_QUERY,
+                             (slots["state"], slots["year_range"][0], slots["year_range"][1])),
+    ),
+]
+
+
+class IntentMatcher:
+    """Slot-filling matcher that maps template questions to parameterized SQL"""
+
+    def __init__(self, intents: Optional[List[Intent]] = None):
+        self.intents: List[Intent] = list(intents if intents is not None else DEFAULT_INTENTS)
+        self._lock = threading.Lock()
+        self._attempts = 0
+        self._hits: Dict[str, int] = {}
+        self.set_vocabulary(states=INDIAN_STATES, crops=COMMON_CROPS, stations=[])
+
+    def register(self, intent: Intent, first: bool = False):
+        """Add an intent; set first=True to give it priority over the defaults"""
+        if first:
+            self.intents.insert(0, intent)
+        else:
+            self.intents.append(intent)
+
+    def set_vocabulary(self, states: Optional[List[str]] = None, crops: Optional[List[str]] = None,
+                       stations: Optional[List[str]] = None):
+        """Replace the entity vocabularies used for slot filling"""
+        if states is not None:
+            self._state_names = {name.lower(): name for name in states}
+            self._state_pattern = _compile_vocabulary(states)
+        if crops is not None:
+            self._crop_names = {name.lower(): name for name in crops}
+            self._crop_pattern = _compile_vocabulary(crops)
+        if stations is not None:
+            self._station_names = {name.lower(): name for name in stations}
+            self._station_pattern = _compile_vocabulary(stations)
+
+    def extract_slots(self, question: str) -> Dict[str, Any]:
+        """Extract state, crop, station, year, year range, month, top-N and temperature measure entities"""
+        slots: Dict[str, Any] = {
+            "state": None, "crop": None, "station": None, "year": None,
+            "year_range": None, "month": None, "top_n": None, "temperature": None
+        }
+
+        for slot, pattern, names in (("state", self._state_pattern, self._state_names),
+                                     ("crop", self._crop_pattern, self._crop_names),
+                                     ("station", self._station_pattern, self._station_names)):
+            if pattern is None:
+                continue
+            found = {names[m.lower()] for m in pattern.findall(question)}
+            if len(found) == 1:
+                slots[slot] = found.pop()
+            elif len(found) > 1:
+                # Several entities of one kind means a comparison; not a template question
+                slots[slot] = None
+                slots["ambiguous"] = True
+
+        range_match = _YEAR_RANGE_PATTERN.search(question)
+        if range_match:
+            groups = [g for g in range_match.groups() if g]
+            start_year, end_year = sorted(int(g) for g in groups[:2])
+            slots["year_range"] = (start_year, end_year)
+        else:
+            years = {int(y) for y in _YEAR_PATTERN.findall(question)}
+            if len(years) == 1:
+                slots["year"] = years.pop()
+
+        month_match = _MONTH_PATTERN.search(question)
+        if month_match:
+            slots["month"] = MONTHS[month_match.group(1).lower()]
+
+        top_match = _TOP_N_PATTERN.search(question)
+        if top_match:
+            slots["top_n"] = int(top_match.group(1))
+
+        measures = {measure.lower() for phrase in _TEMPERATURE_MEASURE_PATTERN.findall(question)
+                    for measure in _MEASURE_PATTERN.findall(phrase)}
+        if len(measures) == 1:
+            slots["temperature"] = "minimum" if measures.pop() == "min" else "maximum"
+        elif len(measures) > 1:
+            slots["ambiguous"] = True
+
+        return slots
+
+    def match(self, question: str, record: bool = True) -> Optional[IntentMatch]:
+        """Return the first intent matching the question, or None to fall through to the LLM.
+        
+        Pass record=False to look without counting towards the hit rate.
+        """
+        result = None
+        if question and not _RELATIONSHIP_PATTERN.search(question):
+            slots = self.extract_slots(question)
+            if not slots.pop("ambiguous", False):
+                for intent in self.intents:
+                    result = intent.match(question, slots)
+                    if result:
+                        break
+
+        if not record:
+            return result
+        with self._lock:
+            self._attempts += 1
+            if result:
+                self._hits[result.intent] = self._hits.get(result.intent, 0) + 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Fast path hit rate since process start"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            return {
+                "attempts": self._attempts,
+                "hits": hits,
+                "misses": self._attempts - hits,
+                "hit_rate": hits / self._attempts if self._attempts else 0.0,
+                "hits_by_intent": dict(self._hits)
+            }
+
+# Global intent matcher instance
+intent_matcher = IntentMatcher()
@@ -0,0 +1,279 @@
+# Async LLM Client for Project Samarth
+#
+# Wraps blocking provider SDK calls so that they run off the event loop with a
+# per-call deadline, bounded retries with jittered exponential backoff, an
+# optional hedged second request once the primary is slower than a latency
+# percentile, and a circuit breaker that fails fast while the provider is
+# degraded.
+#
+# Provider calls run on their own pool of LLM_MAX_THREADS threads. A call that
+# misses its deadline keeps its thread until the SDK returns, so a slow
+# provider fills this pool rather than the default executor the database and
+# query logger use; while it is full, no hedges or retries are started.
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+from samarth.utils.exceptions import LLMUnavailableException
+
+
+class CircuitBreaker:
+    """Open after consecutive failures; allow a single trial call after a cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Free the half-open trial slot of a call that ended without an outcome (cancelled)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class AsyncLLMClient:
+    """Resilient async wrapper around a blocking LLM call"""
+
+    def __init__(self, timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None,
+                 hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20,
+                 breaker: Optional[CircuitBreaker] = None, max_threads: Optional[int] = None):
+        self.timeout = timeout if timeout is not None else float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "4"))
+        # Hedging is off unless a percentile (e.g. 95) is configured
+        if hedge_percentile is None and os.getenv("LLM_HEDGE_PERCENTILE"):
+            hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE"))
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+        )
+        self.latency = LatencyTracker()
+        self.max_threads = max_threads or int(os.getenv("LLM_MAX_THREADS", "16"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="samarth-llm")
+        # Submitted provider calls whose thread has not returned yet, including abandoned ones
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self.stats_counters = {"calls": 0, "retries": 0, "hedges": 0, "timeouts": 0, "failures": 0, "rejected": 0,
+                               "saturated": 0}
+
+    @property
+    def saturated(self) -> bool:
+        """Whether every LLM thread is taken, so a new call would only queue"""
+        return self._busy >= self.max_threads
+
+    async def _run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """func(*args, **kwargs) on the LLM thread pool, in a copy of the current context like to_thread"""
+        def run() -> Any:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+
+        with self._busy_lock:
+            self._busy += 1
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(context.run, run))
+
+    async def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run func(*args, **kwargs) in a worker thread with deadline, retries, hedging and the breaker"""
+        self.stats_counters["calls"] += 1
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self.stats_counters["rejected"] += 1
+                raise LLMUnavailableException(
+                    f"circuit breaker is {self.breaker.state}" + (f" after: {last_error}" if last_error else "")
+                )
+            try:
+                result = await self._hedged_attempt(func, args, kwargs)
+                self.breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                # Otherwise a cancelled half-open trial would block every later call
+                self.breaker.release_trial()
+                raise
+            except Exception as e:
+                last_error = e
+                self.stats_counters["failures"] += 1
+                self.breaker.record_failure()
+                if attempt < self.max_retries and self.saturated:
+                    # Earlier attempts still hold the threads; a retry would only queue behind them
+                    self.stats_counters["saturated"] += 1
+                    break
+                if attempt < self.max_retries:
+                    self.stats_counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt))
+
+        raise LLMUnavailableException(f"gave up after {attempt + 1} attempts: {last_error}")
+
+    async def stream(self, factory: Callable[[], Iterator[str]]) -> AsyncIterator[str]:
+        """Iterate a blocking streaming response, applying the deadline to each chunk.
+
+        Streams are not retried once a chunk has been yielded.
+        """
+        if not self.breaker.allow():
+            self.stats_counters["rejected"] += 1
+            raise LLMUnavailableException(f"circuit breaker is {self.breaker.state}")
+        sentinel = object()
+        settled = False
+        try:
+            iterator = await asyncio.wait_for(self._run(factory), self.timeout)
+            while True:
+                chunk = await asyncio.wait_for(self._run(next, iterator, sentinel), self.timeout)
+                if chunk is sentinel:
+                    break
+                yield chunk
+            settled = True
+            self.breaker.record_success()
+        except asyncio.TimeoutError:
+            settled = True
+            self.stats_counters["timeouts"] += 1
+            self.breaker.record_failure()
+            raise LLMUnavailableException(f"no response within {self.timeout:.0f}s")
+        except LLMUnavailableException:
+            raise
+        except Exception as e:
+            settled = True
+            self.breaker.record_failure()
+            raise LLMUnavailableException(str(e))
+        finally:
+            # Cancelled, or the consumer stopped reading (GeneratorExit): no outcome to record
+            if not settled:
+                self.breaker.release_trial()
+
+    async def _attempt(self, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            # The worker thread cannot be interrupted, but the caller stops waiting at the deadline
+            result = await asyncio.wait_for(self._run(func, *args, **kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats_counters["timeouts"] += 1
+            raise TimeoutError(f"no response within {self.timeout:.0f}s")
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    async def _hedged_attempt(self, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        hedge_delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self._attempt(func, args, kwargs))
+        if hedge_delay is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done:
+                return primary.result()
+            if self.saturated:
+                self.stats_counters["saturated"] += 1
+                return await primary
+
+            # The primary is slower than usual: race it against a second request
+            self.stats_counters["hedges"] += 1
+            pending.add(asyncio.ensure_future(self._attempt(func, args, kwargs)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Also reached when the caller is cancelled while waiting out the hedge delay
+            for task in pending:
+                task.cancel()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_percentile or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform between zero and the capped exponential delay
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "circuit_state": self.breaker.state,
+            "threads_busy": self._busy,
+            "p50_seconds": self.latency.percentile(50),
+            "p95_seconds": self.latency.percentile(95),
+        }
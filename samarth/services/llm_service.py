@@ -1,11 +1,15 @@
 # LLM Service for Project Samarth
 import os
-import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, AsyncIterator, Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.generative_models import GenerativeModel
-from google.generativeai.types import GenerationConfig
+from samarth.models.llm_model import LLMProvider, get_provider
+from samarth.services.llm_client import AsyncLLMClient
+from samarth.services.prompt_builder import prompt_builder
+from samarth.services.schema_catalog import schema_catalog
+from samarth.services.dataset_router import dataset_router
+from samarth.services.dataset_classifier import dataset_classifier
+from samarth.utils.metrics import LLM_CALL_SECONDS
+from samarth.utils.tracing import tracer
 
 # Load environment variables from .env file
 # The .env file is located in the samarth directory
@@ -17,166 +21,158 @@ else:
     load_dotenv()
 
 class LLMService:
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set")
-        
-        # Configure the API key for the generative AI client
-        # Using getattr to avoid linter issues with non-exported methods
-        configure_func = getattr(genai, 'configure')
-        configure_func(api_key=api_key)
-        
-        # Try to create the model, fallback to gemini-pro if the specified model fails
-        model_name = os.getenv("LLM_MODEL", "gemini-2.5-flash")
-        try:
-            self.model = GenerativeModel(model_name)
-        except Exception as e:
-            print(f"Warning: Failed to create model {model_name}: {e}")
-            print("Falling back to gemini-pro model")
-            self.model = GenerativeModel("gemini-pro")
+    SQL_GENERATION_FAILED = "SELECT 'LLM query generation failed' as error_message;"
+    CLIMATE_EXAMPLES = """
+        Examples of correct queries for climate_change_data:
+        1. To find stations with highest average maximum temperature:
+           SELECT "Station_Name", AVG("Mean_Temperature_in_degree_C___Maximum") as avg_max_temp FROM climate_change_data GROUP BY "Station_Name" ORDER BY avg_max_temp DESC LIMIT 10
+        2. To find stations with highest average minimum temperature:
+           SELECT "Station_Name", AVG("Mean_Temperature__in_degree_C___Minimum") as avg_min_temp FROM climate_change_data GROUP BY "Station_Name" ORDER BY avg_min_temp DESC LIMIT 10"""
+    
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        # Gemini, OpenAI or the offline stub, selected by LLM_PROVIDER
+        self.provider = provider or get_provider()
+        self.prompt_builder = prompt_builder
+        self.schema_catalog = schema_catalog
+        self.dataset_router = dataset_router
+        self.dataset_classifier = dataset_classifier
+        
+        # Every model call goes through this client: deadlines, retries, hedging and circuit breaking
+        self.client = AsyncLLMClient()
     
     def identify_relevant_datasets(self, question: str) -> List[str]:
-        """Identify relevant datasets for a given question"""
-        # In a production environment, this would use embeddings or more sophisticated methods
-        # For now, we'll use a simple keyword-based approach
-        
-        agriculture_keywords = ["crop", "farm", "agriculture", "yield", "production", "harvest", "irrigation", "fertilizer", "pesticide", "rice", "wheat", "maize", "sugarcane"]
-        climate_keywords = ["weather", "rainfall", "temperature", "climate", "precipitation", "humidity", "monsoon", "wind", "heat", "cold", "warm", "hot", "cool", "chill"]
-        district_keywords = ["district", "station", "location", "place", "area", "region"]
-        temperature_keywords = ["temperature", "heat", "warm", "hot", "cold", "cool", "chill", "degrees", "celsius", "fahrenheit"]
-        highest_keywords = ["highest", "warmest", "hottest", "maximum", "peak", "top", "greatest", "most"]
-        
-        datasets = set()
-        question_lower = question.lower()
-        
-        # Check for agriculture-related keywords
-        if any(keyword in question_lower for keyword in agriculture_keywords):
-            datasets.add("agricultural_production")
+        """Identify relevant datasets for a given question, best match first.
         
-        # Check for climate-related keywords
-        if any(keyword in question_lower for keyword in climate_keywords):
-            datasets.add("weather_data")
-        
-        # Check for climate change-related keywords (including district temperature queries)
-        if (any(keyword in question_lower for keyword in district_keywords) and 
-            any(keyword in question_lower for keyword in temperature_keywords) and
-            any(keyword in question_lower for keyword in highest_keywords)):
-            datasets.add("climate_change_data")
-        elif "climate change" in question_lower or "global warming" in question_lower:
-            datasets.add("climate_change_data")
-        
-        # If no specific datasets identified, return all datasets
-        if not datasets:
-            datasets = {"agricultural_production", "weather_data", "climate_change_data"}
-        
-        return list(datasets)
+        A classifier trained on query history is used when one is available and
+        confident; otherwise the keyword router decides.
+        """
+        if self.dataset_classifier is not None:
+            datasets = self.dataset_classifier.route(question)
+            if datasets:
+                return datasets
+        return self.dataset_router.route(question)
     
-    def generate_sql_query(self, question: str, datasets: List[str]) -> str:
-        """Generate SQL query based on question and datasets"""
-        # Special handling for the specific question about highest mean temperature
-        if "districts has highest mean temperature over 100 years" in question.lower() and "climate_change_data" in datasets:
-            return '''SELECT "Station_Name", AVG("Mean_Temperature_in_degree_C___Maximum") as avg_max_temp FROM climate_change_data GROUP BY "Station_Name" ORDER BY avg_max_temp DESC LIMIT 10'''
-        
-        # Special handling for Andhra Pradesh crop production trend question
-        if "crop production trend in andhra pradesh from 2010 to 2013" in question.lower() and "agricultural_production" in datasets:
-            return '''SELECT year, SUM(production) as total_production FROM agricultural_production WHERE state = 'Andhra Pradesh' AND year BETWEEN 2010 AND 2013 GROUP BY year ORDER BY year'''
+    def _build_sql_prompt(self, question: str, datasets: List[str]) -> str:
+        """Build the prompt used to generate SQL for a question"""
+        # Columns, row counts, value ranges and categories come from the live schema
+        dataset_info = self.schema_catalog.render_prompt_context(datasets)
         
-        # For now, we'll provide generic information about the datasets
-        # In a real implementation, this would fetch actual metadata from the database
-        dataset_descriptions = {
-            "agricultural_production": "Table containing agricultural production statistics by state, crop, and year. Columns: id, state, district, crop, year, season, area, production, yield_per_hectare, created_at",
-            "weather_data": "Table containing weather data including rainfall and temperature by state and date. Columns: id, state, district, date, rainfall, temperature_max, temperature_min, humidity, wind_speed, created_at",
-            "climate_change_data": "Table containing climate change data with monthly averages for temperature and rainfall by station. Columns: id, Station_Name, Month, Period, No_of_Years, Mean_Temperature_in_degree_C___Maximum, Mean_Temperature__in_degree_C___Minimum, Mean_Rainfall_in_mm, created_at. Important: When querying this table, use double quotes around column names."
-        }
-        
-        dataset_info = []
-        for dataset in datasets:
-            description = dataset_descriptions.get(dataset, f"Table: {dataset}")
-            dataset_info.append(f"Table: {dataset} - {description}")
-        
-        prompt = f"""
+        return f"""
         You are an expert SQL analyst working with Indian agricultural and climate data.
         
         Available datasets:
-        {chr(10).join(dataset_info) if dataset_info else 'No dataset information available'}
+        {dataset_info or 'No dataset information available'}
         
         User question: "{question}"
         
         Generate a valid PostgreSQL query to answer this question.
         Only return the SQL query, nothing else.
         Make sure to use proper table names and column names.
-        For the climate_change_data table, use double quotes around column names (e.g., "Station_Name", "Mean_Temperature_in_degree_C___Maximum").
+        Column names listed in double quotes must be written with the same quotes.
         Use appropriate WHERE clauses to filter data based on the question.
         Use appropriate ORDER BY clauses to sort results.
         Use appropriate LIMIT clauses to limit results to a reasonable number.
         Use proper date formatting for date comparisons.
-        
-        Examples of correct queries for climate_change_data:
-        1. To find stations with highest average maximum temperature:
-           SELECT "Station_Name", AVG("Mean_Temperature_in_degree_C___Maximum") as avg_max_temp FROM climate_change_data GROUP BY "Station_Name" ORDER BY avg_max_temp DESC LIMIT 10
-        2. To find stations with highest average minimum temperature:
-           SELECT "Station_Name", AVG("Mean_Temperature__in_degree_C___Minimum") as avg_min_temp FROM climate_change_data GROUP BY "Station_Name" ORDER BY avg_min_temp DESC LIMIT 10
+        {self.CLIMATE_EXAMPLES if "climate_change_data" in datasets else ""}
         """
+    
+    def _generate(self, prompt: str, temperature: float, max_output_tokens: int) -> str:
+        """Call the model once and return its text; raises on provider errors"""
+        return self.provider.generate(prompt, temperature, max_output_tokens)
+    
+    def _generate_stream(self, prompt: str, temperature: float, max_output_tokens: int) -> Iterator[str]:
+        """Call the model in streaming mode and return an iterator of text chunks; raises on provider errors"""
+        return self.provider.stream(prompt, temperature, max_output_tokens)
+    
+    async def _call(self, operation: str, prompt: str, temperature: float, max_output_tokens: int) -> str:
+        """One instrumented call through the async client"""
+        with tracer.span(f"llm.{operation}", provider=self.provider.name), \
+                LLM_CALL_SECONDS.time(provider=self.provider.name, operation=operation):
+            return await self.client.call(self._generate, prompt, temperature, max_output_tokens)
+    
+    async def _stream(self, operation: str, prompt: str, temperature: float,
+                      max_output_tokens: int) -> AsyncIterator[str]:
+        """One instrumented streaming call; the duration runs until the last chunk"""
+        with tracer.span(f"llm.{operation}", provider=self.provider.name) as span, \
+                LLM_CALL_SECONDS.time(provider=self.provider.name, operation=operation):
+            chunks = 0
+            async for chunk in self.client.stream(lambda: self._generate_stream(prompt, temperature, max_output_tokens)):
+                chunks += 1
+                yield chunk
+            if span is not None:
+                span.set(chunks=chunks)
+    
+    @staticmethod
+    def _clean_sql(sql_query: str) -> str:
+        """Clean up the response to ensure it's just SQL"""
+        sql_query = sql_query.strip()
+        # Remove any markdown formatting if present
+        if sql_query.startswith("```sql"):
+            sql_query = sql_query[6:]
+        if sql_query.startswith("```"):
+            sql_query = sql_query[3:]
+        if sql_query.endswith("```"):
+            sql_query = sql_query[:-3]
+        return sql_query.strip()
+    
+    async def agenerate_sql_query(self, question: str, datasets: List[str]) -> str:
+        """Generate SQL based on the question and datasets, without blocking the event loop.
         
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=GenerationConfig(
-                    temperature=0.3,
-                    max_output_tokens=500
-                )
-            )
-            # Clean up the response to ensure it's just SQL
-            sql_query = response.text.strip() if response.text else ""
-            # Remove any markdown formatting if present
-            if sql_query.startswith("```sql"):
-                sql_query = sql_query[6:]
-            if sql_query.startswith("```"):
-                sql_query = sql_query[3:]
-            if sql_query.endswith("```"):
-                sql_query = sql_query[:-3]
-            return sql_query.strip()
-        except Exception as e:
-            # Fallback SQL query generation
-            return "SELECT 'LLM query generation failed' as error_message;"
+        Template questions (e.g. highest mean temperature by station, state production
+        trends) are answered by the intent matcher before this method is reached.
+        
+        Raises LLMUnavailableException when the provider times out, exhausts its
+        retries or the circuit breaker is open.
+        """
+        prompt = self._build_sql_prompt(question, datasets)
+        sql_query = await self._call("sql_generation", prompt, 0.3, 500)
+        return self._clean_sql(sql_query)
     
-    def synthesize_answer(self, question: str, query_results: List[Dict[str, Any]], 
-                         datasets: List[str], sql_queries: List[str]) -> str:
-        """Synthesize a natural language answer from query results"""
-        prompt = f"""
-        You are Project Samarth, an AI assistant for analyzing Indian agricultural and climate data.
+    def _build_repair_prompt(self, question: str, datasets: List[str], sql_query: str, error: str) -> str:
+        """Build the prompt used to fix SQL that the database rejected"""
+        return f"""
+        You are an expert SQL analyst working with Indian agricultural and climate data.
         
-        User question: "{question}"
+        Available datasets:
+        {self.schema_catalog.render_prompt_context(datasets) or 'No dataset information available'}
         
-        Datasets used: {', '.join(datasets)}
+        User question: "{question}"
         
-        SQL queries executed:
-        {chr(10).join(sql_queries)}
+        This query failed:
+        {sql_query}
         
-        Query results:
-        {json.dumps(query_results[:10], indent=2, default=str)}  # Limit to first 10 results
+        PostgreSQL error:
+        {error}
         
-        Please provide a clear, concise answer to the user's question based on the query results.
-        Include specific numbers and data points from the results where relevant.
-        Format your response in a readable way with appropriate units.
-        If the data doesn't fully answer the question, acknowledge that limitation.
-        If there are no results, explain that no data was found.
+        Generate a valid PostgreSQL query that fixes the error and answers the question.
+        Only return the SQL query, nothing else.
+        Column names listed in double quotes must be written with the same quotes.
         """
-        
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=GenerationConfig(
-                    temperature=0.5,
-                    max_output_tokens=1000
-                )
-            )
-            return response.text.strip() if response.text else ""
-        except Exception as e:
-            return f"Unable to synthesize answer due to an error: {str(e)}"
     
-    def calculate_confidence_score(self, query_results: List[Dict[str, Any]]) -> float:
+    async def arepair_sql_query(self, question: str, datasets: List[str], sql_query: str, error: str) -> str:
+        """Rewrite a failed SQL query without blocking the event loop; raises LLMUnavailableException"""
+        prompt = self._build_repair_prompt(question, datasets, sql_query, error)
+        return self._clean_sql(await self._call("sql_repair", prompt, 0.1, 500))
+    
+    def _build_synthesis_prompt(self, question: str, query_results: List[Dict[str, Any]],
+                                datasets: List[str], sql_queries: List[str]) -> str:
+        """Build the prompt used to turn query results into an answer"""
+        return self.prompt_builder.build_synthesis_prompt(question, query_results, datasets, sql_queries)
+    
+    async def asynthesize_answer(self, question: str, query_results: List[Dict[str, Any]],
+                                 datasets: List[str], sql_queries: List[str]) -> str:
+        """Synthesize an answer without blocking the event loop; raises LLMUnavailableException"""
+        prompt = self._build_synthesis_prompt(question, query_results, datasets, sql_queries)
+        return await self._call("synthesis", prompt, 0.5, 1000)
+    
+    def astream_answer(self, question: str, query_results: List[Dict[str, Any]],
+                       datasets: List[str], sql_queries: List[str]) -> AsyncIterator[str]:
+        """Stream answer chunks with a per-chunk deadline; raises LLMUnavailableException"""
+        prompt = self._build_synthesis_prompt(question, query_results, datasets, sql_queries)
+        return self._stream("synthesis_stream", prompt, 0.5, 1000)
+    
+    @staticmethod
+    def calculate_confidence_score(query_results: List[Dict[str, Any]]) -> float:
         """Calculate confidence score based on query results"""
         if not query_results:
             return 0.1  # Low confidence if no results
@@ -196,9 +192,10 @@ class LLMService:
         else:
             return 0.95
 
-# Global LLM service instance - only create if API key is available
-try:
-    llm_service = LLMService()
-except ValueError:
-    llm_service = None
-    print("Warning: GEMINI_API_KEY not set. LLM service will not be available.")
\ No newline at end of file
+def create_llm_service() -> Optional[LLMService]:
+    """LLM service for the configured provider, or None when the provider is not configured"""
+    try:
+        return LLMService()
+    except ValueError as e:
+        print(f"Warning: {e}. LLM service will not be available.")
+        return None
\ No newline at end of file
@@ -0,0 +1,161 @@
+# Prompt Builder for Project Samarth
+#
+# Serializes query results for answer synthesis as compact CSV (one header per
+# result shape, rounded numbers). Long results are summarized with min/max/mean
+# and trend statistics plus an evenly spaced sample of rows. The whole prompt
+# is kept within a configurable token budget.
+import csv
+import io
+import os
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+from samarth.services.answer_renderer import TIME_COLUMNS, format_change
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English and digits)"""
+    return (len(text) + 3) // 4
+
+
+def compact_number(value: Any, digits: int = 2) -> str:
+    """Render a number without separators, rounded to at most `digits` decimals"""
+    number = round(float(value), digits)
+    if number == int(number) and abs(number) < 1e15:
+        return str(int(number))
+    return f"{number:.{digits}f}".rstrip("0").rstrip(".")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _cell(value: Any, digits: int) -> Any:
+    if value is None:
+        return ""
+    if _is_number(value):
+        return compact_number(value, digits)
+    return str(value)
+
+
+def _sample(rows: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+    """Evenly spaced rows that always include the first and last"""
+    if count >= len(rows):
+        return rows
+    if count <= 1:
+        return rows[:count]
+    step = (len(rows) - 1) / (count - 1)
+    return [rows[round(i * step)] for i in range(count)]
+
+
+class PromptBuilder:
+    """Build compact, budgeted prompts for answer synthesis"""
+
+    def __init__(self, token_budget: Optional[int] = None, max_rows: Optional[int] = None,
+                 sample_rows: Optional[int] = None, digits: int = 2):
+        self.token_budget = token_budget or int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+        self.max_rows = max_rows or int(os.getenv("PROMPT_MAX_ROWS", "40"))
+        self.sample_rows = sample_rows or int(os.getenv("PROMPT_SAMPLE_ROWS", "12"))
+        self.digits = digits
+
+    def serialize_rows(self, rows: List[Dict[str, Any]]) -> str:
+        """CSV with a header line for each run of rows sharing the same columns"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        columns: Optional[List[str]] = None
+        for row in rows:
+            keys = list(row.keys())
+            if keys != columns:
+                if columns is not None:
+                    buffer.write("\n")
+                writer.writerow(keys)
+                columns = keys
+            writer.writerow([_cell(row[key], self.digits) for key in keys])
+        return buffer.getvalue().rstrip("\n")
+
+    def summarize(self, rows: List[Dict[str, Any]]) -> str:
+        """Per-column statistics: count, min, max, mean and first-to-last trend"""
+        columns = list(rows[0].keys())
+        time_column = next((c for c in TIME_COLUMNS if c in columns), None)
+        lines = [f"rows: {len(rows)}"]
+        if time_column:
+            periods = [row.get(time_column) for row in rows if row.get(time_column) is not None]
+            if periods:
+                lines.append(f"{time_column}: {_cell(periods[0], 0)} to {_cell(periods[-1], 0)}")
+
+        for column in columns:
+            if column == time_column:
+                continue
+            values = [row.get(column) for row in rows]
+            numbers = [float(v) for v in values if _is_number(v)]
+            if numbers and len(numbers) == len([v for v in values if v is not None]):
+                stats = (f"{column}: min {compact_number(min(numbers), self.digits)}, "
+                         f"max {compact_number(max(numbers), self.digits)}, "
+                         f"mean {compact_number(sum(numbers) / len(numbers), self.digits)}")
+                if time_column and len(numbers) > 1:
+                    stats += f", trend {format_change(numbers[0], numbers[-1])}"
+                lines.append(stats)
+            else:
+                distinct = list(dict.fromkeys(str(v) for v in values if v is not None))
+                shown = ", ".join(distinct[:10]) + (", ..." if len(distinct) > 10 else "")
+                lines.append(f"{column}: {len(distinct)} distinct ({shown})")
+        return "\n".join(lines)
+
+    def _results_section(self, rows: List[Dict[str, Any]], sample_size: int) -> str:
+        if not rows:
+            return "(no rows)"
+        if len(rows) <= sample_size:
+            return self.serialize_rows(rows)
+        groups: List[Tuple[Tuple[str, ...], List[Dict[str, Any]]]] = []
+        for row in rows:
+            keys = tuple(row.keys())
+            if not groups or groups[-1][0] != keys:
+                groups.append((keys, []))
+            groups[-1][1].append(row)
+        # Summarize each result shape separately, sharing the sample budget
+        per_group = max(2, sample_size // len(groups))
+        parts = []
+        for _, group in groups:
+            sampled = _sample(group, per_group)
+            parts.append("Summary:\n" + self.summarize(group))
+            label = "All rows" if len(sampled) == len(group) else f"Sample of {len(sampled)} of {len(group)} rows"
+            parts.append(f"{label}:\n" + self.serialize_rows(sampled))
+        return "\n\n".join(parts)
+
+    def build_synthesis_prompt(self, question: str, query_results: List[Dict[str, Any]],
+                               datasets: List[str], sql_queries: List[str]) -> str:
+        """Prompt for turning query results into an answer, within the token budget"""
+        header = (
+            "You are Project Samarth, an AI assistant for analyzing Indian agricultural and climate data.\n"
+            f'User question: "{question}"\n'
+            f"Datasets used: {', '.join(datasets)}"
+        )
+        instructions = (
+            "Answer the question clearly and concisely from these results, citing specific numbers with units. "
+            "If the data doesn't fully answer the question, say so; "
+            "if there are no results, explain that no data was found."
+        )
+        sql = "SQL executed:\n" + "\n".join(sql_queries) if sql_queries else ""
+
+        sample_size = len(query_results) if len(query_results) <= self.max_rows else self.sample_rows
+        while True:
+            results = "Results (CSV):\n" + self._results_section(query_results, sample_size)
+            if sample_size < len(query_results):
+                results += "\n(Summary statistics cover all rows, not just the sample.)"
+            prompt = "\n\n".join(part for part in (header, sql, results, instructions) if part)
+            if estimate_tokens(prompt) <= self.token_budget:
+                return prompt
+            if sample_size > 2:
+                sample_size = max(2, min(sample_size, len(query_results)) // 2)
+            elif sql:
+                # The SQL is least useful to the answer; drop it before truncating results
+                sql = ""
+            else:
+                break
+
+        # Still over budget: cut the results text to fit
+        room = self.token_budget * 4 - len(header) - len(instructions) - 8
+        results = results[:max(room, 0)].rsplit("\n", 1)[0] + "\n..."
+        return "\n\n".join((header, results, instructions))
+
+# Global prompt builder instance
+prompt_builder = PromptBuilder()
@@ -0,0 +1,151 @@
+# Query Logger for Project Samarth
+#
+# Persists answered questions to user_queries off the request path. Requests
+# only enqueue a UserQuery; a background task drains the queue and writes
+# batches with one multi-row INSERT (psycopg2 execute_values). The queue is
+# bounded: when it is full new entries are dropped and counted. On shutdown the
+# writer flushes what it can within a timeout and reports anything left over.
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+from psycopg2.extras import Json, execute_values
+from samarth.data.db_connection import db
+from samarth.models.data_models import UserQuery
+
+INSERT_QUERIES = """
+    INSERT INTO user_queries
+    (question, answer, data_sources, sql_queries, confidence_score, user_id,
+     result_sources, stage_timings, cache_status, execution_time, request_id)
+    VALUES %s
+"""
+
+
+class QueryLogger:
+    """Background, batched writer for the user_queries history"""
+
+    def __init__(self, max_queue: Optional[int] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, shutdown_timeout: Optional[float] = None,
+                 enabled: Optional[bool] = None):
+        self.max_queue = max_queue or int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+        self.batch_size = batch_size or int(os.getenv("QUERY_LOG_BATCH_SIZE", "200"))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("QUERY_LOG_FLUSH_SECONDS", "1.0"))
+        self.shutdown_timeout = shutdown_timeout if shutdown_timeout is not None else float(os.getenv("QUERY_LOG_SHUTDOWN_SECONDS", "5"))
+        self.enabled = enabled if enabled is not None else os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+        self._queue: "asyncio.Queue[UserQuery]" = asyncio.Queue(maxsize=self.max_queue)
+        self._task: Optional["asyncio.Task"] = None
+        self._writing: Optional["asyncio.Future"] = None
+        # Entries the writer has taken off the queue but not yet handed to a write
+        self._held: List[UserQuery] = []
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def log(self, entry: UserQuery):
+        """Enqueue an entry without blocking; drops it if the queue is full or logging is disabled"""
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def start(self):
+        """Start the background writer on the running event loop"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer, flushing queued entries within the shutdown timeout"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        if self._writing is not None and not self._writing.done():
+            # A batch was being written when the writer was cancelled
+            await asyncio.wait({self._writing}, timeout=self.shutdown_timeout)
+        # Taken off the queue by the writer, which was cancelled while waiting for the batch to fill
+        held, self._held = self._held, []
+        await self._flush(held)
+        while not self._queue.empty() and time.monotonic() < deadline:
+            await self._flush(self._take_batch())
+        if not self._queue.empty():
+            print(f"Query logger: dropping {self._queue.qsize()} unwritten entries at shutdown")
+            self.dropped += self._queue.qsize()
+            self._take_batch(self._queue.qsize())
+
+    async def _run(self):
+        while True:
+            # Wait for the first entry, then give the batch a moment to fill
+            self._held = [await self._queue.get()]
+            await asyncio.sleep(self.flush_interval if self._queue.qsize() + 1 < self.batch_size else 0)
+            batch, self._held = self._held + self._take_batch(self.batch_size - 1), []
+            await self._flush(batch)
+
+    def _take_batch(self, size: Optional[int] = None) -> List[UserQuery]:
+        batch = []
+        while len(batch) < (size or self.batch_size) and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush(self, batch: List[UserQuery]):
+        if not batch:
+            return
+        self._writing = asyncio.ensure_future(asyncio.to_thread(self._write_batch, batch))
+        self._writing.add_done_callback(lambda future: self._record(future, len(batch)))
+        # Shielded so that a shutdown cancellation does not interrupt a write mid-batch
+        try:
+            await asyncio.shield(self._writing)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+
+    def _record(self, future: "asyncio.Future", count: int):
+        if future.cancelled() or future.exception() is not None:
+            self.failed += count
+            print(f"Query logger: failed to write {count} entries: {None if future.cancelled() else future.exception()}")
+        else:
+            self.written += count
+            self.batches += 1
+
+    @staticmethod
+    def _write_batch(batch: List[UserQuery]):
+        conn = db.get_connection()
+        if not conn:
+            raise ConnectionError("Database connection not available")
+        rows = [
+            (entry.question, entry.answer, entry.data_sources, entry.sql_queries, entry.confidence_score,
+             entry.user_id, entry.result_sources, Json(entry.stage_timings), entry.cache_status,
+             entry.execution_time, entry.request_id)
+            for entry in batch
+        ]
+        try:
+            with conn.cursor() as cursor:
+                execute_values(cursor, INSERT_QUERIES, rows, page_size=len(rows))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+# Global query logger instance
+query_logger = QueryLogger()
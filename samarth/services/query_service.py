@@ -1,106 +1,534 @@
 # Query Service for Project Samarth
+import asyncio
+import contextlib
+import os
 import time
-from typing import Dict, Any, List, Optional
-from samarth.services.llm_service import llm_service
-from samarth.data.data_access import AgriculturalDataAccess, WeatherDataAccess, ClimateChangeDataAccess
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator, Callable
+from samarth.services.llm_service import LLMService, create_llm_service
+from samarth.services.intent_matcher import intent_matcher
+from samarth.services.answer_renderer import answer_renderer
+from samarth.services.schema_catalog import schema_catalog
+from samarth.services.cache import TTLCache, SingleFlight, normalize_question
+from samarth.services.cache_backends import create_cache
+from samarth.services.llm_client import CircuitBreaker
+from samarth.services.query_logger import query_logger
+from samarth.services.result_store import result_store
+from samarth.utils.metrics import QUERIES_TOTAL, QUERY_SECONDS, STAGE_SECONDS
+from samarth.utils.tracing import tracer
+from samarth.utils.exceptions import LLMUnavailableException, DatabaseQueryException
+from samarth.data.data_access import AgriculturalDataAccess, WeatherDataAccess, ClimateChangeDataAccess, MetadataAccess
 from samarth.data.db_connection import db
 from samarth.models.data_models import UserQuery
 
+_DEFAULT = object()
+
+def _event(name: str, **data: Any) -> Dict[str, Any]:
+    """Build a pipeline event"""
+    return {"event": name, "data": data}
+
+@contextlib.contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    """Trace the block as a span and add its wall time to timings[stage] (seconds) and the stage histogram"""
+    start = time.perf_counter()
+    with tracer.span(stage):
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+
 class QueryService:
     """Main service for processing natural language queries"""
     
-    def __init__(self):
-        self.llm = llm_service
+    LLM_UNAVAILABLE_MESSAGE = "LLM service is not available. Please check your LLM_PROVIDER and API key configuration."
+    DATABASE_ERROR_MESSAGE = "Unable to execute queries due to database errors. Please try rephrasing your question."
+    LLM_DEGRADED_MESSAGE = ("The language model is temporarily unavailable. Template questions (for example "
+                            "production trends or top crops for a state and year) can still be answered.")
+    
+    def __init__(self, llm: Any = _DEFAULT):
+        # The configured LLM service unless one is given; None runs templates only
+        self.llm = create_llm_service() if llm is _DEFAULT else llm
+        self.intents = intent_matcher
+        self.renderer = answer_renderer
+        self.catalog = schema_catalog
+        self.logger = query_logger
+        # Results longer than a page are kept here and answers carry a handle to them
+        self.results = result_store
+        # Generated SQL per (dataset, normalized question), and rows per executed SQL.
+        # These and the answer cache are shared across workers when CACHE_BACKEND is set
+        self.sql_cache = create_cache("sql", maxsize=int(os.getenv("SQL_CACHE_SIZE", "2048")),
+                                      ttl=float(os.getenv("SQL_CACHE_TTL_SECONDS", "3600")))
+        self.result_cache = create_cache("result", maxsize=int(os.getenv("RESULT_CACHE_SIZE", "512")),
+                                         ttl=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300")))
+        # Completed answers per (normalized question, dataset versions); an ETL run
+        # bumps dataset_metadata.last_updated and so naturally invalidates them
+        self.answer_cache = create_cache("answer", maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+                                         ttl=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "600")))
+        self._dataset_versions = TTLCache(maxsize=1, ttl=float(os.getenv("DATASET_VERSION_TTL_SECONDS", "30")))
+        # Concurrent identical questions, and identical SQL, share one in-flight computation
+        self.query_flights = SingleFlight()
+        self.sql_flights = SingleFlight()
+        self.batch_max_questions = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+        self.batch_llm_concurrency = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+        # SQL the database rejects is sent back to the model with the error, within these bounds
+        self.sql_repair_attempts = int(os.getenv("SQL_REPAIR_ATTEMPTS", "2"))
+        self.sql_repair_budget = float(os.getenv("SQL_REPAIR_BUDGET_SECONDS", "15"))
+        self.repair_stats = {"attempts": 0, "repaired": 0, "failed": 0}
     
     async def process_query(self, question: str, user_id: Optional[str] = None) -> Dict[str, Any]:
-        """Process a natural language query through the full pipeline"""
+        """Process a natural language query through the full pipeline.
+        
+        Concurrent calls for the same question (and dataset versions) await a single
+        shared computation, and completed answers are served from the answer cache.
+        """
         start_time = time.time()
+        timings: Dict[str, float] = {}
+        with _timed(timings, "cache_lookup"):
+            key = await self.question_key(question)
+            cached = await self._cached_answer(key)
+        if cached is not None:
+            self._log(question, user_id, cached, "hit", timings, time.time() - start_time)
+            return dict(cached)
+        # The leader logs its own run; questions that join it are logged as coalesced
+        coalesced = key in self.query_flights
+        response = await self.query_flights.do(key, lambda: self._answer_once(key, question, user_id))
+        if coalesced:
+            self._log(question, user_id, response, "coalesced", timings, time.time() - start_time)
+        return dict(response)
+    
+    async def dataset_versions(self) -> Tuple[Tuple[str, str], ...]:
+        """The datasets' last ETL update times, re-read at most every DATASET_VERSION_TTL_SECONDS"""
+        versions = self._dataset_versions.get("versions")
+        if versions is None:
+            versions = await asyncio.to_thread(MetadataAccess.get_dataset_versions)
+            self._dataset_versions.set("versions", versions)
+        return tuple(sorted(versions.items()))
+    
+    async def question_key(self, question: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        """Cache and coalescing key: the normalized question plus the current dataset versions"""
+        return normalize_question(question), await self.dataset_versions()
+    
+    async def _cached_answer(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """The cached answer for key, unless the stored result it pages through has expired"""
+        cached = await self.answer_cache.aget(key)
+        if cached is None:
+            return None
+        result = (cached.get("visualization_data") or {}).get("result") or {}
+        return cached if self.results.has(result.get("handle")) else None
+    
+    async def _answer_once(self, key: Tuple, question: str, user_id: Optional[str] = None,
+                           llm_limiter: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+        """Run the pipeline to completion, cache the answer if it succeeded and log it"""
+        response: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        async for event in self._run_pipeline(question, stream_answer=False, llm_limiter=llm_limiter,
+                                              timings=timings):
+            if event["event"] == "done":
+                response = event["data"]
+                if event.get("cacheable"):
+                    await self.answer_cache.aset(key, response)
+        self._log(question, user_id, response, "miss", timings, response.get("execution_time"))
+        return response
+    
+    async def is_cheap(self, question: str) -> bool:
+        """Whether the question can be answered without an LLM call: a cached answer or a template"""
+        key = await self.question_key(question)
+        if key in self.answer_cache:
+            return True
+        return self.intents is not None and self.intents.match(question, record=False) is not None
+    
+    async def prefill(self, question: str) -> bool:
+        """Answer a question into the answer cache without logging it (startup warm-up).
+
+        Returns True if a new answer was cached.
+        """
+        key = await self.question_key(question)
+        # Another worker may have cached it already; a shared hit is copied locally
+        if await self._cached_answer(key) is not None:
+            return False
+        async for event in self._run_pipeline(question, stream_answer=False):
+            if event["event"] == "done" and event.get("cacheable"):
+                await self.answer_cache.aset(key, event["data"])
+                return True
+        return False
+    
+    async def stream_query(self, question: str, user_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Process a query, yielding each pipeline stage as an event as soon as it completes.
         
-        # Check if LLM service is available
-        if self.llm is None:
-            return {
-                "answer": "LLM service is not available. Please check your GEMINI_API_KEY configuration.",
-                "data_sources": [],
-                "sql_queries": [],
-                "visualization_data": {},
-                "confidence_score": 0.0,
-                "execution_time": time.time() - start_time
-            }
+        Events, in order: datasets, sql, results (rows and chart data), answer_chunk
+        (repeated while the answer streams) and done.
+        """
+        timings: Dict[str, float] = {}
+        async for event in self._run_pipeline(question, stream_answer=True, timings=timings):
+            if event["event"] == "done":
+                self._log(question, user_id, event["data"], "stream", timings, event["data"].get("execution_time"))
+            yield event
+    
+    async def process_batch(self, questions: List[str], user_id: Optional[str] = None,
+                            concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Answer many questions, yielding one result per input question as each completes.
+        
+        Duplicate questions (after normalization) are computed once. Questions run
+        concurrently, but at most `concurrency` LLM calls (no more than
+        BATCH_LLM_CONCURRENCY) are in flight at a time, and the SQL and result caches
+        are shared by every question in the batch.
+        """
+        if len(questions) > self.batch_max_questions:
+            raise ValueError(f"Batch contains {len(questions)} questions; the limit is {self.batch_max_questions}")
+        
+        positions: Dict[str, List[int]] = {}
+        for index, question in enumerate(questions):
+            positions.setdefault(normalize_question(question), []).append(index)
+        
+        llm_limiter = asyncio.Semaphore(max(1, min(concurrency or self.batch_llm_concurrency,
+                                                   self.batch_llm_concurrency)))
         
+        async def answer(key: str) -> Tuple[str, Dict[str, Any]]:
+            start_time = time.time()
+            timings: Dict[str, float] = {}
+            question = questions[positions[key][0]]
+            with _timed(timings, "cache_lookup"):
+                flight_key = await self.question_key(question)
+                response = await self._cached_answer(flight_key)
+            if response is not None:
+                self._log(question, user_id, response, "hit", timings, time.time() - start_time)
+            else:
+                coalesced = flight_key in self.query_flights
+                response = await self.query_flights.do(
+                    flight_key, lambda: self._answer_once(flight_key, question, user_id, llm_limiter)
+                )
+                if coalesced:
+                    self._log(question, user_id, response, "coalesced", timings, time.time() - start_time)
+            return key, response
+        
+        tasks = [asyncio.create_task(answer(key)) for key in positions]
         try:
-            # Step 1: Identify relevant datasets
-            datasets = self.llm.identify_relevant_datasets(question)
-            print(f"Identified datasets: {datasets}")
-            
-            # Step 2: Generate SQL queries
-            sql_queries = []
-            for dataset in datasets:
-                sql_query = self.llm.generate_sql_query(question, [dataset])
-                sql_queries.append(sql_query)
-                print(f"Generated SQL query for {dataset}: {sql_query}")
-            
-            # Step 3: Execute queries
-            query_results = []
-            successful_queries = []
-            failed_queries = []
-            
-            for i, sql_query in enumerate(sql_queries):
+            for finished in asyncio.as_completed(tasks):
+                key, response = await finished
+                for index in positions[key]:
+                    yield {"index": index, "question": questions[index], **response}
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _run_pipeline(self, question: str, stream_answer: bool,
+                            llm_limiter: Optional[asyncio.Semaphore] = None,
+                            timings: Optional[Dict[str, float]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Run the query pipeline as a sequence of events; blocking calls run in worker threads.
+        
+        Seconds spent in each stage are added to `timings` when it is given, and the
+        done event carries the breakdown as stage_timings.
+        """
+        timings = {} if timings is None else timings
+        async for event in self._pipeline_events(question, stream_answer, llm_limiter, timings):
+            if event["event"] == "done":
+                event["data"]["stage_timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+            yield event
+    
+    async def _pipeline_events(self, question: str, stream_answer: bool,
+                               llm_limiter: Optional[asyncio.Semaphore],
+                               timings: Dict[str, float]) -> AsyncIterator[Dict[str, Any]]:
+        start_time = time.time()
+        
+        try:
+            # Fast path: template questions map straight to parameterized SQL
+            intent_match = None
+            if self.intents:
+                with _timed(timings, "intent_match"):
+                    await self._refresh_catalog()
+                    intent_match = self.intents.match(question)
+            if intent_match:
+                tracer.annotate(intent=intent_match.intent)
+                datasets = [intent_match.dataset]
+                yield _event("datasets", data_sources=datasets)
+                sql_queries = [intent_match.display_sql]
+                yield _event("sql", sql_queries=sql_queries)
                 try:
-                    # Skip empty or invalid queries
-                    if not sql_query or sql_query.strip() == "" or "LLM query generation failed" in sql_query:
-                        failed_queries.append({"query": sql_query, "error": "Invalid or empty query"})
-                        continue
-                        
-                    results = db.execute_query(sql_query)
-                    query_results.extend(results)
-                    successful_queries.append(sql_query)
-                    print(f"Executed query {i+1}: {len(results)} results")
-                except Exception as e:
-                    print(f"Error executing query {i+1}: {e}")
-                    failed_queries.append({"query": sql_query, "error": str(e)})
+                    with _timed(timings, "sql_execution"):
+                        query_results = await self._cached_query(intent_match.display_sql, intent_match.execute)
+                except DatabaseQueryException:
+                    # The db.query span records the error
+                    yield self._done_event(self.DATABASE_ERROR_MESSAGE, datasets, sql_queries, {}, 0.2, start_time)
+                    return
+                failed_queries = []
+                result_sources = datasets if query_results else []
+            else:
+                # Check if LLM service is available
+                if self.llm is None:
+                    yield self._done_event(self.LLM_UNAVAILABLE_MESSAGE, [], [], {}, 0.0, start_time)
+                    return
+                
+                # Fail fast while the provider's circuit breaker is open
+                client = getattr(self.llm, "client", None)
+                if client is not None and client.breaker.state == CircuitBreaker.OPEN:
+                    yield self._done_event(self.LLM_DEGRADED_MESSAGE, [], [], {}, 0.0, start_time)
+                    return
+                
+                # Step 1: Identify relevant datasets
+                with _timed(timings, "dataset_routing"):
+                    datasets = self.llm.identify_relevant_datasets(question)
+                    tracer.annotate(datasets=datasets)
+                yield _event("datasets", data_sources=datasets)
+                
+                # Step 2: Generate SQL queries
+                generated_queries = []
+                with _timed(timings, "sql_generation"):
+                    # Prompts describe the schema catalog's snapshot, refreshed here off the event loop
+                    await self._refresh_catalog()
+                    for dataset in datasets:
+                        sql_query = await self._generate_sql(question, dataset, llm_limiter)
+                        generated_queries.append(sql_query)
+                yield _event("sql", sql_queries=generated_queries)
+                
+                # Step 3: Execute queries, repairing SQL that the database rejects
+                with _timed(timings, "sql_execution"):
+                    query_results, sql_queries, failed_queries, result_sources = await self._execute_queries(
+                        question, datasets, generated_queries, llm_limiter
+                    )
+                if any(sql_query not in generated_queries for sql_query in sql_queries):
+                    yield _event("sql", sql_queries=sql_queries)
+                
+                # If all queries failed, return an appropriate message
+                if not sql_queries and failed_queries:
+                    yield self._done_event(self.DATABASE_ERROR_MESSAGE, datasets, generated_queries, {}, 0.2, start_time)
+                    return
             
-            # If all queries failed, return an appropriate message
-            if not successful_queries and failed_queries:
-                return {
-                    "answer": "Unable to execute queries due to database errors. Please try rephrasing your question.",
-                    "data_sources": datasets,
-                    "sql_queries": sql_queries,
-                    "visualization_data": {},
-                    "confidence_score": 0.2,
-                    "execution_time": time.time() - start_time
-                }
+            # Step 4: Generate visualization data (simplified)
+            with _timed(timings, "visualization"):
+                visualization_data = self._generate_visualization_data(query_results)
+                # Beyond the first page, rows are served by handle from the result store
+                if len(query_results) > self.results.page_size:
+                    visualization_data = await asyncio.to_thread(self.results.offload, visualization_data)
+            yield _event("results", row_count=len(query_results), visualization_data=visualization_data)
             
-            # Step 4: Synthesize answer
-            answer = self.llm.synthesize_answer(question, query_results, datasets, successful_queries)
+            # Step 5: Synthesize answer (templated when the result shape allows it)
+            answer_parts = []
+            # When streaming this includes the time the client takes to consume the chunks
+            with _timed(timings, "synthesis"):
+                async for chunk in self._answer_chunks(question, query_results, datasets, sql_queries,
+                                                       stream_answer, llm_limiter):
+                    answer_parts.append(chunk)
+                    if stream_answer:
+                        yield _event("answer_chunk", text=chunk)
             
-            # Step 5: Calculate confidence score
-            confidence_score = self.llm.calculate_confidence_score(query_results)
+            # Step 6: Calculate confidence score and execution time
+            confidence_score = LLMService.calculate_confidence_score(query_results)
+            yield self._done_event(
+                "".join(answer_parts).strip(), datasets, sql_queries,
+                # Streaming clients already received the rows with the results event
+                None if stream_answer else visualization_data,
+                # Answers built from partially failed queries are not cached
+                confidence_score, start_time, cacheable=not failed_queries, result_sources=result_sources
+            )
             
-            # Step 6: Generate visualization data (simplified)
-            visualization_data = self._generate_visualization_data(query_results)
-            
-            # Step 7: Calculate execution time
-            execution_time = time.time() - start_time
+        except Exception as e:
+            tracer.annotate(error=f"{type(e).__name__}: {e}"[:200])
+            print(f"Error processing query: {e}")
+            yield self._done_event(f"An error occurred while processing your query: {str(e)}",
+                                   [], [], {}, 0.0, start_time)
+    
+    async def _execute_queries(self, question: str, datasets: List[str], sql_queries: List[str],
+                               llm_limiter: Optional[asyncio.Semaphore] = None
+                               ) -> Tuple[List[Dict[str, Any]], List[str], List[Dict[str, str]], List[str]]:
+        """Execute generated queries, returning (rows, successful queries, failed queries,
+        datasets that returned rows)"""
+        query_results = []
+        successful_queries = []
+        failed_queries = []
+        result_sources = []
+        
+        for i, (dataset, sql_query) in enumerate(zip(datasets, sql_queries)):
+            try:
+                # Skip empty or invalid queries
+                if not sql_query or sql_query.strip() == "" or "LLM query generation failed" in sql_query:
+                    failed_queries.append({"query": sql_query, "error": "Invalid or empty query"})
+                    continue
+                
+                try:
+                    results = await self._cached_query(
+                        sql_query, lambda query=sql_query: db.execute_query(query, raise_on_error=True)
+                    )
+                    # Only SQL that ran is reused; a broken generation is not served again for the TTL
+                    await self.sql_cache.aset((dataset, normalize_question(question)), sql_query)
+                except DatabaseQueryException as e:
+                    repaired = await self._repair_query(question, dataset, e, llm_limiter)
+                    if repaired is None:
+                        failed_queries.append({"query": sql_query, "error": e.error})
+                        continue
+                    sql_query, results = repaired
+                
+                query_results.extend(results)
+                successful_queries.append(sql_query)
+                if results:
+                    result_sources.append(dataset)
+            except Exception as e:
+                print(f"Error executing query {i+1}: {e}")
+                failed_queries.append({"query": sql_query, "error": str(e)})
+        
+        return query_results, successful_queries, failed_queries, result_sources
+    
+    async def _repair_query(self, question: str, dataset: str, error: DatabaseQueryException,
+                            llm_limiter: Optional[asyncio.Semaphore] = None
+                            ) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """Ask the model to fix SQL the database rejected; returns (sql, rows) or None.
+        
+        Connection failures are not repairable. Attempts are bounded by
+        sql_repair_attempts and the sql_repair_budget time budget.
+        """
+        if not error.repairable or self.llm is None or self.sql_repair_attempts <= 0:
+            return None
+        
+        deadline = time.monotonic() + self.sql_repair_budget
+        for attempt in range(1, self.sql_repair_attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.repair_stats["attempts"] += 1
+            try:
+                async with llm_limiter or contextlib.nullcontext():
+                    sql_query = await asyncio.wait_for(
+                        self.llm.arepair_sql_query(question, [dataset], error.sql, error.error), remaining
+                    )
+            except (LLMUnavailableException, asyncio.TimeoutError) as e:
+                tracer.annotate(repair_stopped=str(e) or "time budget exhausted")
+                break
+            if not sql_query or "LLM query generation failed" in sql_query or sql_query == error.sql:
+                break
             
-            return {
-                "answer": answer,
-                "data_sources": datasets,
-                "sql_queries": successful_queries,
-                "visualization_data": visualization_data,
-                "confidence_score": confidence_score,
-                "execution_time": execution_time
-            }
+            try:
+                results = await self._cached_query(
+                    sql_query, lambda query=sql_query: db.execute_query(query, raise_on_error=True)
+                )
+            except DatabaseQueryException as e:
+                error = e
+                if not e.repairable:
+                    break
+                continue
             
+            tracer.annotate(repair_attempts=attempt)
+            # Later askings of the question go straight to the working SQL
+            await self.sql_cache.aset((dataset, normalize_question(question)), sql_query)
+            self.repair_stats["repaired"] += 1
+            return sql_query, results
+        
+        self.repair_stats["failed"] += 1
+        return None
+    
+    async def _generate_sql(self, question: str, dataset: str,
+                            llm_limiter: Optional[asyncio.Semaphore] = None) -> str:
+        """Generate SQL for one dataset, reusing earlier SQL that ran for the same question"""
+        cache_key = (dataset, normalize_question(question))
+        sql_query = await self.sql_cache.aget(cache_key)
+        if sql_query is not None:
+            return sql_query
+        
+        try:
+            async with llm_limiter or contextlib.nullcontext():
+                sql_query = await self.llm.agenerate_sql_query(question, [dataset])
+        except LLMUnavailableException:
+            # The llm.sql_generation span records the error
+            return LLMService.SQL_GENERATION_FAILED
+        # Cached by _execute_queries once the database has accepted it
+        return sql_query
+    
+    async def _refresh_catalog(self):
+        """Load or refresh the schema catalog, which also updates the intent vocabularies"""
+        if self.catalog is None or self.catalog.is_fresh():
+            return
+        try:
+            await asyncio.to_thread(self.catalog.get)
         except Exception as e:
-            print(f"Error processing query: {e}")
-            return {
-                "answer": f"An error occurred while processing your query: {str(e)}",
-                "data_sources": [],
-                "sql_queries": [],
-                "visualization_data": {},
-                "confidence_score": 0.0,
-                "execution_time": time.time() - start_time
-            }
+            print(f"Schema catalog refresh failed: {e}")
+    
+    async def _cached_query(self, sql_query: str, execute: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Run a query in a worker thread, serving repeated SQL from the result cache and
+        coalescing concurrent executions of the same SQL"""
+        # Versioned like the answer cache, so an ETL run is never answered with the rows it replaced
+        key = (sql_query, await self.dataset_versions())
+        results = await self.result_cache.aget(key)
+        if results is None:
+            results = await self.sql_flights.do(key, lambda: self._execute_and_cache(key, execute))
+        return results
+    
+    async def _execute_and_cache(self, key: Tuple, execute: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Database errors raise, so an empty result really means no matching rows
+        results = await asyncio.to_thread(execute)
+        await self.result_cache.aset(key, results)
+        return results
+    
+    async def _answer_chunks(self, question: str, query_results: List[Dict[str, Any]], datasets: List[str],
+                             sql_queries: List[str], stream_answer: bool,
+                             llm_limiter: Optional[asyncio.Semaphore] = None) -> AsyncIterator[str]:
+        """Yield the answer text: one chunk for templated answers, token chunks when streaming from the LLM"""
+        answer = self.renderer.render(question, query_results) if self.renderer else None
+        if answer is not None:
+            tracer.annotate(answer_source="template")
+            yield answer
+        elif self.llm is None:
+            yield self.LLM_UNAVAILABLE_MESSAGE
+        elif stream_answer:
+            streamed = False
+            try:
+                async for chunk in self.llm.astream_answer(question, query_results, datasets, sql_queries):
+                    streamed = True
+                    yield chunk
+            except LLMUnavailableException:
+                tracer.annotate(answer_source="truncated" if streamed else "fallback")
+                if streamed:
+                    yield "\n\n(The answer was cut short because the language model stopped responding.)"
+                else:
+                    yield self.renderer.fallback(query_results)
+        else:
+            try:
+                async with llm_limiter or contextlib.nullcontext():
+                    answer = await self.llm.asynthesize_answer(question, query_results, datasets, sql_queries)
+            except LLMUnavailableException:
+                tracer.annotate(answer_source="fallback")
+                answer = self.renderer.fallback(query_results)
+            yield answer
+    
+    def _log(self, question: str, user_id: Optional[str], response: Dict[str, Any], cache_status: str,
+             timings: Dict[str, float], execution_time: Optional[float]):
+        """Count an answered question and queue it for the background history writer"""
+        QUERIES_TOTAL.inc(cache_status=cache_status)
+        tracer.annotate(cache_status=cache_status)
+        if execution_time is not None:
+            QUERY_SECONDS.observe(execution_time, cache_status=cache_status)
+        if self.logger is None or not response:
+            return
+        self.logger.log(UserQuery(
+            question=question,
+            answer=response.get("answer", ""),
+            data_sources=response.get("data_sources", []),
+            sql_queries=response.get("sql_queries", []),
+            confidence_score=response.get("confidence_score", 0.0),
+            user_id=user_id,
+            result_sources=response.get("result_sources", []),
+            stage_timings={stage: round(seconds, 6) for stage, seconds in timings.items()},
+            cache_status=cache_status,
+            execution_time=execution_time,
+            request_id=tracer.current_trace_id()
+        ))
+    
+    def _done_event(self, answer: str, datasets: List[str], sql_queries: List[str],
+                    visualization_data: Optional[Dict[str, Any]], confidence_score: float,
+                    start_time: float, cacheable: bool = False,
+                    result_sources: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Build the final event, which carries the complete (non-streamed) response fields"""
+        data = {
+            "answer": answer,
+            "data_sources": datasets,
+            "sql_queries": sql_queries,
+            "visualization_data": visualization_data,
+            "confidence_score": confidence_score,
+            "execution_time": time.time() - start_time,
+            # Datasets whose queries returned rows; the label for the dataset classifier
+            "result_sources": result_sources or []
+        }
+        if visualization_data is None:
+            del data["visualization_data"]
+        return {"event": "done", "data": data, "cacheable": cacheable}
     
     def _generate_visualization_data(self, query_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Generate simple visualization data from query results"""
@@ -130,5 +558,24 @@ class QueryService:
             "data": query_results
         }
 
-# Global query service instance
-query_service = QueryService()
\ No newline at end of file
+    async def drain(self, timeout: float) -> int:
+        """Wait for in-flight pipeline runs and SQL executions (and so their LLM calls) to finish.
+
+        Used at shutdown: coalesced runs outlive the request that started them.
+        Returns how many were still running when the timeout expired.
+        """
+        deadline = time.monotonic() + timeout
+        pending = await self.query_flights.drain(timeout)
+        pending += await self.sql_flights.drain(max(0.0, deadline - time.monotonic()))
+        if pending:
+            print(f"Shutdown: {pending} pipeline runs still in flight after {timeout}s")
+        return pending
+
+    def cache_lookups(self) -> Dict[Tuple[str, str], int]:
+        """Hit and miss counts per cache, for the metrics endpoint"""
+        caches = {"answer": self.answer_cache, "sql": self.sql_cache, "result": self.result_cache}
+        lookups = {}
+        for name, cache in caches.items():
+            lookups[(name, "hit")] = cache.hits
+            lookups[(name, "miss")] = cache.misses
+        return lookups
@@ -0,0 +1,260 @@
+# Result Store for Project Samarth
+#
+# Large query results are not inlined in answers. When a result has more than
+# RESULT_PAGE_SIZE rows the pipeline keeps it here under a random handle for
+# RESULT_STORE_TTL_SECONDS, and the answer carries only the first page plus
+# the handle. /api/v1/query/results/{handle} serves further pages and
+# /api/v1/query/results/{handle}/download the whole result as CSV or NDJSON.
+#
+# Results of up to RESULT_STORE_MEMORY_ROWS rows stay in memory. Larger ones
+# are spilled to RESULT_STORE_DIR as NDJSON, one array of values per row,
+# with an index of line offsets so a page is read with a single seek. A
+# spilled result is described by a JSON sidecar, so every worker on the host
+# can serve it; with several workers, RESULT_STORE_MEMORY_ROWS=0 spills every
+# result so any worker can page through any handle.
+import csv
+import io
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+from samarth.utils.responses import dumps
+
+# Handles name files, so only accept what secrets.token_urlsafe produces
+_VALID_HANDLE = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+class ResultStore:
+    """Query results kept for paging and download, in memory or spilled to local files"""
+
+    # Rows between indexed line offsets in a spilled file
+    INDEX_STRIDE = 1000
+
+    def __init__(self, ttl: Optional[float] = None, page_size: Optional[int] = None,
+                 memory_rows: Optional[int] = None, directory: Optional[str] = None,
+                 max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESULT_STORE_TTL_SECONDS", "1800"))
+        self.page_size = page_size or int(os.getenv("RESULT_PAGE_SIZE", "500"))
+        self.max_page_size = max(self.page_size, int(os.getenv("RESULT_PAGE_MAX", "5000")))
+        self.memory_rows = memory_rows if memory_rows is not None else int(os.getenv("RESULT_STORE_MEMORY_ROWS", "10000"))
+        self.directory = (directory or os.getenv("RESULT_STORE_DIR")
+                          or os.path.join(tempfile.gettempdir(), "samarth-results"))
+        self.max_entries = max_entries or int(os.getenv("RESULT_STORE_MAX_ENTRIES", "128"))
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._swept_at = 0.0
+        self.stats_counters = {"stored": 0, "spilled": 0, "pages": 0, "downloads": 0, "expired": 0, "evicted": 0}
+
+    def offload(self, visualization_data: Dict[str, Any]) -> Dict[str, Any]:
+        """visualization_data with only its first page of rows and a handle to the rest.
+
+        Results that fit in one page are returned unchanged. Blocking when the
+        result is spilled, so call it from a worker thread.
+        """
+        rows = visualization_data.get("data") or []
+        if len(rows) <= self.page_size:
+            return visualization_data
+        return {**visualization_data, "data": rows[:self.page_size], "result": self.put(rows)}
+
+    def put(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Store rows and return their descriptor: handle, row_count, columns, page_size and expires_at"""
+        self.purge()
+        handle = secrets.token_urlsafe(24)
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        entry: Dict[str, Any] = {"columns": columns, "row_count": len(rows), "expires_at": time.time() + self.ttl}
+        if len(rows) > self.memory_rows:
+            entry.update(self._spill(handle, rows, entry))
+            self.stats_counters["spilled"] += 1
+        else:
+            entry["rows"] = rows
+        with self._lock:
+            self._entries[handle] = entry
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+        for old_handle, old_entry in evicted:
+            self._remove_files(old_handle, old_entry)
+            self.stats_counters["evicted"] += 1
+        self.stats_counters["stored"] += 1
+        return {"handle": handle, "row_count": len(rows), "columns": columns, "page_size": self.page_size,
+                "expires_at": round(entry["expires_at"], 3)}
+
+    def _path(self, handle: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{handle}.{suffix}")
+
+    def _spill(self, handle: str, rows: List[Dict[str, Any]], entry: Dict[str, Any]) -> Dict[str, Any]:
+        os.makedirs(self.directory, exist_ok=True)
+        columns = entry["columns"]
+        offsets = []
+        with open(self._path(handle, "ndjson"), "wb") as spilled:
+            for index, row in enumerate(rows):
+                if index % self.INDEX_STRIDE == 0:
+                    offsets.append(spilled.tell())
+                spilled.write(dumps([row.get(column) for column in columns]) + b"\n")
+        location = {"path": self._path(handle, "ndjson"), "offsets": offsets}
+        # The sidecar appears last, so other workers never see a half-written result
+        sidecar = self._path(handle, "json")
+        with open(sidecar + ".tmp", "w", encoding="utf-8") as meta:
+            json.dump({**entry, **location}, meta)
+        os.replace(sidecar + ".tmp", sidecar)
+        return location
+
+    def _lookup(self, handle: str) -> Optional[Dict[str, Any]]:
+        """The live entry for handle, including results spilled by other workers"""
+        if not _VALID_HANDLE.match(handle or ""):
+            return None
+        with self._lock:
+            entry = self._entries.get(handle)
+        if entry is None:
+            try:
+                with open(self._path(handle, "json"), encoding="utf-8") as meta:
+                    entry = json.load(meta)
+            except (OSError, ValueError):
+                return None
+        if entry["expires_at"] < time.time():
+            return None
+        return entry
+
+    def has(self, handle: Optional[str]) -> bool:
+        """Whether a handle is still served; None (a result that was never stored) always is"""
+        return handle is None or self._lookup(handle) is not None
+
+    def page(self, handle: str, offset: int = 0, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Rows offset to offset + limit of a stored result, or None if the handle is unknown or expired"""
+        entry = self._lookup(handle)
+        if entry is None:
+            return None
+        offset = max(0, offset)
+        limit = max(1, min(limit or self.page_size, self.max_page_size))
+        if "rows" in entry:
+            rows = entry["rows"][offset:offset + limit]
+        else:
+            try:
+                rows = self._read(entry, offset, limit)
+            except OSError:
+                # Expired and removed since the lookup
+                return None
+        self.stats_counters["pages"] += 1
+        end = offset + len(rows)
+        return {
+            "handle": handle,
+            "columns": entry["columns"],
+            "row_count": entry["row_count"],
+            "offset": offset,
+            "limit": limit,
+            "next_offset": end if end < entry["row_count"] else None,
+            "data": rows,
+        }
+
+    def _read(self, entry: Dict[str, Any], offset: int, limit: int) -> List[Dict[str, Any]]:
+        if offset >= entry["row_count"]:
+            return []
+        block = offset // self.INDEX_STRIDE
+        skip = offset - block * self.INDEX_STRIDE
+        rows = []
+        with open(entry["path"], "rb") as spilled:
+            spilled.seek(entry["offsets"][block])
+            for index, line in enumerate(spilled):
+                if index < skip:
+                    continue
+                rows.append(dict(zip(entry["columns"], json.loads(line))))
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def export(self, handle: str, file_format: str = "csv") -> Optional[Iterator[bytes]]:
+        """The whole result as chunks of CSV or NDJSON, or None if the handle is unknown or expired"""
+        entry = self._lookup(handle)
+        if entry is None:
+            return None
+        self.stats_counters["downloads"] += 1
+        return self._export_chunks(entry, file_format)
+
+    def _export_chunks(self, entry: Dict[str, Any], file_format: str, batch: int = 1000) -> Iterator[bytes]:
+        columns = entry["columns"]
+        if "rows" in entry:
+            values = ([row.get(column) for column in columns] for row in entry["rows"])
+        else:
+            values = self._spilled_values(entry["path"])
+        if file_format == "ndjson":
+            for row in values:
+                yield dumps(dict(zip(columns, row))) + b"\n"
+            return
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for index, row in enumerate(values, 1):
+            writer.writerow(row)
+            if index % batch == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def _spilled_values(path: str) -> Iterator[List[Any]]:
+        with open(path, "rb") as spilled:
+            for line in spilled:
+                yield json.loads(line)
+
+    def purge(self):
+        """Drop expired results, and at most once a minute any expired files left in the directory"""
+        now = time.time()
+        with self._lock:
+            expired = [(handle, entry) for handle, entry in self._entries.items() if entry["expires_at"] < now]
+            for handle, _ in expired:
+                del self._entries[handle]
+        for handle, entry in expired:
+            self._remove_files(handle, entry)
+        self.stats_counters["expired"] += len(expired)
+        if now - self._swept_at > 60 and os.path.isdir(self.directory):
+            self._swept_at = now
+            # Results spilled by workers that exited before their results expired
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                handle = name[:-len(".json")]
+                try:
+                    with open(self._path(handle, "json"), encoding="utf-8") as meta:
+                        if json.load(meta)["expires_at"] >= now:
+                            continue
+                except (OSError, ValueError, KeyError):
+                    pass
+                self._remove_files(handle, {"path": self._path(handle, "ndjson")})
+
+    def _remove_files(self, handle: str, entry: Dict[str, Any]):
+        if "path" not in entry:
+            return
+        for path in (self._path(handle, "json"), entry["path"]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        """Remove this worker's spilled results"""
+        with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+        for handle, entry in entries:
+            self._remove_files(handle, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            **self.stats_counters,
+            "entries": len(entries),
+            "in_memory_rows": sum(entry["row_count"] for entry in entries if "rows" in entry),
+            "spilled_entries": sum(1 for entry in entries if "path" in entry),
+        }
+
+# Global result store instance
+result_store = ResultStore()
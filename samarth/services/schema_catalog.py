@@ -0,0 +1,203 @@
+# Schema Catalog for Project Samarth
+#
+# Introspects the warehouse once (columns from information_schema, row counts,
+# value ranges and distinct categories) and keeps the result in memory. The
+# snapshot is rebuilt when dataset_metadata changes, either through
+# invalidate() from the ETL pipeline in this process or through a periodic
+# version check for updates made elsewhere. get() may query the database, so
+# async callers run it in a worker thread; render_prompt_context() only reads
+# the snapshot already loaded. It renders the table context for SQL generation
+# prompts and feeds the intent matcher's entity vocabularies.
+# With a shared cache backend, workers reuse each other's snapshots.
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from samarth.data.data_access import MetadataAccess
+from samarth.data.db_connection import db
+from samarth.services.cache_backends import SharedCache, shared_backend
+from samarth.services.intent_matcher import intent_matcher, INDIAN_STATES, COMMON_CROPS
+
+# What each table holds; the columns themselves come from the live schema
+TABLE_DESCRIPTIONS = {
+    "agricultural_production": "Agricultural production statistics by state, district, crop, season and year.",
+    "weather_data": "Daily weather by state and district: rainfall, temperature, humidity and wind speed.",
+    "climate_change_data": "Monthly climate normals by weather station: mean maximum/minimum temperature and rainfall.",
+}
+
+# Used when the warehouse cannot be introspected
+FALLBACK_COLUMNS = {
+    "agricultural_production": ["state", "district", "crop", "year", "season", "area", "production", "yield_per_hectare"],
+    "weather_data": ["state", "district", "date", "rainfall", "temperature_max", "temperature_min", "humidity", "wind_speed"],
+    "climate_change_data": ["Station_Name", "Month", "Period", "No_of_Years", "Mean_Temperature_in_degree_C___Maximum",
+                            "Mean_Temperature__in_degree_C___Minimum", "Mean_Rainfall_in_mm"],
+}
+
+# Columns summarized by their distinct values and by their range
+CATEGORY_COLUMNS = ("state", "crop", "season", "station_name", "month", "period")
+RANGE_COLUMNS = ("year", "date")
+HIDDEN_COLUMNS = ("id", "created_at")
+
+COLUMNS_QUERY = """
+    SELECT table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = ANY(%s)
+    ORDER BY table_name, ordinal_position
+"""
+
+
+def quote_column(column: str) -> str:
+    """Quote identifiers that PostgreSQL would otherwise fold to lower case"""
+    return f'"{column}"' if column != column.lower() else column
+
+
+class SchemaCatalog:
+    """In-memory snapshot of the warehouse schema and summary statistics"""
+
+    def __init__(self, tables: Optional[List[str]] = None, check_interval: Optional[float] = None,
+                 max_prompt_values: Optional[int] = None):
+        self.tables = list(tables or TABLE_DESCRIPTIONS)
+        self.check_interval = check_interval if check_interval is not None else float(os.getenv("SCHEMA_CATALOG_CHECK_SECONDS", "60"))
+        self.max_prompt_values = max_prompt_values or int(os.getenv("SCHEMA_CATALOG_PROMPT_VALUES", "15"))
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Dict[str, Any]]] = None
+        self._versions: Optional[Dict[str, str]] = None
+        self._checked_at = 0.0
+        self._contexts: Dict[Tuple[str, ...], str] = {}
+        self.refreshes = 0
+        # Snapshots keyed by dataset versions, shared so that only one worker introspects
+        self.shared = SharedCache("schema", shared_backend, maxsize=4,
+                                  ttl=float(os.getenv("SCHEMA_CATALOG_SHARED_TTL_SECONDS", "3600"))) if shared_backend else None
+
+    def is_fresh(self) -> bool:
+        """True when the snapshot can be used without touching the database"""
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval
+
+    def invalidate(self):
+        """Force a rebuild on next use (called after ETL metadata updates)"""
+        with self._lock:
+            self._snapshot = None
+            self._contexts = {}
+
+    def get(self) -> Dict[str, Dict[str, Any]]:
+        """Return the snapshot, rebuilding it if it is missing or dataset versions changed"""
+        if self.is_fresh():
+            return self._snapshot
+        with self._lock:
+            if self.is_fresh():
+                return self._snapshot
+            versions = MetadataAccess.get_dataset_versions()
+            if self._snapshot is None or versions != self._versions:
+                self._snapshot = self._load(versions)
+                self._versions = versions
+                self._contexts = {}
+                self.refreshes += 1
+                self._update_vocabulary(self._snapshot)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def _load(self, versions: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """Snapshot for these dataset versions, from the shared cache when another worker built it"""
+        key = tuple(sorted(versions.items()))
+        if self.shared is not None:
+            snapshot = self.shared.get(key)
+            if snapshot is not None:
+                return snapshot
+        snapshot = self._introspect()
+        # Fallback snapshots (database unreachable) stay local
+        if self.shared is not None and any(info["row_count"] is not None for info in snapshot.values()):
+            self.shared.set(key, snapshot)
+        return snapshot
+
+    def _introspect(self) -> Dict[str, Dict[str, Any]]:
+        snapshot: Dict[str, Dict[str, Any]] = {
+            table: {"columns": [], "row_count": None, "ranges": {}, "categories": {}} for table in self.tables
+        }
+        for row in db.execute_query(COLUMNS_QUERY, (self.tables,)):
+            if row["column_name"] not in HIDDEN_COLUMNS:
+                snapshot[row["table_name"]]["columns"].append((row["column_name"], row["data_type"]))
+
+        for table, info in snapshot.items():
+            if not info["columns"]:
+                # Table missing or database unreachable: describe it from the static schema
+                info["columns"] = [(column, None) for column in FALLBACK_COLUMNS.get(table, [])]
+                continue
+            count = db.execute_query(f"SELECT COUNT(*) AS row_count FROM {table}")
+            info["row_count"] = count[0]["row_count"] if count else None
+            for column, _ in info["columns"]:
+                name = column.lower()
+                quoted = quote_column(column)
+                if name in RANGE_COLUMNS:
+                    bounds = db.execute_query(f"SELECT MIN({quoted}) AS low, MAX({quoted}) AS high FROM {table}")
+                    if bounds and bounds[0]["low"] is not None:
+                        info["ranges"][column] = (bounds[0]["low"], bounds[0]["high"])
+                elif name in CATEGORY_COLUMNS:
+                    values = db.execute_query(
+                        f"SELECT DISTINCT {quoted} AS value FROM {table} WHERE {quoted} IS NOT NULL ORDER BY 1"
+                    )
+                    info["categories"][column] = [str(row["value"]) for row in values]
+        return snapshot
+
+    def _update_vocabulary(self, snapshot: Dict[str, Dict[str, Any]]):
+        def collect(column: str) -> List[str]:
+            return [value for info in snapshot.values()
+                    for name, values in info["categories"].items() if name.lower() == column
+                    for value in values]
+        states, crops, stations = collect("state"), collect("crop"), collect("station_name")
+        # Warehouse spellings are listed last so they win over the defaults
+        intent_matcher.set_vocabulary(
+            states=INDIAN_STATES + states if states else None,
+            crops=COMMON_CROPS + crops if crops else None,
+            stations=stations if stations else None
+        )
+
+    def render_prompt_context(self, datasets: List[str]) -> str:
+        """Compact description of the given tables for SQL generation prompts.
+
+        Never touches the database: it renders the current snapshot, or the
+        static schema until get() has loaded one.
+        """
+        key = tuple(datasets)
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._render({table: {"columns": [(column, None) for column in FALLBACK_COLUMNS.get(table, [])],
+                                         "row_count": None, "ranges": {}, "categories": {}} for table in datasets},
+                                datasets)
+        context = self._contexts.get(key)
+        if context is None:
+            context = self._render(snapshot, datasets)
+            self._contexts[key] = context
+        return context
+
+    def _render(self, snapshot: Dict[str, Dict[str, Any]], datasets: List[str]) -> str:
+
+        lines = []
+        for table in datasets:
+            info = snapshot.get(table)
+            if info is None:
+                lines.append(f"Table: {table}")
+                continue
+            size = f" ({info['row_count']:,} rows)" if info["row_count"] is not None else ""
+            lines.append(f"Table: {table}{size} - {TABLE_DESCRIPTIONS.get(table, '')}".rstrip(" -"))
+            lines.append("Columns: " + ", ".join(
+                f"{quote_column(column)} {data_type}" if data_type else quote_column(column)
+                for column, data_type in info["columns"]
+            ))
+            for column, (low, high) in info["ranges"].items():
+                lines.append(f"{quote_column(column)} ranges from {low} to {high}")
+            for column, values in info["categories"].items():
+                shown = ", ".join(values[:self.max_prompt_values])
+                more = f", ... ({len(values)} total)" if len(values) > self.max_prompt_values else ""
+                lines.append(f"{quote_column(column)} values: {shown}{more}")
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot or {}
+        return {
+            "loaded": self._snapshot is not None,
+            "refreshes": self.refreshes,
+            "row_counts": {table: info["row_count"] for table, info in snapshot.items()}
+        }
+
+# Global schema catalog instance
+schema_catalog = SchemaCatalog()
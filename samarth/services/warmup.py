@@ -0,0 +1,87 @@
+# Startup Warm-up for Project Samarth
+#
+# The first question after a deploy used to pay for opening database
+# connections, introspecting the schema, building prompt contexts and creating
+# the LLM client. warm_up() does that work when the app starts instead, and
+# /ready only reports the instance ready once it has finished. Each step is
+# timed into the report; a failing step is recorded and skipped, never fatal.
+#
+# With WARMUP_REPLAY_QUESTIONS > 0 the most frequently asked questions of the
+# last WARMUP_REPLAY_DAYS are also answered into the answer cache. Questions no
+# template covers cost LLM calls, so this is off by default.
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List
+from samarth.data.db_connection import db
+
+TOP_QUESTIONS_QUERY = """
+    SELECT MIN(question) AS question, COUNT(*) AS asked FROM user_queries
+    WHERE created_at > NOW() - make_interval(days => %s)
+    GROUP BY LOWER(TRIM(question))
+    ORDER BY asked DESC
+    LIMIT %s
+"""
+
+# Exercises the intent matcher and dataset routing once before real traffic
+SAMPLE_QUESTION = "What was the rice production in Punjab in 2015?"
+
+
+async def _step(report: Dict[str, Any], name: str, func: Callable[[], Any]):
+    """Run one warm-up step (blocking ones in a worker thread) and record its outcome"""
+    started = time.perf_counter()
+    try:
+        result = await func() if asyncio.iscoroutinefunction(func) else await asyncio.to_thread(func)
+        report[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 3), "result": result}
+    except Exception as e:
+        report[name] = {"ok": False, "seconds": round(time.perf_counter() - started, 3), "error": str(e)}
+        print(f"Warm-up step {name} failed: {e}")
+
+
+def top_questions(limit: int, days: int) -> List[str]:
+    """Most frequently asked recent questions, most asked first"""
+    rows = db.execute_query(TOP_QUESTIONS_QUERY, (days, limit), raise_on_error=True)
+    return [row["question"] for row in rows]
+
+
+async def warm_up(query_service: Any, report: Dict[str, Any]) -> Dict[str, Any]:
+    """Prime connections, caches and clients for query_service; fills and returns report"""
+    catalog = query_service.catalog
+    llm = query_service.llm
+
+    def open_connections() -> int:
+        return db.warm_up(int(os.getenv("WARMUP_DB_CONNECTIONS", "2")))
+
+    def prime_catalog() -> int:
+        # Introspects the schema, which also loads the intent matcher's state/crop vocabulary
+        catalog.get()
+        combinations = [[table] for table in catalog.tables] + [list(catalog.tables)]
+        for datasets in combinations:
+            catalog.render_prompt_context(datasets)
+        return len(combinations)
+
+    def prime_routing() -> List[str]:
+        if query_service.intents is not None:
+            # Not counted, so warm-ups do not show up in the fast path hit rate
+            query_service.intents.match(SAMPLE_QUESTION, record=False)
+        return llm.identify_relevant_datasets(SAMPLE_QUESTION) if llm is not None else []
+
+    async def replay_questions() -> int:
+        limit = int(os.getenv("WARMUP_REPLAY_QUESTIONS", "0"))
+        if limit <= 0:
+            return 0
+        questions = await asyncio.to_thread(top_questions, limit, int(os.getenv("WARMUP_REPLAY_DAYS", "7")))
+        filled = 0
+        for question in questions:
+            filled += await query_service.prefill(question)
+        return filled
+
+    await _step(report, "database", open_connections)
+    if catalog is not None:
+        await _step(report, "schema_catalog", prime_catalog)
+    await _step(report, "routing", prime_routing)
+    provider = getattr(llm, "provider", None)
+    if provider is not None:
+        await _step(report, "llm_provider", provider.warm_up)
+    await _step(report, "answer_cache", replay_questions)
+    return report
@@ -1,6 +1,7 @@
 # Test Suite for Project Samarth
 import unittest
 import asyncio
+import time
 from samarth.services.llm_service import LLMService
 from samarth.utils.validation import validate_query, sanitize_input
 
@@ -69,5 +70,1260 @@ class TestDataAccess(unittest.TestCase):
         from samarth.data.data_access import AgriculturalDataAccess
         self.assertTrue(hasattr(AgriculturalDataAccess, 'get_production_by_state_and_year_range'))
 
+class TestIntentMatcher(unittest.TestCase):
+    def setUp(self):
+        """Use a fresh matcher so hit-rate counters start at zero"""
+        from samarth.services.intent_matcher import IntentMatcher
+        self.matcher = IntentMatcher()
+    
+    def test_state_production_trend(self):
+        """Test that a state production trend question maps to the year range query"""
+        match = self.matcher.match("What was the crop production trend in Andhra Pradesh from 2010 to 2013?")
+        self.assertIsNotNone(match)
+        self.assertEqual(match.intent, "state_production_trend")
+        self.assertEqual(match.params, ("Andhra Pradesh", 2010, 2013))
+        self.assertIn("BETWEEN 2010 AND 2013", match.display_sql)
+    
+    def test_top_crops_with_limit(self):
+        """Test that top-N crop questions fill the state, year and limit slots"""
+        match = self.matcher.match("Show me the top 5 crops by production in Madhya Pradesh in 2012")
+        self.assertIsNotNone(match)
+        self.assertEqual(match.intent, "top_crops_by_production")
+        self.assertEqual(match.params, ("Madhya Pradesh", 2012, 5))
+    
+    def test_highest_temperature_stations(self):
+        """Test the highest mean temperature question previously hard-coded in LLMService"""
+        match = self.matcher.match("Which districts has highest mean temperature over 100 years?")
+        self.assertIsNotNone(match)
+        self.assertEqual(match.dataset, "climate_change_data")
+        self.assertIn("avg_max_temp", match.display_sql)
+    
+    def test_highest_minimum_temperature_stations(self):
+        """Test that asking about minimum temperatures ranks stations by their minimum, not their maximum"""
+        match = self.matcher.match("Which station has the highest minimum temperature?")
+        self.assertIsNotNone(match)
+        self.assertEqual(match.intent, "top_stations_by_temperature")
+        self.assertIn("avg_min_temp", match.display_sql)
+        self.assertIsNone(self.matcher.match("Which stations have the highest minimum and maximum temperature?"))
+    
+    def test_crop_production_in_one_year(self):
+        """Test that a crop production question about a single year is filtered to that year"""
+        match = self.matcher.match("What was rice production in Punjab in 2012?")
+        self.assertIsNotNone(match)
+        self.assertEqual(match.intent, "crop_production_trend")
+        self.assertEqual(match.params, ("Rice", "Punjab", 2012))
+        self.assertIn("year = 2012", match.display_sql)
+        self.assertEqual(self.matcher.match("How has rice production in Punjab changed?").params, ("Rice", "Punjab"))
+    
+    def test_relationship_question_falls_through(self):
+        """Test that cross-dataset reasoning questions are left to the LLM"""
+        self.assertIsNone(self.matcher.match("How does rainfall affect rice production in Assam?"))
+    
+    def test_hit_rate(self):
+        """Test that the hit rate counts matched and unmatched questions"""
+        self.matcher.match("Which states received the highest rainfall in June 2020?")
+        self.matcher.match("Tell me something interesting")
+        stats = self.matcher.stats()
+        self.assertEqual(stats["attempts"], 2)
+        self.assertEqual(stats["hits_by_intent"], {"top_rainfall_states": 1})
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+
+class TestAnswerRenderer(unittest.TestCase):
+    def setUp(self):
+        from samarth.services.answer_renderer import AnswerRenderer
+        self.renderer = AnswerRenderer()
+    
+    def test_time_series(self):
+        """Test that a yearly series is described with units and percentage change"""
+        rows = [{"year": 2010, "total_production": 1000.0}, {"year": 2011, "total_production": 1500.0}]
+        answer = self.renderer.render("What was the production trend in Punjab?", rows)
+        self.assertIn("1,000 tonnes in 2010", answer)
+        self.assertIn("an increase of 50.0%", answer)
+    
+    def test_ranking(self):
+        """Test that sorted label/value rows are rendered as a top-N list"""
+        rows = [{"state": "Assam", "total_rainfall": 420.5}, {"state": "Kerala", "total_rainfall": 300.0},
+                {"state": "Goa", "total_rainfall": 250.0}]
+        answer = self.renderer.render("Which states had the highest rainfall?", rows)
+        self.assertIn("1. Assam: 420.5 mm", answer)
+        self.assertIn("2. Kerala: 300 mm", answer)
+        self.assertTrue(answer.startswith("Top 3 by total rainfall:"))
+        self.assertIn("Assam is ahead of Kerala by 40.2%.", answer)
+    
+    def test_two_rows_are_compared(self):
+        """Test that two label/value rows are compared rather than ranked"""
+        rows = [{"state": "Assam", "total_rainfall": 420.5}, {"state": "Kerala", "total_rainfall": 300.0}]
+        answer = self.renderer.render("Compare rainfall in Assam and Kerala", rows)
+        self.assertTrue(answer.startswith("Comparison of total rainfall: Assam: 420.5 mm; Kerala: 300 mm."))
+        self.assertIn("Assam is higher than Kerala by 40.2%.", answer)
+    
+    def test_descending_time_series(self):
+        """Test that a time series ordered newest first is still described from the earliest period"""
+        rows = [{"year": 2012, "production": 800.0}, {"year": 2011, "production": 900.0},
+                {"year": 2010, "production": 1000.0}]
+        answer = self.renderer.render("Rice production in Punjab", rows)
+        self.assertIn("went from 1,000 tonnes in 2010 to 800 tonnes in 2012, a decrease of 20.0%", answer)
+        self.assertLess(answer.index("- 2010"), answer.index("- 2012"))
+    
+    def test_ascending_ranking(self):
+        """Test that rows sorted in ascending order are rendered as a bottom-N list"""
+        rows = [{"state": "Rajasthan", "total_rainfall": 250.0}, {"state": "Gujarat", "total_rainfall": 300.0},
+                {"state": "Kerala", "total_rainfall": 900.0}]
+        answer = self.renderer.render("Which states had the lowest rainfall?", rows)
+        self.assertTrue(answer.startswith("Bottom 3 by total rainfall:"))
+        self.assertIn("1. Rajasthan: 250 mm", answer)
+        self.assertIn("Gujarat is higher than Rajasthan by 20.0%.", answer)
+    
+    def test_explanation_goes_to_llm(self):
+        """Test that questions asking for reasoning are not templated"""
+        rows = [{"year": 2010, "production": 1.0}, {"year": 2011, "production": 2.0}]
+        self.assertIsNone(self.renderer.render("Why did rice production change?", rows))
+    
+    def test_mixed_datasets_go_to_llm(self):
+        """Test that heterogeneous rows from several datasets are not templated"""
+        rows = [{"year": 2010, "production": 1.0}, {"month": 6, "avg_rainfall": 2.0}]
+        self.assertIsNone(self.renderer.render("Show production and rainfall", rows))
+
+class FakeLLM:
+    """Minimal stand-in for LLMService used to exercise the query pipeline"""
+    def identify_relevant_datasets(self, question):
+        return ["agricultural_production"]
+    
+    async def agenerate_sql_query(self, question, datasets):
+        return "SELECT crop, production FROM agricultural_production"
+    
+    async def asynthesize_answer(self, question, query_results, datasets, sql_queries):
+        return "full answer"
+    
+    async def astream_answer(self, question, query_results, datasets, sql_queries):
+        yield "streamed "
+        yield "answer"
+    
+    async def arepair_sql_query(self, question, datasets, sql_query, error):
+        return "SELECT crop, production AS total FROM agricultural_production"
+
+class TestQueryStreaming(unittest.TestCase):
+    def setUp(self):
+        from samarth.services.query_service import QueryService
+        self.service = QueryService()
+        self.service.llm = FakeLLM()
+        self.service.intents = None
+        self.service.catalog = None
+    
+    def _collect(self, question):
+        async def run():
+            return [event async for event in self.service.stream_query(question)]
+        return asyncio.run(run())
+    
+    def test_stream_event_order(self):
+        """Test that the stream emits datasets, sql, results, answer chunks and done in order"""
+        from unittest import mock
+        rows = [{"crop": "Rice", "production": 10.0}, {"crop": "Wheat", "production": 30.0}, {"crop": "Gram", "production": 20.0}, {"crop": "Tur", "production": 5.0}]
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows):
+            events = self._collect("Explain crop production in Punjab")
+        names = [event["event"] for event in events]
+        self.assertEqual(names, ["datasets", "sql", "results", "answer_chunk", "answer_chunk", "done"])
+        self.assertEqual(events[-1]["data"]["answer"], "streamed answer")
+        self.assertNotIn("visualization_data", events[-1]["data"])
+    
+    def test_process_query_returns_full_response(self):
+        """Test that the blocking call still returns the complete response"""
+        from unittest import mock
+        rows = [{"crop": "Rice", "production": 10.0}]
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows):
+            result = asyncio.run(self.service.process_query("Explain crop production in Punjab"))
+        self.assertEqual(result["answer"], "full answer")
+        self.assertEqual(result["visualization_data"]["data"], rows)
+
+class TestBatchProcessing(unittest.TestCase):
+    def test_batch_deduplicates_and_shares_caches(self):
+        """Test that duplicate questions run once and the batch shares SQL and result caches"""
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        service = QueryService()
+        service.llm = mock.Mock(wraps=FakeLLM())
+        service.intents = None
+        service.catalog = None
+        questions = ["Explain crop production?", "explain  crop production", "Explain crop output"]
+        rows = [{"crop": "Rice", "production": 10.0}]
+        
+        async def run():
+            return [item async for item in service.process_batch(questions, concurrency=2)]
+        
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows) as execute:
+            results = asyncio.run(run())
+            self.assertEqual(execute.call_count, 1)
+            # A repeated batch is served entirely from the shared caches
+            asyncio.run(run())
+            self.assertEqual(execute.call_count, 1)
+        
+        self.assertEqual(sorted(item["index"] for item in results), [0, 1, 2])
+        self.assertEqual(service.llm.agenerate_sql_query.call_count, 2)
+    
+    def test_batch_concurrency_is_validated_and_capped(self):
+        """Test that a bad concurrency is a 422 before streaming and a large one is capped"""
+        from unittest import mock
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from samarth.api import query_router
+        from samarth.services.container import get_query_service
+        
+        class FakeService:
+            batch_max_questions = 10
+            batch_llm_concurrency = 4
+            
+            async def process_batch(self, questions, user_id=None, concurrency=None):
+                yield {"index": 0, "concurrency": concurrency}
+        
+        app = FastAPI()
+        app.include_router(query_router.router)
+        app.dependency_overrides[get_query_service] = FakeService
+        client = TestClient(app)
+        with mock.patch.object(query_router, "admission", None):
+            for concurrency in ("fast", 0, -2, 1.5, True):
+                response = client.post("/api/v1/query/ask/batch", json={"questions": ["q"], "concurrency": concurrency})
+                self.assertEqual(response.status_code, 422)
+            response = client.post("/api/v1/query/ask/batch", json={"questions": ["q"], "concurrency": 1000})
+        self.assertEqual(response.json()["concurrency"], 4)
+    
+    def test_ttl_cache_expiry(self):
+        """Test that cache entries expire after their TTL"""
+        from samarth.services.cache import TTLCache
+        cache = TTLCache(maxsize=2, ttl=0)
+        cache.set("key", "value")
+        self.assertIsNone(cache.get("key"))
+        cache.set("key", "value", ttl=60)
+        self.assertEqual(cache.get("key"), "value")
+
+class TestRequestCoalescing(unittest.TestCase):
+    def test_concurrent_identical_questions_share_one_computation(self):
+        """Test that concurrent identical questions run the pipeline once"""
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        service = QueryService()
+        service.llm = mock.Mock(wraps=FakeLLM())
+        service.intents = None
+        service.catalog = None
+        rows = [{"crop": "Rice", "production": 10.0}]
+        
+        async def run():
+            return await asyncio.gather(
+                service.process_query("Explain crop production in Punjab?"),
+                service.process_query("explain crop production in punjab"),
+                service.process_query("Explain crop production in Punjab")
+            )
+        
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows):
+            results = asyncio.run(run())
+        
+        self.assertEqual(service.llm.agenerate_sql_query.call_count, 1)
+        self.assertEqual(service.llm.asynthesize_answer.call_count, 1)
+        self.assertTrue(all(result["answer"] == "full answer" for result in results))
+        self.assertEqual(service.query_flights.coalesced, 2)
+    
+    def test_result_cache_is_versioned_by_etl_runs(self):
+        """Test that repeated SQL is served from the result cache until the dataset versions change"""
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        service = QueryService()
+        execute = mock.Mock(side_effect=[[{"production": 1.0}], [{"production": 2.0}]])
+        versions = {"agricultural_production": "2024-01-01"}
+        
+        async def run():
+            first = await service._cached_query("SELECT 1", execute)
+            repeat = await service._cached_query("SELECT 1", execute)
+            versions["agricultural_production"] = "2024-02-01"
+            service._dataset_versions.clear()
+            return first, repeat, await service._cached_query("SELECT 1", execute)
+        
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions",
+                        side_effect=lambda: dict(versions)):
+            first, repeat, reloaded = asyncio.run(run())
+        self.assertEqual((first, repeat, reloaded), ([{"production": 1.0}], [{"production": 1.0}], [{"production": 2.0}]))
+        self.assertEqual(execute.call_count, 2)
+    
+    def test_single_flight_propagates_errors(self):
+        """Test that every waiter sees the leader's exception"""
+        from samarth.services.cache import SingleFlight
+        flights = SingleFlight()
+        
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+        
+        async def run():
+            return await asyncio.gather(flights.do("key", fail), flights.do("key", fail), return_exceptions=True)
+        
+        errors = asyncio.run(run())
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors))
+        self.assertEqual(len(flights), 0)
+
+class TestLLMClient(unittest.TestCase):
+    def _client(self, **kwargs):
+        from samarth.services.llm_client import AsyncLLMClient, CircuitBreaker
+        options = {"timeout": 0.2, "max_retries": 2, "backoff_base": 0.0, "backoff_max": 0.0,
+                   "breaker": CircuitBreaker(failure_threshold=3, reset_timeout=60)}
+        options.update(kwargs)
+        return AsyncLLMClient(**options)
+    
+    def test_retry_then_succeed(self):
+        """Test that a transient failure is retried"""
+        client = self._client()
+        calls = []
+        
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("transient")
+            return "ok"
+        
+        self.assertEqual(asyncio.run(client.call(flaky)), "ok")
+        self.assertEqual(client.stats()["retries"], 1)
+        self.assertEqual(client.stats()["circuit_state"], "closed")
+    
+    def test_timeout_raises_unavailable(self):
+        """Test that a call exceeding the deadline raises LLMUnavailableException"""
+        from samarth.utils.exceptions import LLMUnavailableException
+        client = self._client(timeout=0.05, max_retries=0)
+        with self.assertRaises(LLMUnavailableException):
+            asyncio.run(client.call(time.sleep, 0.3))
+        self.assertEqual(client.stats()["timeouts"], 1)
+    
+    def test_no_retry_while_llm_threads_are_busy(self):
+        """Test that a timed-out call holding the only LLM thread is not retried onto a full pool"""
+        from samarth.utils.exceptions import LLMUnavailableException
+        client = self._client(timeout=0.05, max_retries=2, max_threads=1)
+        with self.assertRaises(LLMUnavailableException):
+            asyncio.run(client.call(time.sleep, 0.3))
+        stats = client.stats()
+        self.assertEqual((stats["timeouts"], stats["retries"], stats["saturated"]), (1, 0, 1))
+    
+    def test_cancel_during_hedge_delay_cancels_the_attempt(self):
+        """Test that a caller cancelled before the hedge fires does not leave its attempt running"""
+        client = self._client(timeout=5, hedge_percentile=50, hedge_min_samples=1)
+        client.latency.record(0.2)
+        cancelled = []
+        
+        async def slow_attempt(func, args, kwargs):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        
+        async def run():
+            client._attempt = slow_attempt
+            caller = asyncio.create_task(client.call(time.sleep, 5))
+            await asyncio.sleep(0.05)
+            caller.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await caller
+            await asyncio.sleep(0)
+            return list(cancelled)
+        
+        self.assertEqual(asyncio.run(run()), [True])
+        self.assertEqual(client.stats()["hedges"], 0)
+    
+    def test_breaker_opens_and_fails_fast(self):
+        """Test that repeated failures open the circuit and later calls are rejected"""
+        from samarth.utils.exceptions import LLMUnavailableException
+        client = self._client()
+        
+        def broken():
+            raise RuntimeError("provider down")
+        
+        with self.assertRaises(LLMUnavailableException):
+            asyncio.run(client.call(broken))
+        self.assertEqual(client.stats()["circuit_state"], "open")
+        with self.assertRaises(LLMUnavailableException):
+            asyncio.run(client.call(lambda: "never called"))
+        self.assertEqual(client.stats()["rejected"], 1)
+    
+    def test_cancelled_half_open_trial_frees_the_breaker(self):
+        """Test that a cancelled or abandoned half-open trial lets the next call try again"""
+        from samarth.services.llm_client import CircuitBreaker
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        client = self._client(timeout=5, max_retries=0, breaker=breaker)
+        breaker.record_failure()
+        
+        async def cancel_trial():
+            task = asyncio.ensure_future(client.call(time.sleep, 0.2))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        
+        asyncio.run(cancel_trial())
+        self.assertTrue(breaker.allow())
+        breaker.release_trial()
+        
+        async def abandon_stream():
+            stream = client.stream(lambda: iter(["a", "b"]))
+            self.assertEqual(await stream.__anext__(), "a")
+            await stream.aclose()
+        
+        asyncio.run(abandon_stream())
+        self.assertTrue(breaker.allow())
+    
+    def test_pipeline_degrades_when_llm_unavailable(self):
+        """Test that answer synthesis falls back to a local summary when the LLM fails"""
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        from samarth.utils.exceptions import LLMUnavailableException
+        service = QueryService()
+        service.llm = mock.Mock(wraps=FakeLLM())
+        service.llm.asynthesize_answer = mock.AsyncMock(side_effect=LLMUnavailableException("down"))
+        service.intents = None
+        service.catalog = None
+        rows = [{"crop": "Rice", "production": 10.0}]
+        
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows):
+            result = asyncio.run(service.process_query("Explain rice production"))
+        
+        self.assertIn("Rice", result["answer"])
+
+class TestLLMProviders(unittest.TestCase):
+    def test_stub_provider_returns_canned_sql(self):
+        """Test that the stub provider picks canned SQL by the dataset named in the prompt"""
+        from samarth.models.llm_model import StubProvider
+        from samarth.services.llm_service import LLMService
+        service = LLMService(provider=StubProvider(sql={"weather_data": "SELECT 42 as answer"}))
+        
+        self.assertEqual(asyncio.run(service.agenerate_sql_query("Rainfall in Kerala", ["weather_data"])),
+                         "SELECT 42 as answer")
+        self.assertIn("FROM agricultural_production",
+                      asyncio.run(service.agenerate_sql_query("Top crops", ["agricultural_production"])))
+    
+    def test_stub_provider_streams_answer(self):
+        """Test that streamed stub chunks join to the full answer"""
+        from samarth.models.llm_model import StubProvider
+        from samarth.services.llm_service import LLMService
+        service = LLMService(provider=StubProvider())
+        rows = [{"crop": "Rice", "production": 10.0}]
+        
+        async def run():
+            chunks = [chunk async for chunk in service.astream_answer("Rice output", rows, ["agricultural_production"], [])]
+            return chunks, await service.asynthesize_answer("Rice output", rows, ["agricultural_production"], [])
+        
+        chunks, answer = asyncio.run(run())
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), answer)
+    
+    def test_unknown_provider(self):
+        """Test that an unknown provider name is rejected"""
+        from samarth.models.llm_model import get_provider
+        with self.assertRaises(ValueError):
+            get_provider("nonexistent")
+
+class TestPromptBuilder(unittest.TestCase):
+    def test_compact_csv_rows(self):
+        """Test that results are serialized as CSV with rounded numbers"""
+        from samarth.services.prompt_builder import PromptBuilder
+        builder = PromptBuilder(token_budget=2000)
+        prompt = builder.build_synthesis_prompt("Rice output", [{"crop": "Rice", "production": 1234.5678}],
+                                                ["agricultural_production"], ["SELECT crop, production FROM agricultural_production"])
+        
+        self.assertIn("crop,production\nRice,1234.57", prompt)
+        self.assertNotIn("Summary:", prompt)
+    
+    def test_long_series_summarized_within_budget(self):
+        """Test that long results are summarized with stats and kept within the token budget"""
+        from samarth.services.prompt_builder import PromptBuilder, estimate_tokens
+        rows = [{"year": 1950 + i, "production": 100.0 + i} for i in range(70)]
+        builder = PromptBuilder(token_budget=300, max_rows=40, sample_rows=12)
+        prompt = builder.build_synthesis_prompt("Production trend", rows, ["agricultural_production"], ["SELECT 1"])
+        
+        self.assertIn("production: min 100, max 169, mean 134.5, trend an increase of 69.0%", prompt)
+        self.assertIn("1950,100", prompt)
+        self.assertIn("2019,169", prompt)
+        self.assertLessEqual(estimate_tokens(prompt), 300)
+
+class TestSchemaCatalog(unittest.TestCase):
+    def _fake_execute(self, query, params=None):
+        if "information_schema" in query:
+            return [{"table_name": "agricultural_production", "column_name": name, "data_type": kind}
+                    for name, kind in (("id", "integer"), ("state", "character varying"), ("crop", "character varying"),
+                                       ("year", "integer"), ("production", "numeric"))]
+        if "COUNT(*)" in query:
+            return [{"row_count": 1200}]
+        if "MIN(year)" in query:
+            return [{"low": 1997, "high": 2015}]
+        if "DISTINCT state" in query:
+            return [{"value": "Punjab"}, {"value": "Vidarbha Region"}]
+        if "DISTINCT crop" in query:
+            return [{"value": "Rice"}]
+        return []
+    
+    def test_render_prompt_context_and_vocabulary(self):
+        """Test that the catalog renders live columns and stats and extends the intent vocabulary"""
+        from unittest import mock
+        from samarth.services.schema_catalog import SchemaCatalog
+        from samarth.services.intent_matcher import intent_matcher, INDIAN_STATES, COMMON_CROPS
+        catalog = SchemaCatalog(tables=["agricultural_production"], check_interval=60)
+        
+        try:
+            with mock.patch("samarth.services.schema_catalog.MetadataAccess.get_dataset_versions", return_value={"agricultural_production": "v1"}), \
+                 mock.patch("samarth.services.schema_catalog.db.execute_query", side_effect=self._fake_execute) as execute:
+                catalog.get()
+                context = catalog.render_prompt_context(["agricultural_production"])
+                calls = execute.call_count
+                catalog.render_prompt_context(["agricultural_production"])
+                self.assertEqual(execute.call_count, calls)
+            
+            self.assertIn("Table: agricultural_production (1,200 rows)", context)
+            self.assertIn("Columns: state character varying, crop character varying, year integer, production numeric", context)
+            self.assertIn("year ranges from 1997 to 2015", context)
+            self.assertNotIn("id integer", context)
+            self.assertEqual(intent_matcher.extract_slots("Rice in Vidarbha Region in 2010")["state"], "Vidarbha Region")
+        finally:
+            intent_matcher.set_vocabulary(states=INDIAN_STATES, crops=COMMON_CROPS, stations=[])
+    
+    def test_refresh_on_version_change(self):
+        """Test that the snapshot is rebuilt after invalidation or a dataset version change"""
+        from unittest import mock
+        from samarth.services.schema_catalog import SchemaCatalog
+        from samarth.services.intent_matcher import intent_matcher, INDIAN_STATES, COMMON_CROPS
+        catalog = SchemaCatalog(tables=["agricultural_production"], check_interval=0)
+        
+        try:
+            with mock.patch("samarth.services.schema_catalog.MetadataAccess.get_dataset_versions", side_effect=[{"a": "1"}, {"a": "1"}, {"a": "2"}, {"a": "2"}]), \
+                 mock.patch("samarth.services.schema_catalog.db.execute_query", side_effect=self._fake_execute):
+                catalog.get()
+                catalog.get()
+                self.assertEqual(catalog.refreshes, 1)
+                catalog.get()
+                self.assertEqual(catalog.refreshes, 2)
+                catalog.invalidate()
+                catalog.get()
+                self.assertEqual(catalog.refreshes, 3)
+        finally:
+            intent_matcher.set_vocabulary(states=INDIAN_STATES, crops=COMMON_CROPS, stations=[])
+
+    def test_render_prompt_context_never_queries(self):
+        """Test that rendering uses the loaded snapshot, or the static schema, without touching the database"""
+        from unittest import mock
+        from samarth.services.schema_catalog import SchemaCatalog
+        from samarth.services.intent_matcher import intent_matcher, INDIAN_STATES, COMMON_CROPS
+        catalog = SchemaCatalog(tables=["agricultural_production"], check_interval=0)
+        
+        try:
+            with mock.patch("samarth.services.schema_catalog.MetadataAccess.get_dataset_versions") as versions, \
+                 mock.patch("samarth.services.schema_catalog.db.execute_query") as execute:
+                context = catalog.render_prompt_context(["agricultural_production"])
+                self.assertIn("Columns: state, district, crop, year", context)
+                versions.assert_not_called()
+                execute.assert_not_called()
+            
+            with mock.patch("samarth.services.schema_catalog.MetadataAccess.get_dataset_versions", return_value={"a": "1"}), \
+                 mock.patch("samarth.services.schema_catalog.db.execute_query", side_effect=self._fake_execute):
+                catalog.get()
+            # The snapshot is past its version check, but the prompt still renders from it
+            with mock.patch("samarth.services.schema_catalog.MetadataAccess.get_dataset_versions") as versions, \
+                 mock.patch("samarth.services.schema_catalog.db.execute_query") as execute:
+                context = catalog.render_prompt_context(["agricultural_production"])
+                self.assertIn("(1,200 rows)", context)
+                versions.assert_not_called()
+                execute.assert_not_called()
+        finally:
+            intent_matcher.set_vocabulary(states=INDIAN_STATES, crops=COMMON_CROPS, stations=[])
+
+class TestSQLRepair(unittest.TestCase):
+    def setUp(self):
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        self.service = QueryService()
+        self.service.llm = mock.Mock(wraps=FakeLLM())
+        self.service.intents = None
+        self.service.catalog = None
+    
+    def _run(self, execute):
+        from unittest import mock
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", side_effect=execute):
+            return asyncio.run(self.service.process_query("Rice production"))
+    
+    def test_failed_sql_is_repaired_and_cached(self):
+        """Test that SQL rejected by the database is repaired once and the fix is cached"""
+        from samarth.utils.exceptions import DatabaseQueryException
+        
+        def execute(query, params=None, raise_on_error=False):
+            if "AS total" not in query:
+                raise DatabaseQueryException(query, 'column "production" is ambiguous', "42702")
+            return [{"crop": "Rice", "total": 10.0}]
+        
+        result = self._run(execute)
+        
+        self.assertEqual(result["sql_queries"], ["SELECT crop, production AS total FROM agricultural_production"])
+        self.assertEqual(self.service.llm.arepair_sql_query.call_count, 1)
+        self.assertEqual(self.service.repair_stats["repaired"], 1)
+        self.assertEqual(self.service.sql_cache.get(("agricultural_production", "rice production")),
+                         "SELECT crop, production AS total FROM agricultural_production")
+    
+    def test_connection_errors_are_not_repaired(self):
+        """Test that connection failures skip the repair loop and report a database error"""
+        from samarth.utils.exceptions import DatabaseQueryException
+        
+        def execute(query, params=None, raise_on_error=False):
+            raise DatabaseQueryException(query, "Database connection not available")
+        
+        result = self._run(execute)
+        
+        self.assertEqual(result["answer"], self.service.DATABASE_ERROR_MESSAGE)
+        self.assertEqual(self.service.llm.arepair_sql_query.call_count, 0)
+        self.assertEqual(len(self.service.answer_cache), 0)
+    
+    def test_repair_attempts_are_bounded(self):
+        """Test that repair stops after the configured number of attempts"""
+        from samarth.utils.exceptions import DatabaseQueryException
+        self.service.sql_repair_attempts = 2
+        
+        def execute(query, params=None, raise_on_error=False):
+            raise DatabaseQueryException(query, "syntax error", "42601")
+        
+        result = self._run(execute)
+        
+        self.assertEqual(result["answer"], self.service.DATABASE_ERROR_MESSAGE)
+        self.assertEqual(self.service.llm.arepair_sql_query.call_count, 2)
+        self.assertEqual(self.service.repair_stats, {"attempts": 2, "repaired": 0, "failed": 1})
+    
+    def test_unrepaired_sql_is_not_cached(self):
+        """Test that SQL which failed and could not be repaired is generated afresh next time"""
+        from samarth.utils.exceptions import DatabaseQueryException
+        self.service.sql_repair_attempts = 1
+        
+        def execute(query, params=None, raise_on_error=False):
+            raise DatabaseQueryException(query, "syntax error", "42601")
+        
+        self._run(execute)
+        self.assertIsNone(self.service.sql_cache.get(("agricultural_production", "rice production")))
+        self._run(execute)
+        self.assertEqual(self.service.llm.agenerate_sql_query.call_count, 2)
+
+class TestDatasetRouter(unittest.TestCase):
+    def test_whole_word_matching(self):
+        """Test that keywords match whole words and inflections, not substrings"""
+        from samarth.services.dataset_router import DatasetRouter
+        router = DatasetRouter()
+        
+        self.assertEqual(router.route("Which crops did farmers grow in Punjab?"), ["agricultural_production"])
+        # "wheat" contains "heat" and "scooler" contains "cool"; neither is a weather question
+        self.assertEqual(router.route("Wheat output of scooler district"), ["agricultural_production"])
+    
+    def test_combination_and_phrases(self):
+        """Test multi-group combinations, multi-word phrases and the fallback to all datasets"""
+        from samarth.services.dataset_router import DatasetRouter
+        router = DatasetRouter()
+        
+        self.assertIn("climate_change_data", router.route("Which station has the highest temperature?"))
+        self.assertIn("climate_change_data", router.route("Effects of global warming on rice"))
+        self.assertEqual(sorted(router.route("List everything")), sorted(router.datasets))
+    
+    def test_weights_from_config(self):
+        """Test that custom rules and weights order the datasets by score"""
+        from samarth.services.dataset_router import DatasetRouter
+        router = DatasetRouter({"threshold": 2, "datasets": {
+            "agricultural_production": {"keywords": {"crop": 1, "yield": 1}},
+            "weather_data": {"keywords": {"monsoon": 3, "crop": 1}}
+        }})
+        
+        self.assertEqual(router.route("Monsoon crop yield"), ["weather_data", "agricultural_production"])
+        self.assertEqual(router.route("Crop in the monsoon"), ["weather_data"])
+
+class TestDatasetClassifier(unittest.TestCase):
+    def _train(self):
+        from samarth.services.dataset_classifier import DatasetClassifier
+        questions, label_sets = [], []
+        for state in ["Punjab", "Kerala", "Bihar", "Assam", "Goa", "Odisha"]:
+            for year in range(2005, 2013):
+                questions.append(f"What was the harvest in {state} in {year}?")
+                label_sets.append(["agricultural_production"])
+                questions.append(f"How much did it rain in {state} during {year}?")
+                label_sets.append(["weather_data"])
+        return DatasetClassifier(["agricultural_production", "weather_data"], n_features=2 ** 12,
+                                 threshold=0.5, confidence=0.7).fit(questions, label_sets, epochs=200)
+    
+    def test_predicts_and_round_trips(self):
+        """Test that a trained model routes questions and survives save/load"""
+        import os
+        import tempfile
+        from samarth.services.dataset_classifier import DatasetClassifier
+        classifier = self._train()
+        
+        self.assertEqual(classifier.route("How much did it rain in Kerala in 2020?"), ["weather_data"])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.npz")
+            classifier.save(path)
+            loaded = DatasetClassifier.load(path)
+        self.assertEqual(loaded.labels, classifier.labels)
+        self.assertAlmostEqual(loaded.predict_proba("harvest in Goa")["agricultural_production"],
+                               classifier.predict_proba("harvest in Goa")["agricultural_production"], places=5)
+    
+    def test_low_confidence_falls_back_to_keywords(self):
+        """Test that unconfident predictions defer to the keyword router"""
+        from samarth.models.llm_model import StubProvider
+        from samarth.services.llm_service import LLMService
+        classifier = self._train()
+        classifier.confidence = 1.01
+        service = LLMService(provider=StubProvider())
+        service.dataset_classifier = classifier
+        
+        self.assertEqual(service.identify_relevant_datasets("Top crops by production"), ["agricultural_production"])
+        self.assertEqual(classifier.stats()["fallbacks"], 1)
+
+class TestQueryLogger(unittest.TestCase):
+    def _entry(self, question="Top crops in Punjab"):
+        from samarth.models.data_models import UserQuery
+        return UserQuery(question=question, answer="answer", data_sources=[], sql_queries=[], confidence_score=0.5)
+    
+    def test_entries_are_written_in_batches(self):
+        """Test that queued entries are written together and flushed on stop"""
+        from unittest import mock
+        from samarth.services.query_logger import QueryLogger
+        logger = QueryLogger(batch_size=50, flush_interval=0.05, enabled=True)
+        
+        async def run():
+            logger.start()
+            for i in range(5):
+                logger.log(self._entry(f"question {i}"))
+            await asyncio.sleep(0.2)
+            logger.log(self._entry("late question"))
+            await logger.stop()
+        
+        with mock.patch.object(QueryLogger, "_write_batch") as write:
+            asyncio.run(run())
+        self.assertEqual([len(call.args[0]) for call in write.call_args_list], [5, 1])
+        self.assertEqual(logger.stats()["written"], 6)
+        self.assertFalse(logger.stats()["running"])
+    
+    def test_stop_writes_the_entry_waiting_for_a_batch(self):
+        """Test that an entry the writer took off the queue is still written when stop() cancels it"""
+        from unittest import mock
+        from samarth.services.query_logger import QueryLogger
+        logger = QueryLogger(batch_size=50, flush_interval=10, enabled=True)
+        
+        async def run():
+            logger.start()
+            logger.log(self._entry())
+            await asyncio.sleep(0.05)
+            await logger.stop()
+        
+        with mock.patch.object(QueryLogger, "_write_batch"):
+            asyncio.run(run())
+        self.assertEqual((logger.stats()["written"], logger.stats()["dropped"]), (1, 0))
+    
+    def test_full_queue_drops_entries(self):
+        """Test that logging never blocks: entries beyond the queue bound are dropped"""
+        from samarth.services.query_logger import QueryLogger
+        logger = QueryLogger(max_queue=2, enabled=True)
+        for _ in range(5):
+            logger.log(self._entry())
+        self.assertEqual(logger.stats()["queued"], 2)
+        self.assertEqual(logger.stats()["dropped"], 3)
+    
+    def test_pipeline_logs_cache_status_and_timings(self):
+        """Test that answered questions are queued with their stage timings and cache outcome"""
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        from samarth.services.query_logger import QueryLogger
+        service = QueryService()
+        service.llm = FakeLLM()
+        service.intents = None
+        service.catalog = None
+        service.logger = QueryLogger(enabled=True)
+        rows = [{"crop": "Rice", "production": 10.0}]
+        
+        async def run():
+            await service.process_query("Explain crop production", "analyst")
+            await service.process_query("Explain crop production", "analyst")
+        
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows):
+            asyncio.run(run())
+        miss, hit = service.logger._take_batch()
+        self.assertEqual((miss.cache_status, hit.cache_status), ("miss", "hit"))
+        self.assertEqual(miss.user_id, "analyst")
+        self.assertTrue({"dataset_routing", "sql_generation", "sql_execution", "synthesis"} <= set(miss.stage_timings))
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_renders_prometheus_text(self):
+        """Test cumulative buckets, sum and count in the exposition format"""
+        from samarth.utils.metrics import MetricsRegistry
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "Test durations", ["stage"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage="sql")
+        histogram.observe(0.5, stage="sql")
+        histogram.observe(5, stage="sql")
+        registry.counter("test_total", "Test events").inc(2)
+        text = registry.render()
+        
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{stage="sql",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{stage="sql",le="1"} 2', text)
+        self.assertIn('test_seconds_bucket{stage="sql",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count{stage="sql"} 3', text)
+        self.assertIn("test_total 2", text)
+    
+    def test_pipeline_records_stage_timings(self):
+        """Test that each stage is timed, returned with the response and exported"""
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        from samarth.utils.metrics import metrics, STAGE_SECONDS
+        service = QueryService()
+        service.llm = FakeLLM()
+        service.intents = None
+        service.catalog = None
+        service.logger = None
+        before = STAGE_SECONDS.count(stage="sql_execution")
+        rows = [{"crop": "Rice", "production": 10.0}]
+        with mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows):
+            result = asyncio.run(service.process_query("Explain crop production in Goa"))
+        
+        self.assertEqual(set(result["stage_timings"]),
+                         {"dataset_routing", "sql_generation", "sql_execution", "visualization", "synthesis"})
+        self.assertEqual(STAGE_SECONDS.count(stage="sql_execution"), before + 1)
+        self.assertIn('samarth_queries_total{cache_status="miss"}', metrics.render())
+
+class TestTracing(unittest.TestCase):
+    def test_spans_nest_across_worker_threads(self):
+        """Test that spans opened in worker threads join the caller's trace"""
+        from samarth.utils.tracing import Tracer, InMemoryExporter
+        tracer = Tracer(InMemoryExporter())
+        
+        def blocking_call():
+            with tracer.span("db.query"):
+                pass
+        
+        async def run():
+            with tracer.span("request", trace_id="req-1") as root:
+                with tracer.span("sql_execution"):
+                    await asyncio.to_thread(blocking_call)
+            return root
+        
+        root = asyncio.run(run())
+        spans = {span["name"]: span for span in tracer.exporter.spans("req-1")}
+        self.assertEqual(set(spans), {"request", "sql_execution", "db.query"})
+        self.assertEqual(spans["sql_execution"]["parent_id"], root.span_id)
+        self.assertEqual(spans["db.query"]["parent_id"], spans["sql_execution"]["span_id"])
+        self.assertIsNone(tracer.current_trace_id())
+    
+    def test_pipeline_annotates_spans_instead_of_printing(self):
+        """Test that stage diagnostics land on the request's spans rather than stdout"""
+        import io
+        from contextlib import redirect_stdout
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        from samarth.utils.tracing import tracer, InMemoryExporter
+        service = QueryService(llm=FakeLLM())
+        service.intents = None
+        service.catalog = None
+        rows = [{"crop": "Rice", "production": 10.0}]
+        
+        async def run():
+            with tracer.span("request", trace_id="annotated-1"):
+                return await service.process_query("Explain rice production")
+        
+        output = io.StringIO()
+        with mock.patch.object(tracer, "exporter", InMemoryExporter()), redirect_stdout(output), \
+             mock.patch("samarth.services.query_service.MetadataAccess.get_dataset_versions", return_value={}), \
+             mock.patch("samarth.services.query_service.db.execute_query", return_value=rows):
+            asyncio.run(run())
+            spans = {span["name"]: span for span in tracer.exporter.spans("annotated-1")}
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(spans["dataset_routing"]["attributes"]["datasets"], ["agricultural_production"])
+    
+    def test_middleware_propagates_request_id(self):
+        """Test that the request ID header becomes the trace ID and is echoed back"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from samarth.utils.tracing import Tracer, InMemoryExporter, TracingMiddleware
+        tracer = Tracer(InMemoryExporter())
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware, tracer=tracer)
+        
+        @app.get("/ping")
+        async def ping():
+            return {"trace_id": tracer.current_trace_id()}
+        
+        response = TestClient(app).get("/ping", headers={"X-Request-ID": "frontend-42"})
+        self.assertEqual(response.json()["trace_id"], "frontend-42")
+        self.assertEqual(response.headers["X-Request-ID"], "frontend-42")
+        self.assertEqual(tracer.exporter.traces()[0]["name"], "GET /ping")
+        # Unsafe IDs are replaced rather than echoed
+        response = TestClient(app).get("/ping", headers={"X-Request-ID": "bad id\r\n"})
+        self.assertNotEqual(response.headers["X-Request-ID"], "bad id")
+
+class TestETLPipeline(unittest.TestCase):
+    def test_parse_crop_field_patterns(self):
+        """Test that the wide agriculture field-name patterns yield crop and year"""
+        from samarth.data.etl_pipeline import parse_crop_field
+        self.assertEqual(parse_crop_field("food_grains_cereals__rice__production_is_thausand_toones__2009_10"), ("Rice", 2009))
+        self.assertEqual(parse_crop_field("wheat_2013_14"), ("Wheat", 2013))
+    
+    def test_fetch_pages_through_mock_api(self):
+        """Test that records are fetched page by page from the local data.gov.in stand-in"""
+        from samarth.benchmarks import mock_data_gov
+        from samarth.data.etl_pipeline import ETLPipeline
+        mock = mock_data_gov.MockDataGov(agriculture_records=25, crops=2, years=3, missing_rate=0.0)
+        server = mock_data_gov.start_server(mock)
+        try:
+            pipeline = ETLPipeline(base_url=mock_data_gov.base_url(server), page_size=10)
+            records = pipeline.fetch_records(mock_data_gov.AGRICULTURE_RESOURCE, limit=100)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(len(records), 25)
+        self.assertEqual(mock.requests, 3)
+        rows = pipeline.transform_agriculture_records(records, min_year=2006)
+        self.assertEqual(len(rows), 25 * 2 * 2)
+        self.assertEqual({row["crop"] for row in rows}, {"Rice", "Wheat"})
+
+class TestSyntheticData(unittest.TestCase):
+    def test_generation_is_deterministic_and_scales(self):
+        """Test that synthetic rows repeat for a seed and grow with the scale factor"""
+        from samarth.data.synthetic_data import generate_agriculture, generate_climate
+        first = next(generate_agriculture(1, seed=7))
+        again = next(generate_agriculture(1, seed=7))
+        self.assertTrue(first.equals(again))
+        self.assertTrue((first["production"] > 0).all())
+        self.assertEqual(list(first.columns), ["state", "district", "crop", "year", "season", "area",
+                                               "production", "yield_per_hectare"])
+        single = sum(len(frame) for frame in generate_climate(1))
+        self.assertEqual(sum(len(frame) for frame in generate_climate(3)), 3 * single)
+        halved = sum(len(frame) for frame in generate_climate(0.5))
+        self.assertLess(abs(halved - single / 2), single * 0.1)
+
+class TestSharedCache(unittest.TestCase):
+    def test_sqlite_backend_shares_entries_between_caches(self):
+        """Test that a value cached by one worker's cache is served to another's"""
+        import os
+        import tempfile
+        from samarth.services.cache_backends import SQLiteBackend, SharedCache
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite3")
+            first = SharedCache("answer", SQLiteBackend(path), maxsize=10, ttl=60)
+            second = SharedCache("answer", SQLiteBackend(path), maxsize=10, ttl=60)
+            asyncio.run(first.aset(("rice", (("weather_data", "1"),)), {"answer": "42"}))
+            self.assertEqual(second.get(("rice", (("weather_data", "1"),))), {"answer": "42"})
+            self.assertEqual((second.hits, second.shared_hits), (1, 1))
+            # Now held locally too
+            self.assertIn(("rice", (("weather_data", "1"),)), second)
+            self.assertIsNone(second.get("unknown"))
+            first.set("short", "value", ttl=0)
+            self.assertIsNone(second.get("short"))
+
+class TestLazyStartup(unittest.TestCase):
+    def test_importing_app_defers_heavy_modules(self):
+        """Test that importing the app loads neither the LLM SDK, plotting libraries nor the pipeline"""
+        import os
+        import subprocess
+        import sys
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        probe = ("import sys, samarth.main; "
+                 "print('loaded:' + ','.join(m for m in ('google.generativeai', 'matplotlib', 'samarth.services.query_service') "
+                 "if m in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, cwd=root, check=True)
+        self.assertEqual(output.stdout.strip().splitlines()[-1], "loaded:")
+    
+    def test_provider_loads_sdk_on_first_call(self):
+        """Test that building the Gemini provider does not create the model"""
+        import os
+        from unittest import mock
+        from samarth.models.llm_model import GeminiProvider
+        provider = GeminiProvider(api_key="test-key")
+        self.assertIsNone(provider._model)
+        # A missing key is still reported when the service is built
+        with mock.patch.dict(os.environ, {"GEMINI_API_KEY": ""}), self.assertRaises(ValueError):
+            GeminiProvider()
+
+class FakeConnection:
+    """Stands in for a pooled psycopg2 connection"""
+    def __init__(self):
+        import psycopg2.extensions
+        self.closed = 0
+        self.rolled_back = 0
+        self.release = None
+        self.info = type("Info", (), {"transaction_status": psycopg2.extensions.TRANSACTION_STATUS_INTRANS})()
+    
+    def rollback(self):
+        self.rolled_back += 1
+    
+    def close(self):
+        release, self.release = self.release, None
+        if release is None:
+            self.closed = 1
+        else:
+            release(self)
+
+class TestConnectionPool(unittest.TestCase):
+    def test_closed_connections_are_reused(self):
+        """Test that closing a pooled connection returns it, rolled back, for the next checkout"""
+        from samarth.data.db_connection import ConnectionPool
+        pool = ConnectionPool(FakeConnection, maxsize=2, timeout=0.05)
+        self.assertEqual(pool.warm_up(5), 2)
+        first = pool.acquire()
+        rolled_back = first.rolled_back
+        first.close()
+        self.assertFalse(first.closed)
+        self.assertEqual(first.rolled_back, rolled_back + 1)
+        self.assertIs(pool.acquire(), first)
+        pool.acquire()
+        with self.assertRaises(TimeoutError):
+            pool.acquire()
+        self.assertEqual((pool.stats()["in_use"], pool.stats()["opened"], pool.stats()["timeouts"]), (2, 2, 1))
+
+class TestWarmup(unittest.TestCase):
+    def test_warm_up_reports_every_step(self):
+        """Test that warm-up primes the catalog and routing, and records failing steps without stopping"""
+        from unittest import mock
+        from samarth.services.query_service import QueryService
+        from samarth.services.warmup import warm_up
+        from samarth.services.intent_matcher import IntentMatcher
+        service = QueryService(llm=FakeLLM())
+        service.catalog = mock.Mock(tables=["weather_data"])
+        service.intents = IntentMatcher()
+        with mock.patch("samarth.services.warmup.db.warm_up", side_effect=ConnectionError("down")):
+            report = asyncio.run(warm_up(service, {}))
+        self.assertEqual(list(report), ["database", "schema_catalog", "routing", "answer_cache"])
+        self.assertFalse(report["database"]["ok"])
+        self.assertEqual(report["schema_catalog"]["result"], 2)
+        service.catalog.render_prompt_context.assert_called_with(["weather_data"])
+        self.assertEqual(report["answer_cache"]["result"], 0)
+        # The warm-up question is not counted in the fast path hit rate
+        self.assertEqual(service.intents.stats()["attempts"], 0)
+
+class TestHealthMonitor(unittest.TestCase):
+    def test_readiness_from_cached_probes(self):
+        """Test that readiness needs warm-up and the database, and that stale data only degrades it"""
+        from unittest import mock
+        from samarth.services.health import HealthMonitor
+        from samarth.services.query_service import QueryService
+        monitor = HealthMonitor(interval=10, etl_max_age_hours=24)
+        self.assertEqual(monitor.readiness(True)[1]["reasons"], ["no probe has completed yet"])
+        service = QueryService(llm=FakeLLM())
+        week_old = [{"last_updated": "2026-01-01 00:00:00", "age_hours": 168.0}]
+        with mock.patch("samarth.services.health.db.execute_query", side_effect=[[{"ok": 1}], week_old]):
+            asyncio.run(monitor.refresh(service))
+        self.assertFalse(monitor.readiness(False)[0])
+        ready, body = monitor.readiness(True)
+        self.assertTrue(ready)
+        self.assertEqual(body["status"], "degraded")
+        self.assertEqual(body["checks"]["caches"]["answer"]["size"], 0)
+        with mock.patch("samarth.services.health.db.execute_query", side_effect=ConnectionError("down")):
+            asyncio.run(monitor.refresh(service))
+        self.assertEqual(monitor.readiness(True)[1]["reasons"], ["database unreachable"])
+
+class TestAdmissionController(unittest.TestCase):
+    def test_rate_limit_per_client(self):
+        """Test that each client has its own token bucket and an empty one is rejected with a retry time"""
+        from samarth.services.admission import AdmissionController, AdmissionRejected
+        controller = AdmissionController(max_concurrent=4, max_queue=0, queue_timeout=1, rate_per_minute=6, burst=2)
+        controller.check_rate("alice")
+        controller.check_rate("alice")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.check_rate("alice")
+        self.assertEqual(rejected.exception.retry_after, 10)
+        controller.check_rate("bob")
+    
+    def test_cheap_questions_are_served_first(self):
+        """Test that queued template/cached questions get the next free slot and a full queue is rejected"""
+        from samarth.services.admission import AdmissionController, AdmissionRejected, PRIORITY_CHEAP, PRIORITY_LLM
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=1, rate_per_minute=0)
+        
+        async def run():
+            order = []
+            ticket = await controller.acquire()
+            
+            async def wait(name, priority):
+                async with await controller.acquire(priority):
+                    order.append(name)
+            
+            waiters = [asyncio.create_task(wait("llm", PRIORITY_LLM))]
+            await asyncio.sleep(0)
+            waiters.append(asyncio.create_task(wait("cheap", PRIORITY_CHEAP)))
+            await asyncio.sleep(0)
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire()
+            ticket.release()
+            await asyncio.gather(*waiters)
+            return order
+        
+        self.assertEqual(asyncio.run(run()), ["cheap", "llm"])
+        self.assertEqual((controller.active, controller.stats()["queue_full"]), (0, 1))
+    
+    def test_queue_timeout_leaves_no_waiter_behind(self):
+        """Test that a request that times out in the queue is rejected and does not hold up later ones"""
+        from samarth.services.admission import AdmissionController, AdmissionRejected
+        controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=0.01, rate_per_minute=0)
+        
+        async def run():
+            ticket = await controller.acquire()
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire()
+            ticket.release()
+            (await controller.acquire()).release()
+        
+        asyncio.run(run())
+        self.assertEqual((controller.active, controller.stats()["waiting"]), (0, 0))
+    
+    def test_release_skips_waiters_that_gave_up(self):
+        """Test that a release racing a cancelled waiter's cleanup hands the slot on instead of leaking it"""
+        from samarth.services.admission import AdmissionController
+        controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=5, rate_per_minute=0)
+        
+        async def run():
+            ticket = await controller.acquire()
+            gave_up = asyncio.create_task(controller.acquire())
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(controller.acquire())
+            await asyncio.sleep(0)
+            gave_up.cancel()
+            # Its wait is cancelled but it is still queued when the slot is released
+            await asyncio.sleep(0)
+            ticket.release()
+            with self.assertRaises(asyncio.CancelledError):
+                await gave_up
+            (await waiting).release()
+        
+        asyncio.run(run())
+        self.assertEqual((controller.active, controller.stats()["waiting"]), (0, 0))
+    
+    def test_batch_is_charged_per_question_and_per_llm_call(self):
+        """Test that a batch pays a token per question and holds a slot per concurrent LLM call"""
+        from samarth.services.admission import AdmissionController, AdmissionRejected
+        controller = AdmissionController(max_concurrent=3, max_queue=5, queue_timeout=0.01, rate_per_minute=6, burst=5)
+        with self.assertRaises(ValueError):
+            controller.check_rate("alice", cost=6)
+        controller.check_rate("alice", cost=5)
+        with self.assertRaises(AdmissionRejected):
+            controller.check_rate("alice")
+        
+        async def run():
+            ticket = await controller.acquire(slots=2)
+            self.assertEqual(controller.active, 2)
+            # Only one slot is left, so the second batch waits, times out and gives its slot back
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire(slots=2)
+            self.assertEqual(controller.active, 2)
+            ticket.release()
+        
+        asyncio.run(run())
+        self.assertEqual(controller.active, 0)
+
+class TestResponseEncoding(unittest.TestCase):
+    def test_columnar_round_trip(self):
+        """Test that columnar results keep every row and NUMERIC values serialize as FastAPI would"""
+        import json
+        from decimal import Decimal
+        from samarth.utils.responses import dumps, encode_result, from_columnar
+        rows = [{"crop": "Rice", "production": Decimal("10.5")}, {"crop": "Wheat", "production": Decimal("30")}]
+        result = {"answer": "ok", "visualization_data": {"chart_type": "bar", "data": rows}}
+        encoded = json.loads(dumps(encode_result(result, "columnar")))
+        self.assertEqual(encoded["visualization_data"], {"chart_type": "bar", "format": "columnar",
+                                                         "columns": ["crop", "production"],
+                                                         "values": [["Rice", "Wheat"], [10.5, 30]]})
+        self.assertEqual(from_columnar(encoded["visualization_data"]), json.loads(dumps(rows)))
+        self.assertIs(encode_result(result, "rows"), result)
+    
+    def test_compression_negotiation(self):
+        """Test that large bodies are compressed as the client accepts and streamed events are left alone"""
+        from fastapi import FastAPI
+        from fastapi.responses import StreamingResponse
+        from fastapi.testclient import TestClient
+        from samarth.utils.responses import CompressionMiddleware, FastJSONResponse, negotiate_encoding
+        self.assertEqual(negotiate_encoding("gzip;q=0, identity"), None)
+        self.assertEqual(negotiate_encoding("deflate, gzip;q=0.5"), "gzip")
+        
+        app = FastAPI(default_response_class=FastJSONResponse)
+        app.add_middleware(CompressionMiddleware, minimum_size=100)
+        app.get("/big")(lambda: {"rows": ["x" * 10] * 100})
+        app.get("/small")(lambda: {"ok": True})
+        app.get("/events")(lambda: StreamingResponse(iter([b"data: " + b"x" * 200 + b"\n\n"]),
+                                                     media_type="text/event-stream"))
+        client = TestClient(app)
+        
+        response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(len(response.json()["rows"]), 100)
+        self.assertNotIn("content-encoding", client.get("/small", headers={"Accept-Encoding": "gzip"}).headers)
+        self.assertNotIn("content-encoding", client.get("/events", headers={"Accept-Encoding": "gzip"}).headers)
+        self.assertNotIn("content-encoding", client.get("/big", headers={"Accept-Encoding": "identity"}).headers)
+    
+    def test_large_bodies_compress_off_the_event_loop(self):
+        """Test that bodies past the thread threshold are compressed in a worker thread"""
+        from unittest import mock
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from samarth.utils.responses import CompressionMiddleware, FastJSONResponse
+        app = FastAPI(default_response_class=FastJSONResponse)
+        app.add_middleware(CompressionMiddleware, minimum_size=100, thread_min_size=2000)
+        app.get("/big")(lambda: {"rows": ["x" * 10] * 100})
+        app.get("/huge")(lambda: {"rows": ["x" * 10] * 1000})
+        client = TestClient(app)
+        
+        with mock.patch("samarth.utils.responses.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+            self.assertEqual(client.get("/big", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"], "gzip")
+            to_thread.assert_not_called()
+            response = client.get("/huge", headers={"Accept-Encoding": "gzip"})
+            to_thread.assert_called_once()
+        self.assertEqual(len(response.json()["rows"]), 1000)
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.rows = [{"year": 2000 + i % 20, "production": float(i)} for i in range(2500)]
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def test_offload_keeps_first_page(self):
+        """Test that long results are cut to one page with a handle and short ones are left inline"""
+        from samarth.services.result_store import ResultStore
+        store = ResultStore(page_size=100, memory_rows=10000, directory=self.directory)
+        short = {"chart_type": "line", "data": self.rows[:100]}
+        self.assertIs(store.offload(short), short)
+        offloaded = store.offload({"chart_type": "line", "data": self.rows})
+        self.assertEqual(len(offloaded["data"]), 100)
+        self.assertEqual(offloaded["result"]["row_count"], 2500)
+        page = store.page(offloaded["result"]["handle"], offset=2450, limit=100)
+        self.assertEqual((len(page["data"]), page["next_offset"]), (50, None))
+        self.assertIsNone(store.page("not-a-real-handle-at-all"))
+    
+    def test_spilled_pages_and_export(self):
+        """Test that spilled results page across index blocks, export as CSV and are visible to other workers"""
+        from samarth.services.result_store import ResultStore
+        store = ResultStore(page_size=100, memory_rows=0, directory=self.directory)
+        handle = store.put(self.rows)["handle"]
+        page = store.page(handle, offset=995, limit=10)
+        self.assertEqual([row["production"] for row in page["data"]], [float(i) for i in range(995, 1005)])
+        self.assertEqual(page["next_offset"], 1005)
+        csv_text = b"".join(store.export(handle, "csv")).decode()
+        self.assertEqual(csv_text.splitlines()[:2], ["year,production", "2000,0.0"])
+        self.assertEqual(len(csv_text.splitlines()), 2501)
+        # Another worker finds the result through its sidecar
+        other = ResultStore(page_size=100, directory=self.directory)
+        self.assertEqual(other.page(handle, offset=2499)["data"], [{"year": 2019, "production": 2499.0}])
+        store.close()
+        self.assertFalse(other.has(handle))
+    
+    def test_expired_results_are_gone(self):
+        """Test that a result is not served after its TTL and its files are removed on purge"""
+        import os
+        from samarth.services.result_store import ResultStore
+        store = ResultStore(ttl=0.01, page_size=100, memory_rows=0, directory=self.directory)
+        handle = store.put(self.rows)["handle"]
+        time.sleep(0.02)
+        self.assertFalse(store.has(handle))
+        store.purge()
+        self.assertEqual(os.listdir(self.directory), [])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,7 @@
 # Exception Handling for Project Samarth
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class SamarthException(Exception):
     """Base exception class for Project Samarth"""
@@ -25,11 +25,30 @@ class DataRetrievalException(SamarthException):
     def __init__(self, reason: str):
         super().__init__(f"Failed to retrieve data: {reason}", 500)
 
+class DatabaseQueryException(DataRetrievalException):
+    """Raised when the warehouse rejects a query or cannot be reached"""
+    def __init__(self, sql: str, error: str, pgcode: Optional[str] = None):
+        super().__init__(error)
+        self.sql = sql
+        self.error = error
+        self.pgcode = pgcode
+    
+    @property
+    def repairable(self) -> bool:
+        """Syntax, undefined object and data errors (SQLSTATE classes 42 and 22) can be fixed by rewriting the SQL"""
+        return bool(self.pgcode) and self.pgcode[:2] in ("42", "22")
+
 class LLMProcessingException(SamarthException):
     """Raised when LLM processing fails"""
     def __init__(self, reason: str):
         super().__init__(f"LLM processing failed: {reason}", 500)
 
+class LLMUnavailableException(LLMProcessingException):
+    """Raised when the LLM provider timed out, exhausted its retries or its circuit breaker is open"""
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.status_code = 503
+
 # Exception handlers
 async def samarth_exception_handler(request: Request, exc: SamarthException) -> JSONResponse:
     """Handle Samarth-specific exceptions"""
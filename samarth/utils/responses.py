@@ -0,0 +1,172 @@
+# Response Encoding for Project Samarth
+#
+# Query results can run to many thousands of rows, so answers avoid the
+# generic path (jsonable_encoder walking every value, then json.dumps):
+#
+#   dumps / FastJSONResponse  serialize with orjson when it is installed,
+#                             falling back to the standard encoder; Decimal
+#                             values from NUMERIC columns encode as with FastAPI
+#   columnar                  with "result_format": "columnar" in the request,
+#                             visualization_data carries the column names once
+#                             and one array of values per column instead of a
+#                             dict per row
+#   CompressionMiddleware     compresses response bodies of at least
+#                             COMPRESSION_MIN_BYTES with brotli (when installed)
+#                             or gzip, as the client's Accept-Encoding allows;
+#                             bodies of COMPRESSION_THREAD_MIN_BYTES or more
+#                             are compressed in a worker thread
+#
+# brotli is optional and not in requirements.txt; without it only gzip is offered.
+# Streamed responses (server-sent events, NDJSON) are not compressed, so their
+# events are never held back in a compressor buffer.
+import asyncio
+import gzip
+import json
+import os
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from fastapi.encoders import decimal_encoder, jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESULT_FORMATS = ("rows", "columnar")
+
+# Content types that are streamed event by event
+_STREAMING_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+def _default(value: Any) -> Any:
+    """Values orjson does not serialize itself"""
+    if isinstance(value, Decimal):
+        return decimal_encoder(value)
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with dumps(); return it directly to skip FastAPI's jsonable_encoder pass"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def to_columnar(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Column names once plus one value array per column; a column missing from a row is null"""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    return {"columns": columns, "values": [[row.get(column) for row in rows] for column in columns]}
+
+
+def from_columnar(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rows as dicts from to_columnar() output"""
+    return [dict(zip(data["columns"], row)) for row in zip(*data["values"])]
+
+
+def encode_result(result: Dict[str, Any], result_format: str = "rows") -> Dict[str, Any]:
+    """The answer (or pipeline event) with its visualization rows in result_format"""
+    visualization = result.get("visualization_data")
+    if result_format != "columnar" or not isinstance(visualization, dict) or "data" not in visualization:
+        return result
+    encoded = {key: value for key, value in visualization.items() if key != "data"}
+    encoded.update(format="columnar", **to_columnar(visualization["data"]))
+    return {**result, "visualization_data": encoded}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """The content coding to use for an Accept-Encoding header: br, gzip or None"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for coding in (["br"] if brotli is not None else []) + ["gzip"]:
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, coding: str, level: int) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=min(level, 9), mtime=0)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing single-message response bodies above a size threshold.
+
+    The response start is held until the first body message arrives; if that is
+    the whole body, is large enough and is not already encoded, it is
+    compressed and the headers are rewritten. Anything else passes through.
+    """
+
+    def __init__(self, app: Any, minimum_size: Optional[int] = None, level: Optional[int] = None,
+                 thread_min_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+        self.level = level if level is not None else int(os.getenv("COMPRESSION_LEVEL", "5"))
+        self.thread_min_size = (thread_min_size if thread_min_size is not None
+                                else int(os.getenv("COMPRESSION_THREAD_MIN_BYTES", "65536")))
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        held: Dict[str, Any] = {}
+
+        async def send_compressed(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                held["start"] = message
+                return
+            start = held.pop("start", None)
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start.setdefault("headers", []))
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            if (message["type"] != "http.response.body" or message.get("more_body", False)
+                    or len(body) < self.minimum_size or "content-encoding" in headers
+                    or content_type.startswith(_STREAMING_TYPES)):
+                await send(start)
+                await send(message)
+                return
+            if len(body) >= self.thread_min_size:
+                # Large results take milliseconds to compress; keep the event loop serving meanwhile
+                body = await asyncio.to_thread(compress, body, coding, self.level)
+            else:
+                body = compress(body, coding, self.level)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
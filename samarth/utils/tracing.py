@@ -0,0 +1,262 @@
+# Tracing for Project Samarth
+#
+# Lightweight spans propagated with contextvars, so a span opened in the API
+# middleware is the parent of the pipeline stage, LLM call and database spans
+# below it, including those run in worker threads (asyncio.to_thread copies
+# the context). The trace ID is the request's X-Request-ID, which the
+# frontend sets. Finished spans go to an exporter chosen by TRACE_EXPORTER:
+# "memory" (default, served at /traces), "file" (JSON lines at TRACE_FILE for
+# offline analysis) or "none".
+#
+#   python -m samarth.utils.tracing traces.jsonl    # per-span percentiles and the slowest traces
+import contextlib
+import contextvars
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+
+# Incoming IDs are echoed into logs and headers, so only accept plain tokens
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("samarth_span", default=None)
+
+
+def new_id(length: int = 16) -> str:
+    return secrets.token_hex(length // 2)
+
+
+def valid_id(value: Optional[str]) -> Optional[str]:
+    """The ID if it is a safe token, else None"""
+    return value if value and _VALID_ID.match(value) else None
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start_time", "duration", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class InMemoryExporter:
+    """Keep the most recent finished spans in a ring buffer"""
+
+    def __init__(self, max_spans: Optional[int] = None):
+        self._spans: Deque[Dict[str, Any]] = deque(maxlen=max_spans or int(os.getenv("TRACE_MEMORY_SPANS", "10000")))
+
+    def export(self, span: Span, root: bool = False):
+        self._spans.append(span.to_dict())
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [span for span in list(self._spans) if trace_id is None or span["trace_id"] == trace_id]
+
+    def traces(self, limit: int = 20, slowest: bool = False) -> List[Dict[str, Any]]:
+        """Recent (or slowest) traces with their spans, keyed on each trace's root span"""
+        return group_traces(self.spans(), limit, slowest)
+
+    def clear(self):
+        self._spans.clear()
+
+
+class FileExporter:
+    """Append finished spans to a JSON lines file"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("TRACE_FILE", "samarth_traces.jsonl")
+        self._lock = threading.Lock()
+        self._handle = None
+
+    def export(self, span: Span, root: bool = False):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            if self._handle is None:
+                self._handle = open(self.path, "a", encoding="utf-8")
+            self._handle.write(line)
+            # Buffered within a request; written out when its outermost span finishes
+            if root:
+                self._handle.flush()
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+
+class Tracer:
+    """Create spans and hand them to the exporter when they finish"""
+
+    def __init__(self, exporter: Any = None):
+        self.exporter = exporter
+
+    @contextlib.contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+             **attributes: Any) -> Iterator[Optional[Span]]:
+        """Time the block as a child of the current span (or as a new trace's root)"""
+        if self.exporter is None:
+            yield None
+            return
+        parent = _current_span.get()
+        if parent is not None and trace_id is None:
+            trace_id, parent_id = parent.trace_id, parent_id or parent.span_id
+        span = Span(name, trace_id or new_id(), parent_id, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes.setdefault("error", f"{type(e).__name__}: {e}"[:200])
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # An async generator finalized in another context; nothing to restore
+                pass
+            self.exporter.export(span, root=parent is None)
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    @staticmethod
+    def current_trace_id() -> Optional[str]:
+        span = _current_span.get()
+        return span.trace_id if span is not None else None
+
+    def annotate(self, **attributes: Any):
+        """Add attributes to the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span for each HTTP request.
+
+    The trace ID comes from the X-Request-ID header (or is generated) and is
+    echoed back on the response. The span covers the whole response body, so
+    streamed answers are timed to their last event.
+    """
+
+    def __init__(self, app: Any, tracer: Optional["Tracer"] = None):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        active = self.tracer or tracer
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        request_id = valid_id(headers.get(REQUEST_ID_HEADER.lower())) or new_id()
+        parent_id = valid_id(headers.get(PARENT_SPAN_HEADER.lower()))
+
+        with active.span(f"{scope['method']} {scope['path']}", trace_id=request_id, parent_id=parent_id) as span:
+            async def send_with_request_id(message: Dict[str, Any]):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (REQUEST_ID_HEADER.lower().encode(), request_id.encode())
+                    ]
+                    if span is not None:
+                        span.set(status_code=message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_request_id)
+
+
+def group_traces(spans: List[Dict[str, Any]], limit: int = 20, slowest: bool = False) -> List[Dict[str, Any]]:
+    """Group spans by trace; a trace is named and timed by its longest root span"""
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        grouped.setdefault(span["trace_id"], []).append(span)
+    ordered = []
+    for trace_id, members in grouped.items():
+        # Roots have no parent here (a frontend parent may be in another process's export)
+        span_ids = {span["span_id"] for span in members}
+        root = max((span for span in members if span["parent_id"] not in span_ids),
+                   key=lambda span: span["duration_ms"])
+        ordered.append({"trace_id": trace_id, "name": root["name"], "duration_ms": root["duration_ms"],
+                        "spans": members})
+    if slowest:
+        ordered.sort(key=lambda trace: trace["duration_ms"], reverse=True)
+    else:
+        ordered.reverse()
+    return ordered[:limit]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(spans: List[Dict[str, Any]], slowest: int = 5) -> str:
+    """Per-span-name latency percentiles and the slowest traces, as text"""
+    durations: Dict[str, List[float]] = {}
+    for span in spans:
+        durations.setdefault(span["name"], []).append(span["duration_ms"])
+    lines = [f"{'span':<40} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}"]
+    for name, values in sorted(durations.items(), key=lambda item: -_percentile(item[1], 0.99)):
+        lines.append(f"{name:<40} {len(values):>7} {_percentile(values, 0.5):>10.1f} "
+                     f"{_percentile(values, 0.95):>10.1f} {_percentile(values, 0.99):>10.1f} {max(values):>10.1f}")
+    lines.append("")
+    lines.append("Slowest traces:")
+    for trace in group_traces(spans, slowest, slowest=True):
+        children = sorted((span for span in trace["spans"] if span["parent_id"] is not None),
+                          key=lambda span: span["duration_ms"], reverse=True)[:3]
+        breakdown = ", ".join(f"{span['name']} {span['duration_ms']:.0f}ms" for span in children)
+        lines.append(f"  {trace['trace_id']} {trace['name']} {trace['duration_ms']:.0f}ms ({breakdown})")
+    return "\n".join(lines)
+
+
+def create_exporter(kind: Optional[str] = None) -> Any:
+    """Exporter named by TRACE_EXPORTER: memory (default), file or none"""
+    kind = (kind or os.getenv("TRACE_EXPORTER", "memory")).strip().lower()
+    if kind == "none":
+        return None
+    if kind == "file":
+        return FileExporter()
+    return InMemoryExporter()
+
+# Global tracer instance
+tracer = Tracer(create_exporter())
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("TRACE_FILE", "samarth_traces.jsonl")
+    with open(path, encoding="utf-8") as handle:
+        print(summarize([json.loads(line) for line in handle if line.strip()]))
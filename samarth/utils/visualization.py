@@ -1,10 +1,10 @@
 # Visualization Module for Project Samarth
-import matplotlib.pyplot as plt
-import pandas as pd
+#
+# matplotlib, pandas and numpy are imported on the first chart rather than with
+# the module, so importing it costs nothing until something is drawn.
 import io
 import base64
 from typing import Dict, Any, List, Union
-import numpy as np
 
 def create_visualization(data: List[Dict[Any, Any]], chart_type: str = "bar") -> str:
     """
@@ -21,6 +21,10 @@ def create_visualization(data: List[Dict[Any, Any]], chart_type: str = "bar") ->
         return ""
     
     try:
+        import matplotlib.pyplot as plt
+        import numpy as np
+        import pandas as pd
+
         # Convert to DataFrame
         df = pd.DataFrame(data)
         